@@ -1,8 +1,73 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, make_response, url_for, has_request_context
+from flask.json.provider import DefaultJSONProvider
+import click
+import collections
+import concurrent.futures
+import contextlib
+import csv
+import fcntl
+import functools
+import hashlib
+import io
+import mmap
+import re
+import select
 import sqlite3
 import os
+import struct
+import time
+import math
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+
+# Imported eagerly (not inside handlers) so a preloaded gunicorn master pays
+# for it once and forked workers share the pages
+import requests
+
+# orjson is optional; fall back to the stdlib encoder when it is not installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Pillow is optional; without it /api/art serves the original cover unresized
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+# pyarrow is optional; only needed for Parquet export/import
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson for faster encode/decode"""
+
+    def dumps(self, obj, **kwargs):
+        option = orjson.OPT_NON_STR_KEYS
+        if kwargs.pop('sort_keys', False):
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.pop('indent', None):
+            option |= orjson.OPT_INDENT_2
+        # orjson output is always compact
+        kwargs.pop('separators', None)
+        if kwargs:
+            # Options orjson cannot express (cls=, ensure_ascii=, ...)
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=option).decode()
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
 
 app = Flask(__name__)
+if orjson is not None:
+    app.json = OrjsonProvider(app)
 # Secret key for sessions - needed to track user ratings
 app.secret_key = os.environ.get('SECRET_KEY', 'neoradio-secret-key-change-in-production')
 
@@ -16,8 +81,30 @@ if USE_POSTGRES:
     import psycopg2
     import psycopg2.extras
 
-def get_db_connection():
-    """Create a database connection (SQLite or PostgreSQL)"""
+# Optional read replicas: comma-separated PostgreSQL URLs, or SQLite file paths
+# when running on SQLite (useful as local stand-ins)
+DATABASE_REPLICA_URLS = [url.strip() for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 5))
+REPLICA_HEALTH_INTERVAL = 10  # seconds between health checks of a replica in use
+REPLICA_EJECT_SECONDS = 30  # how long a failed replica is skipped
+REPLICA_MAX_LAG_SECONDS = 10
+REPLICA_CONNECT_TIMEOUT = 2
+PRIMARY_STICKY_COOKIE = 'neoradio_primary_until'
+_replica_state = {}  # url -> {'checked_at', 'ejected_until'}
+_replica_rotation = [0]
+
+def get_db_connection(readonly=False):
+    """
+    Create a database connection (SQLite or PostgreSQL).
+
+    readonly=True routes to a healthy replica when DATABASE_REPLICA_URLS is
+    set, unless the caller voted within the last REPLICA_STICKY_SECONDS and
+    must read their own write from the primary.
+    """
+    if readonly and DATABASE_REPLICA_URLS and not reads_pinned_to_primary():
+        conn = get_replica_connection()
+        if conn is not None:
+            return conn
     if USE_POSTGRES:
         conn = psycopg2.connect(DATABASE_URL)
         return conn
@@ -26,6 +113,80 @@ def get_db_connection():
         conn.row_factory = sqlite3.Row
         return conn
 
+def reads_pinned_to_primary():
+    """True when the current request carries a recent-vote cookie"""
+    if not has_request_context():
+        return False
+    try:
+        until = float(request.cookies.get(PRIMARY_STICKY_COOKIE, 0))
+    except ValueError:
+        return False
+    return time.time() < until
+
+def replica_healthy(conn):
+    """Check that a replica answers and, on PostgreSQL, is not lagging too far behind"""
+    if USE_POSTGRES:
+        row = execute_query(conn, '''
+            SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+            END AS lag
+        ''', fetch_one=True)
+        return row['lag'] <= REPLICA_MAX_LAG_SECONDS
+    # A stand-in file without the schema is as useless as an unreachable server
+    execute_query(conn, 'SELECT 1 FROM ratings LIMIT 1')
+    return True
+
+def get_replica_connection():
+    """Connect to the next healthy replica (round-robin), or None if all are ejected"""
+    DatabaseError = psycopg2.Error if USE_POSTGRES else sqlite3.Error
+    now = time.time()
+    count = len(DATABASE_REPLICA_URLS)
+    start = _replica_rotation[0]
+    _replica_rotation[0] = (start + 1) % count
+
+    for offset in range(count):
+        url = DATABASE_REPLICA_URLS[(start + offset) % count]
+        state = _replica_state.setdefault(url, {'checked_at': 0, 'ejected_until': 0})
+        if now < state['ejected_until']:
+            continue
+        conn = None
+        try:
+            if USE_POSTGRES:
+                conn = psycopg2.connect(url, connect_timeout=REPLICA_CONNECT_TIMEOUT)
+            else:
+                conn = sqlite3.connect(f'file:{url}?mode=ro', uri=True, timeout=REPLICA_CONNECT_TIMEOUT)
+                conn.row_factory = sqlite3.Row
+            if now - state['checked_at'] >= REPLICA_HEALTH_INTERVAL:
+                if not replica_healthy(conn):
+                    raise DatabaseError('replication lag too high')
+                state['checked_at'] = now
+            return conn
+        except DatabaseError as e:
+            if conn is not None:
+                conn.close()
+            state['ejected_until'] = now + REPLICA_EJECT_SECONDS
+            state['checked_at'] = 0
+            print(f'Ejecting replica #{(start + offset) % count} for {REPLICA_EJECT_SECONDS}s: {e}')
+    return None
+
+def adapt_query(query):
+    """Rewrite a SQLite-style query for the active backend (no-op on SQLite)"""
+    # Convert SQLite placeholders (?) to PostgreSQL placeholders (%s)
+    if USE_POSTGRES and query:
+        query = query.replace('?', '%s')
+        # Handle INSERT OR IGNORE for PostgreSQL - convert to ON CONFLICT DO NOTHING
+        if 'INSERT OR IGNORE' in query:
+            # Extract table name and columns
+            match = re.search(r'INSERT OR IGNORE INTO (\w+)\s*\(([^)]+)\)', query)
+            if match:
+                table = match.group(1)
+                # For songs table, conflict is on (station, title, artist)
+                if table == 'songs':
+                    query = query.replace('INSERT OR IGNORE', 'INSERT') + ' ON CONFLICT (station, title, artist) DO NOTHING'
+                else:
+                    query = query.replace('INSERT OR IGNORE', 'INSERT') + ' ON CONFLICT DO NOTHING'
+    return query
+
 def execute_query(conn, query, params=None, fetch_one=False, fetch_all=False):
     """
     Execute a database query with cursor, compatible with both SQLite and PostgreSQL.
@@ -42,21 +203,7 @@ def execute_query(conn, query, params=None, fetch_one=False, fetch_all=False):
     """
     cursor = conn.cursor() if not USE_POSTGRES else conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
 
-    # Convert SQLite placeholders (?) to PostgreSQL placeholders (%s)
-    if USE_POSTGRES and query:
-        query = query.replace('?', '%s')
-        # Handle INSERT OR IGNORE for PostgreSQL - convert to ON CONFLICT DO NOTHING
-        if 'INSERT OR IGNORE' in query:
-            # Extract table name and columns
-            import re
-            match = re.search(r'INSERT OR IGNORE INTO (\w+)\s*\(([^)]+)\)', query)
-            if match:
-                table = match.group(1)
-                # For songs table, conflict is on (title, artist)
-                if table == 'songs':
-                    query = query.replace('INSERT OR IGNORE', 'INSERT') + ' ON CONFLICT (title, artist) DO NOTHING'
-                else:
-                    query = query.replace('INSERT OR IGNORE', 'INSERT')
+    query = adapt_query(query)
 
     if params:
         cursor.execute(query, params)
@@ -75,6 +222,85 @@ def execute_query(conn, query, params=None, fetch_one=False, fetch_all=False):
         cursor.close()
         return None
 
+# Rows fetched per round trip by iter_query()
+STREAM_CHUNK_SIZE = 1000
+
+def iter_query(conn, query, params=None, chunk_size=STREAM_CHUNK_SIZE, as_tuples=False):
+    """
+    Stream the rows of a SELECT instead of materializing them like execute_query(fetch_all=True).
+
+    Args:
+        conn: Database connection (must stay open until the generator is exhausted or closed)
+        query: SQL query string
+        params: Query parameters (tuple)
+        chunk_size: Rows fetched per fetchmany() round trip
+        as_tuples: Yield plain tuples instead of dicts (cheaper for bulk exports)
+
+    Yields:
+        One dict (or tuple) per row. On PostgreSQL a named server-side cursor
+        is used, so the result set stays on the server and memory stays flat.
+    """
+    if USE_POSTGRES:
+        factory = None if as_tuples else psycopg2.extras.RealDictCursor
+        cursor = conn.cursor(name=f'neoradio_stream_{uuid.uuid4().hex}', cursor_factory=factory)
+        cursor.itersize = chunk_size
+    else:
+        cursor = conn.cursor()
+
+    query = adapt_query(query)
+    try:
+        if params:
+            cursor.execute(query, params)
+        else:
+            cursor.execute(query)
+
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            for row in rows:
+                yield tuple(row) if as_tuples else dict(row)
+    finally:
+        cursor.close()
+
+def ndjson_response(rows, filename=None):
+    """Streamed application/x-ndjson response, one JSON document per row"""
+    def generate():
+        buffer = []
+        for row in rows:
+            buffer.append(app.json.dumps(row))
+            if len(buffer) >= STREAM_CHUNK_SIZE:
+                yield '\n'.join(buffer) + '\n'
+                buffer = []
+        if buffer:
+            yield '\n'.join(buffer) + '\n'
+
+    response = app.response_class(generate(), mimetype='application/x-ndjson')
+    if filename:
+        response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    return response
+
+def csv_response(rows, columns, filename=None):
+    """Streamed text/csv response; rows may be dicts or tuples in columns order"""
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        count = 0
+        for row in rows:
+            writer.writerow([row[column] for column in columns] if isinstance(row, dict) else row)
+            count += 1
+            if count % STREAM_CHUNK_SIZE == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    response = app.response_class(generate(), mimetype='text/csv')
+    if filename:
+        response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    return response
+
 def init_db():
     """Initialize the database with tables (supports both SQLite and PostgreSQL)"""
     conn = get_db_connection()
@@ -89,9 +315,18 @@ def init_db():
                 artist TEXT NOT NULL,
                 album TEXT,
                 year TEXT,
-                UNIQUE(title, artist)
+                station TEXT NOT NULL DEFAULT 'main',
+                UNIQUE(station, title, artist)
             )
         ''')
+        # Databases from before stations: scope existing songs to the original station
+        cursor.execute('''
+            SELECT 1 FROM information_schema.columns WHERE table_name = 'songs' AND column_name = 'station'
+        ''')
+        if cursor.fetchone() is None:
+            cursor.execute("ALTER TABLE songs ADD COLUMN station TEXT NOT NULL DEFAULT 'main'")
+            cursor.execute('ALTER TABLE songs DROP CONSTRAINT IF EXISTS songs_title_artist_key')
+            cursor.execute('ALTER TABLE songs ADD CONSTRAINT songs_station_title_artist_key UNIQUE (station, title, artist)')
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS ratings (
                 id SERIAL PRIMARY KEY,
@@ -103,18 +338,88 @@ def init_db():
                 FOREIGN KEY (song_id) REFERENCES songs (id)
             )
         ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS chart_scores (
+                period TEXT NOT NULL,
+                song_id INTEGER NOT NULL,
+                station TEXT NOT NULL DEFAULT 'main',
+                thumbs_up INTEGER NOT NULL DEFAULT 0,
+                thumbs_down INTEGER NOT NULL DEFAULT 0,
+                score DOUBLE PRECISION NOT NULL DEFAULT 0,
+                PRIMARY KEY (period, song_id),
+                FOREIGN KEY (song_id) REFERENCES songs (id)
+            )
+        ''')
+        # Charts from before stations: rank each song within its song's station
+        cursor.execute('''
+            SELECT 1 FROM information_schema.columns WHERE table_name = 'chart_scores' AND column_name = 'station'
+        ''')
+        if cursor.fetchone() is None:
+            cursor.execute("ALTER TABLE chart_scores ADD COLUMN station TEXT NOT NULL DEFAULT 'main'")
+            cursor.execute('''
+                UPDATE chart_scores SET station = songs.station FROM songs WHERE songs.id = chart_scores.song_id
+            ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS rating_rollups (
+                bucket_size TEXT NOT NULL,
+                song_id INTEGER NOT NULL,
+                bucket_start TIMESTAMP NOT NULL,
+                thumbs_up INTEGER NOT NULL DEFAULT 0,
+                thumbs_down INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (bucket_size, song_id, bucket_start)
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS rollup_state (
+                name TEXT PRIMARY KEY,
+                watermark BIGINT NOT NULL DEFAULT 0
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS plays (
+                id SERIAL PRIMARY KEY,
+                song_id INTEGER NOT NULL,
+                started_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (song_id) REFERENCES songs (id)
+            )
+        ''')
+        # Full-text search: weighted title/artist lexemes kept by the database
+        cursor.execute('''
+            ALTER TABLE songs ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+                setweight(to_tsvector('simple', title), 'A') || setweight(to_tsvector('simple', artist), 'B')
+            ) STORED
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_songs_search ON songs USING GIN (search_vector)')
+        # Rank order for search: common prefixes walk this index and stop at the page
+        cursor.execute(f'ALTER TABLE songs ADD COLUMN IF NOT EXISTS search_key BIGINT GENERATED ALWAYS AS ({search_key()}) STORED')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_songs_search_key ON songs(station, search_key)')
     else:
         # SQLite syntax
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS songs (
+        songs_table = '''
+            CREATE TABLE IF NOT EXISTS {name} (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 title TEXT NOT NULL,
                 artist TEXT NOT NULL,
                 album TEXT,
                 year TEXT,
-                UNIQUE(title, artist)
+                station TEXT NOT NULL DEFAULT 'main',
+                UNIQUE(station, title, artist)
             )
-        ''')
+        '''
+        cursor.execute(songs_table.format(name='songs'))
+        # Databases from before stations: SQLite cannot drop the old
+        # UNIQUE(title, artist), so the table is rebuilt (ids kept) with every
+        # existing song on the original station. Its search triggers go with
+        # the old table and are recreated below.
+        cursor.execute('PRAGMA table_info(songs)')
+        if 'station' not in [column[1] for column in cursor.fetchall()]:
+            cursor.execute(songs_table.format(name='songs_scoped'))
+            cursor.execute('''
+                INSERT INTO songs_scoped (id, title, artist, album, year)
+                SELECT id, title, artist, album, year FROM songs
+            ''')
+            cursor.execute('DROP TABLE songs')
+            cursor.execute('ALTER TABLE songs_scoped RENAME TO songs')
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS ratings (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -126,138 +431,280 @@ def init_db():
                 FOREIGN KEY (song_id) REFERENCES songs (id)
             )
         ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS chart_scores (
+                period TEXT NOT NULL,
+                song_id INTEGER NOT NULL,
+                station TEXT NOT NULL DEFAULT 'main',
+                thumbs_up INTEGER NOT NULL DEFAULT 0,
+                thumbs_down INTEGER NOT NULL DEFAULT 0,
+                score REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (period, song_id),
+                FOREIGN KEY (song_id) REFERENCES songs (id)
+            )
+        ''')
+        # Charts from before stations: rank each song within its song's station
+        cursor.execute('PRAGMA table_info(chart_scores)')
+        if 'station' not in [column[1] for column in cursor.fetchall()]:
+            cursor.execute("ALTER TABLE chart_scores ADD COLUMN station TEXT NOT NULL DEFAULT 'main'")
+            cursor.execute('''
+                UPDATE chart_scores SET station = (SELECT station FROM songs WHERE songs.id = chart_scores.song_id)
+            ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS rating_rollups (
+                bucket_size TEXT NOT NULL,
+                song_id INTEGER NOT NULL,
+                bucket_start TIMESTAMP NOT NULL,
+                thumbs_up INTEGER NOT NULL DEFAULT 0,
+                thumbs_down INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (bucket_size, song_id, bucket_start)
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS rollup_state (
+                name TEXT PRIMARY KEY,
+                watermark INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS plays (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                song_id INTEGER NOT NULL,
+                started_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (song_id) REFERENCES songs (id)
+            )
+        ''')
+        # Full-text search: a contentless FTS5 index kept in sync by triggers.
+        # Its rowid is search_key(), so matches come back in rank order, and
+        # prefix indexes up to 8 characters make typeahead prefixes a lookup.
+        # The external-content songs_fts it replaces was keyed on song id.
+        for trigger in ('songs_fts_insert', 'songs_fts_delete', 'songs_fts_update'):
+            cursor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+        cursor.execute('DROP TABLE IF EXISTS songs_fts')
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'songs_search_insert'")
+        search_index_current = cursor.fetchone() is not None
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS songs_search USING fts5(
+                title, artist, content='',
+                tokenize='unicode61 remove_diacritics 2', prefix='2 3 4 5 6 7 8'
+            )
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS songs_search_insert AFTER INSERT ON songs BEGIN
+                INSERT INTO songs_search (rowid, title, artist) VALUES ({search_key('new')}, new.title, new.artist);
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS songs_search_delete AFTER DELETE ON songs BEGIN
+                INSERT INTO songs_search (songs_search, rowid, title, artist)
+                VALUES ('delete', {search_key('old')}, old.title, old.artist);
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS songs_search_update AFTER UPDATE OF title, artist ON songs BEGIN
+                INSERT INTO songs_search (songs_search, rowid, title, artist)
+                VALUES ('delete', {search_key('old')}, old.title, old.artist);
+                INSERT INTO songs_search (rowid, title, artist) VALUES ({search_key('new')}, new.title, new.artist);
+            END
+        ''')
+        if not search_index_current:
+            # New index, or the songs table was rebuilt above and its triggers
+            # went with it: (re)index every song
+            cursor.execute("INSERT INTO songs_search (songs_search) VALUES ('delete-all')")
+            cursor.execute(f"INSERT INTO songs_search (rowid, title, artist) SELECT {search_key('songs')}, title, artist FROM songs")
+
+    # Same syntax on both backends
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_plays_started_at ON plays(started_at)')
+    # Each station's chart is the top of its own slice of the index
+    cursor.execute('DROP INDEX IF EXISTS idx_chart_scores_rank')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_chart_scores_station_rank ON chart_scores(station, period, score DESC)')
+    # Covers /api/me/ratings: a listener's votes in order, without reading the table
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_ratings_user_recent ON ratings(user_id, created_at, id, song_id, rating)')
 
     conn.commit()
     cursor.close()
     conn.close()
 
-@app.route('/')
-@app.route('/radio')
-def index():
-    """Radio player page"""
-    return render_template('radio.html')
-
-@app.route('/api/metadata')
-def get_metadata():
-    """Fetch current track metadata from stream"""
-    import requests
-    try:
-        # Fetch metadata from metadatav2.json at the stream host
-        metadata_url = 'https://d3d4yli4hf5bmh.cloudfront.net/metadatav2.json'
-        response = requests.get(metadata_url, timeout=5)
-
-        if response.status_code == 200:
-            data = response.json()
-            return jsonify({
-                'source': metadata_url,
-                'data': data
-            })
-        else:
-            return jsonify({'error': f'HTTP {response.status_code}'}), response.status_code
-
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-@app.route('/api/songs/rating', methods=['POST'])
-def rate_song():
-    """Rate a song (thumbs up = 1, thumbs down = -1)"""
-    import hashlib
-
-    conn = get_db_connection()
-    data = request.get_json()
+def get_user_id():
+    """Derive the persistent listener identifier from IP + User-Agent"""
+    # Read the WSGI environ directly: this runs on every rate-limited request,
+    # and the header wrappers cost more than the hash. Memoized per request.
+    environ = request.environ
+    user_id = environ.get('neoradio.user_id')
+    if user_id is not None:
+        return user_id
 
     # Get user's IP address
-    if request.headers.get('X-Forwarded-For'):
+    forwarded_for = environ.get('HTTP_X_FORWARDED_FOR')
+    if forwarded_for:
         # If behind proxy, get real IP
-        ip_address = request.headers.get('X-Forwarded-For').split(',')[0].strip()
+        ip_address = forwarded_for.split(',')[0].strip()
     else:
-        ip_address = request.remote_addr
+        ip_address = environ.get('REMOTE_ADDR')
 
     # Get User-Agent for additional fingerprinting
-    user_agent = request.headers.get('User-Agent', '')
+    user_agent = environ.get('HTTP_USER_AGENT', '')
 
     # Create a persistent user identifier based on IP + User-Agent hash
     # This prevents cookie clearing but still maintains some privacy
     identifier_string = f"{ip_address}:{user_agent}"
-    user_id = hashlib.sha256(identifier_string.encode()).hexdigest()[:32]
-    title = data.get('title')
-    artist = data.get('artist')
-    album = data.get('album', '')
-    year = data.get('year', '')
-    rating = data.get('rating')  # 1 for thumbs up, -1 for thumbs down
+    user_id = environ['neoradio.user_id'] = hashlib.sha256(identifier_string.encode()).hexdigest()[:32]
+    return user_id
 
-    if not title or not artist or rating not in [1, -1]:
-        return jsonify({'error': 'Invalid data'}), 400
-
-    try:
-        # Insert or get song
-        execute_query(conn, '''
-            INSERT OR IGNORE INTO songs (title, artist, album, year)
-            VALUES (?, ?, ?, ?)
-        ''', (title, artist, album, year))
-        conn.commit()
+# Admission control for the DB-backed rating routes. Token buckets live in a
+# file-backed mmap so all gunicorn workers on a host share one table.
+RATE_LIMITS = {
+    # kind: (tokens per second, burst)
+    'read': (float(os.environ.get('RATE_LIMIT_READ_RATE', 5)), int(os.environ.get('RATE_LIMIT_READ_BURST', 30))),
+    'vote': (float(os.environ.get('RATE_LIMIT_VOTE_RATE', 1)), int(os.environ.get('RATE_LIMIT_VOTE_BURST', 10)))
+}
+RATE_LIMIT_KINDS = list(RATE_LIMITS)
+RATE_LIMIT_SLOTS = 65536
+SHARED_MEMORY_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else '/tmp'
+RATE_LIMIT_PATH = os.environ.get('RATE_LIMIT_PATH', os.path.join(SHARED_MEMORY_DIR, 'neoradio-ratelimit'))
+_RATE_SLOT = struct.Struct('<Qdd')  # key, tokens, updated_at
+_rate_table = {'mmap': None, 'path': None}
+# Admitted requests in flight across all workers on the host, capped so that
+# together they stay inside the database's connection budget. Each worker
+# owns a slot (pid, count) in a shared table and only ever writes its own
+# count; admission sums every slot. Summing without a lock means workers
+# admitting at the same instant can overshoot by a request each, which is
+# acceptable slack. A worker that dies mid-request leaves its count behind
+# until the next worker to start claims a slot and clears it.
+MAX_CONCURRENT_REQUESTS = int(os.environ.get('MAX_CONCURRENT_REQUESTS', 64))
+ADMISSION_PATH = os.environ.get('ADMISSION_PATH', os.path.join(SHARED_MEMORY_DIR, 'neoradio-admission'))
+ADMISSION_SLOTS = 64  # worker processes per host
+_ADMISSION_COUNTS = struct.Struct(f'<{ADMISSION_SLOTS}q')  # after ADMISSION_SLOTS pids of the same layout
+_ADMISSION_COUNT = struct.Struct('<q')
+_admission_table = {'mmap': None, 'path': None, 'lock_fd': None, 'lock_path': None}
+_admission_thread_lock = threading.Lock()
+# This worker's count and slot; a plain lock + counter is several times
+# cheaper than threading.BoundedSemaphore on the admission path
+_in_flight = {'lock': threading.Lock(), 'count': 0, 'pid': None, 'path': None, 'offset': None}
 
-        song = execute_query(conn, '''
-            SELECT id FROM songs WHERE title = ? AND artist = ?
-        ''', (title, artist), fetch_one=True)
+def map_shared_table(state, path, size):
+    """
+    Map a fixed-size file shared by all workers on the host, creating it on
+    first use in each worker. state caches the mapping ({'mmap', 'path'}).
+    """
+    if state['mmap'] is None or state['path'] != path or len(state['mmap']) < size:
+        if state['mmap'] is not None:
+            state['mmap'].close()
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if os.fstat(fd).st_size < size:
+                os.ftruncate(fd, size)
+            state['mmap'] = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        state['path'] = path
+    return state['mmap']
 
-        song_id = song['id']
+def rate_limit_table():
+    """Map the shared bucket table"""
+    return map_shared_table(_rate_table, RATE_LIMIT_PATH, RATE_LIMIT_SLOTS * _RATE_SLOT.size)
 
-        # Try to insert rating, if user already rated, update it
-        IntegrityError = psycopg2.IntegrityError if USE_POSTGRES else sqlite3.IntegrityError
-        try:
-            execute_query(conn, '''
-                INSERT INTO ratings (song_id, user_id, rating)
-                VALUES (?, ?, ?)
-            ''', (song_id, user_id, rating))
-            conn.commit()
-        except IntegrityError:
-            # User already rated, update the rating
-            # For PostgreSQL, we need to rollback the failed transaction first
-            conn.rollback()
-            execute_query(conn, '''
-                UPDATE ratings SET rating = ?
-                WHERE song_id = ? AND user_id = ?
-            ''', (rating, song_id, user_id))
-            conn.commit()
+def take_token(user_id, kind, now=None):
+    """
+    Spend one token from the listener's bucket for this kind of request.
 
-        # Get updated counts
-        counts = execute_query(conn, '''
-            SELECT
-                SUM(CASE WHEN rating = 1 THEN 1 ELSE 0 END) as thumbs_up,
-                SUM(CASE WHEN rating = -1 THEN 1 ELSE 0 END) as thumbs_down
-            FROM ratings
-            WHERE song_id = ?
-        ''', (song_id,), fetch_one=True)
+    Returns 0 when admitted, else the seconds until a token is available.
+    Slots are direct-mapped by key and updated without a lock: a collision
+    just hands the newcomer a full bucket and a racing update can lose one
+    token, which is acceptable slack for abuse protection.
+    """
+    table = rate_limit_table()
+    rate, burst = RATE_LIMITS[kind]
+    now = time.time() if now is None else now
+    key = (int(user_id[:15], 16) << 4) | RATE_LIMIT_KINDS.index(kind)
+    offset = (key % RATE_LIMIT_SLOTS) * _RATE_SLOT.size
 
-        conn.close()
+    stored_key, tokens, updated_at = _RATE_SLOT.unpack_from(table, offset)
+    if stored_key != key:
+        tokens = burst
+    else:
+        tokens = min(burst, tokens + max(0.0, now - updated_at) * rate)
 
-        return jsonify({
-            'success': True,
-            'thumbs_up': counts['thumbs_up'] or 0,
-            'thumbs_down': counts['thumbs_down'] or 0
-        })
+    if tokens < 1:
+        _RATE_SLOT.pack_into(table, offset, key, tokens, now)
+        return (1 - tokens) / rate
+    _RATE_SLOT.pack_into(table, offset, key, tokens - 1, now)
+    return 0
 
-    except Exception as e:
-        conn.close()
-        return jsonify({'error': str(e)}), 500
+def admission_table():
+    """Map the shared in-flight table: ADMISSION_SLOTS pids, then their counts"""
+    return map_shared_table(_admission_table, ADMISSION_PATH, 2 * _ADMISSION_COUNTS.size)
 
-@app.route('/api/songs/rating/<title>/<artist>')
-def get_song_rating(title, artist):
-    """Get rating counts for a specific song"""
-    conn = get_db_connection()
+def claim_admission_slot():
+    """Offset of this worker's count, claiming a slot (and clearing dead workers' slots) after start or fork"""
+    pid = os.getpid()
+    with shared_table_locked(_admission_table, ADMISSION_PATH, admission_table(), _admission_thread_lock) as table:
+        pids = _ADMISSION_COUNTS.unpack_from(table, 0)
+        slot = pids.index(pid) if pid in pids else None
+        for index, owner in enumerate(pids):
+            if owner and owner != pid:
+                try:
+                    os.kill(owner, 0)
+                    continue
+                except ProcessLookupError:
+                    owner = 0
+                except PermissionError:
+                    continue
+            if not owner:
+                _ADMISSION_COUNT.pack_into(table, index * 8, 0)
+                _ADMISSION_COUNT.pack_into(table, _ADMISSION_COUNTS.size + index * 8, 0)
+                if slot is None:
+                    slot = index
+        if slot is None:
+            raise RuntimeError(f'All {ADMISSION_SLOTS} admission slots are taken')
+        _ADMISSION_COUNT.pack_into(table, slot * 8, pid)
+        _ADMISSION_COUNT.pack_into(table, _ADMISSION_COUNTS.size + slot * 8, 0)
+    _in_flight.update(pid=pid, path=ADMISSION_PATH, offset=_ADMISSION_COUNTS.size + slot * 8, count=0)
 
-    song = execute_query(conn, '''
-        SELECT id FROM songs WHERE title = ? AND artist = ?
-    ''', (title, artist), fetch_one=True)
+def admit_request():
+    """Count a request in flight unless the host is at MAX_CONCURRENT_REQUESTS; True if admitted"""
+    with _in_flight['lock']:
+        if _in_flight['pid'] != os.getpid() or _in_flight['path'] != ADMISSION_PATH:
+            claim_admission_slot()
+        table = admission_table()
+        if sum(_ADMISSION_COUNTS.unpack_from(table, _ADMISSION_COUNTS.size)) >= MAX_CONCURRENT_REQUESTS:
+            return False
+        _in_flight['count'] += 1
+        _ADMISSION_COUNT.pack_into(table, _in_flight['offset'], _in_flight['count'])
+        return True
 
-    if not song:
-        conn.close()
-        return jsonify({'thumbs_up': 0, 'thumbs_down': 0, 'user_rating': None})
+def release_request():
+    """Return the slot taken by admit_request()"""
+    with _in_flight['lock']:
+        _in_flight['count'] -= 1
+        _ADMISSION_COUNT.pack_into(admission_table(), _in_flight['offset'], _in_flight['count'])
 
-    song_id = song['id']
+def admission_controlled(kind):
+    """Reject with 429 over the listener's rate, or 503 when the host is saturated"""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            retry_after = take_token(get_user_id(), kind)
+            if retry_after:
+                response = jsonify({'error': 'Too many requests'})
+                response.status_code = 429
+                response.headers['Retry-After'] = str(math.ceil(retry_after))
+                return response
+            # Fail fast instead of queueing behind the DB until the client times out
+            if not admit_request():
+                response = jsonify({'error': 'Server busy'})
+                response.status_code = 503
+                response.headers['Retry-After'] = '1'
+                return response
+            try:
+                return view(*args, **kwargs)
+            finally:
+                release_request()
+        return wrapper
+    return decorator
 
-    # Get counts
+def get_rating_counts(conn, song_id):
+    """Return thumbs up/down totals for a song as a dict"""
     counts = execute_query(conn, '''
         SELECT
             SUM(CASE WHEN rating = 1 THEN 1 ELSE 0 END) as thumbs_up,
@@ -265,68 +712,2537 @@ def get_song_rating(title, artist):
         FROM ratings
         WHERE song_id = ?
     ''', (song_id,), fetch_one=True)
+    return {
+        'thumbs_up': counts['thumbs_up'] or 0,
+        'thumbs_down': counts['thumbs_down'] or 0
+    }
 
-    # Get user's rating if they have one
-    import hashlib
+# (title, artist) -> songs.id; ids never change, so entries never go stale
+SONG_ID_CACHE_MAX = 10000
+_song_ids = {}
 
-    # Get user's IP address
-    if request.headers.get('X-Forwarded-For'):
-        ip_address = request.headers.get('X-Forwarded-For').split(',')[0].strip()
-    else:
-        ip_address = request.remote_addr
+def lookup_song_id(conn, title, artist, station=None):
+    """Return the id of a known song on a station (default: the default station), or None; hits are cached per process"""
+    key = (station or DEFAULT_STATION, title, artist)
+    song_id = _song_ids.get(key)
+    if song_id is None:
+        song = execute_query(conn, '''
+            SELECT id FROM songs WHERE station = ? AND title = ? AND artist = ?
+        ''', key, fetch_one=True)
+        if not song:
+            return None
+        if len(_song_ids) >= SONG_ID_CACHE_MAX:
+            _song_ids.clear()
+        song_id = _song_ids[key] = song['id']
+    return song_id
 
-    # Get User-Agent for additional fingerprinting
-    user_agent = request.headers.get('User-Agent', '')
+def get_or_create_song_id(conn, title, artist, album='', year='', station=None):
+    """Return the id of a song on a station, inserting it first if it is new"""
+    station = station or DEFAULT_STATION
+    song_id = _song_ids.get((station, title, artist))
+    if song_id is not None:
+        return song_id
+    execute_query(conn, '''
+        INSERT OR IGNORE INTO songs (title, artist, album, year, station)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (title, artist, album, year, station))
+    conn.commit()
 
-    # Create a persistent user identifier based on IP + User-Agent hash
-    identifier_string = f"{ip_address}:{user_agent}"
-    user_id = hashlib.sha256(identifier_string.encode()).hexdigest()[:32]
+    return lookup_song_id(conn, title, artist, station)
 
-    user_rating = None
-    user_rating_row = execute_query(conn, '''
-        SELECT rating FROM ratings WHERE song_id = ? AND user_id = ?
-    ''', (song_id, user_id), fetch_one=True)
-    if user_rating_row:
-        user_rating = user_rating_row['rating']
+def format_timestamp(value):
+    """Render a DB timestamp (SQLite text or PostgreSQL datetime, both UTC) as ISO 8601"""
+    if value is None:
+        return None
+    if hasattr(value, 'isoformat'):
+        return value.replace(tzinfo=None).isoformat(timespec='seconds') + 'Z'
+    return str(value).replace(' ', 'T') + 'Z'
 
-    conn.close()
+def parse_timestamp(value):
+    """Turn a DB timestamp (SQLite text or PostgreSQL datetime) into a naive UTC datetime"""
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None)
+    return datetime.strptime(str(value)[:19], '%Y-%m-%d %H:%M:%S')
 
-    return jsonify({
-        'thumbs_up': counts['thumbs_up'] or 0,
-        'thumbs_down': counts['thumbs_down'] or 0,
-        'user_rating': user_rating
+# Chart windows: 'all' is a single ranking, 'week'/'day' are calendar periods
+# (ISO week / UTC day) so they can be maintained by increments alone.
+CHART_WINDOWS = ('all', 'week', 'day')
+CHART_CACHE_SECONDS = 30
+CHART_MAX_LIMIT = 100
+_charts_cache = {}
+
+def chart_periods(when):
+    """Map a UTC datetime to the chart period key for each window"""
+    year, week, _ = when.isocalendar()
+    return {
+        'all': 'all',
+        'week': f'week:{year}-W{week:02d}',
+        'day': f'day:{when:%Y-%m-%d}'
+    }
+
+def wilson_lower_bound(thumbs_up, thumbs_down, z=1.96):
+    """Lower bound of the 95% Wilson score interval for the thumbs-up ratio"""
+    n = thumbs_up + thumbs_down
+    if n <= 0:
+        return 0.0
+    p = thumbs_up / n
+    return (p + z * z / (2 * n) - z * math.sqrt((p * (1 - p) + z * z / (4 * n)) / n)) / (1 + z * z / n)
+
+def apply_chart_delta(conn, song_id, created_at, up_delta, down_delta, station=None):
+    """
+    Add a vote delta to every chart period the rating belongs to, on the song's station's charts.
+
+    Runs inside the caller's transaction; the row lock taken by the UPDATE keeps
+    the re-read counts and the stored score consistent under concurrent votes.
+    The caller clears _charts_cache once it has committed: cleared any earlier,
+    a concurrent /api/charts could cache the pre-vote rows for the full TTL.
+    """
+    if not up_delta and not down_delta:
+        return
+    station = station or DEFAULT_STATION
+    for period in chart_periods(created_at).values():
+        execute_query(conn, '''
+            INSERT OR IGNORE INTO chart_scores (period, song_id, station, thumbs_up, thumbs_down, score)
+            VALUES (?, ?, ?, 0, 0, 0)
+        ''', (period, song_id, station))
+        execute_query(conn, '''
+            UPDATE chart_scores SET thumbs_up = thumbs_up + ?, thumbs_down = thumbs_down + ?
+            WHERE period = ? AND song_id = ?
+        ''', (up_delta, down_delta, period, song_id))
+        counts = execute_query(conn, '''
+            SELECT thumbs_up, thumbs_down FROM chart_scores WHERE period = ? AND song_id = ?
+        ''', (period, song_id), fetch_one=True)
+        execute_query(conn, '''
+            UPDATE chart_scores SET score = ? WHERE period = ? AND song_id = ?
+        ''', (wilson_lower_bound(counts['thumbs_up'], counts['thumbs_down']), period, song_id))
+
+def rebuild_charts(conn):
+    """
+    Recompute chart_scores from the ratings table (backfill or repair).
+
+    Aggregates per song and day in SQL and folds the days into weeks in Python,
+    so only one row per (song, day) leaves the database. Votes cast while the
+    rebuild runs may be missed, so run it when traffic is quiet.
+    """
+    rows = execute_query(conn, '''
+        SELECT ratings.song_id, songs.station, DATE(ratings.created_at) AS day,
+            SUM(CASE WHEN ratings.rating = 1 THEN 1 ELSE 0 END) AS thumbs_up,
+            SUM(CASE WHEN ratings.rating = -1 THEN 1 ELSE 0 END) AS thumbs_down
+        FROM ratings JOIN songs ON songs.id = ratings.song_id
+        GROUP BY ratings.song_id, songs.station, DATE(ratings.created_at)
+    ''', fetch_all=True)
+
+    totals = {}
+    for row in rows:
+        day = datetime.strptime(str(row['day'])[:10], '%Y-%m-%d')
+        for period in chart_periods(day).values():
+            key = (period, row['song_id'], row['station'])
+            up, down = totals.get(key, (0, 0))
+            totals[key] = (up + row['thumbs_up'], down + row['thumbs_down'])
+
+    execute_query(conn, 'DELETE FROM chart_scores')
+    for (period, song_id, station), (up, down) in totals.items():
+        execute_query(conn, '''
+            INSERT INTO chart_scores (period, song_id, station, thumbs_up, thumbs_down, score)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (period, song_id, station, up, down, wilson_lower_bound(up, down)))
+    conn.commit()
+    _charts_cache.clear()
+    return len(totals)
+
+# Rating rollups: per-song vote counts in hourly and daily buckets, built
+# incrementally from the ratings table so analytics never scan raw rows
+ROLLUP_BUCKETS = ('hour', 'day')
+ROLLUP_BATCH_SIZE = 5000
+# Ratings younger than this are left for the next run, so a vote transaction
+# that committed after a higher id was rolled up is not skipped
+ROLLUP_LAG_SECONDS = 60
+STATS_DEFAULT_RANGE = {'hour': 48 * 3600, 'day': 30 * 86400}
+
+def bucket_start(when, bucket_size):
+    """Truncate a datetime to the start of its hour or day bucket"""
+    if bucket_size == 'hour':
+        return when.replace(minute=0, second=0, microsecond=0)
+    return when.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def rollup_ratings_batch(conn, batch_size=ROLLUP_BATCH_SIZE, now=None):
+    """
+    Roll one batch of ratings past the watermark into rating_rollups.
+
+    Bucket increments and the new watermark are committed in one transaction,
+    so a crashed or repeated run never double counts: it resumes from the
+    last committed watermark. A vote changed after it was rolled up is moved
+    between buckets by rate_song (see apply_rollup_delta). The watermark row
+    stays locked until the commit (the INSERT takes SQLite's write lock, FOR
+    UPDATE the row on PostgreSQL), so a vote change either commits before
+    the batch reads it or sees the watermark the batch moved to. Returns the
+    number of ratings processed.
+    """
+    now = now or datetime.now(timezone.utc).replace(tzinfo=None)
+    execute_query(conn, "INSERT OR IGNORE INTO rollup_state (name, watermark) VALUES ('ratings', 0)")
+    lock = ' FOR UPDATE' if USE_POSTGRES else ''
+    state = execute_query(conn, f"SELECT watermark FROM rollup_state WHERE name = 'ratings'{lock}", fetch_one=True)
+    cutoff = now - timedelta(seconds=ROLLUP_LAG_SECONDS)
+
+    rows = execute_query(conn, '''
+        SELECT id, song_id, rating, created_at FROM ratings
+        WHERE id > ?
+        ORDER BY id
+        LIMIT ?
+    ''', (state['watermark'], batch_size), fetch_all=True)
+
+    # Stop at the first rating inside the lag window; the watermark must not
+    # move past anything that has not been counted yet
+    eligible = []
+    for row in rows:
+        created_at = parse_timestamp(row['created_at'])
+        if created_at > cutoff:
+            break
+        eligible.append((row, created_at))
+    if not eligible:
+        conn.commit()
+        return 0
+
+    deltas = {}
+    for row, created_at in eligible:
+        for size in ROLLUP_BUCKETS:
+            key = (size, row['song_id'], bucket_start(created_at, size).strftime('%Y-%m-%d %H:%M:%S'))
+            up, down = deltas.get(key, (0, 0))
+            deltas[key] = (up + (row['rating'] == 1), down + (row['rating'] == -1))
+
+    add_rollup_counts(conn, deltas)
+    execute_query(conn, "UPDATE rollup_state SET watermark = ? WHERE name = 'ratings'", (eligible[-1][0]['id'],))
+    conn.commit()
+    return len(eligible)
+
+def add_rollup_counts(conn, deltas):
+    """Add {(bucket_size, song_id, bucket_start): (up, down)} to rating_rollups, in the caller's transaction"""
+    for (size, song_id, start), (up, down) in deltas.items():
+        execute_query(conn, '''
+            INSERT OR IGNORE INTO rating_rollups (bucket_size, song_id, bucket_start, thumbs_up, thumbs_down)
+            VALUES (?, ?, ?, 0, 0)
+        ''', (size, song_id, start))
+        execute_query(conn, '''
+            UPDATE rating_rollups SET thumbs_up = thumbs_up + ?, thumbs_down = thumbs_down + ?
+            WHERE bucket_size = ? AND song_id = ? AND bucket_start = ?
+        ''', (up, down, size, song_id, start))
+
+def apply_rollup_delta(conn, rating_id, song_id, created_at, up_delta, down_delta):
+    """
+    Move a changed vote between the rollup counts of its original buckets.
+
+    Runs inside rate_song's transaction, after the UPDATE of the rating. Only
+    votes at or below the watermark have been counted; later ones are rolled
+    up with their current value. The watermark is read under the lock the
+    rollup holds while it commits (FOR SHARE on PostgreSQL; on SQLite the
+    vote's UPDATE already holds the write lock).
+    """
+    if not up_delta and not down_delta:
+        return
+    lock = ' FOR SHARE' if USE_POSTGRES else ''
+    state = execute_query(conn, f"SELECT watermark FROM rollup_state WHERE name = 'ratings'{lock}", fetch_one=True)
+    if state is None or rating_id > state['watermark']:
+        return
+    add_rollup_counts(conn, {
+        (size, song_id, bucket_start(created_at, size).strftime('%Y-%m-%d %H:%M:%S')): (up_delta, down_delta)
+        for size in ROLLUP_BUCKETS
     })
 
-# Database initialization flag
-_db_initialized = False
+def rollup_ratings(conn, batch_size=ROLLUP_BATCH_SIZE, now=None):
+    """Roll up every eligible rating past the watermark; returns the number processed"""
+    total = 0
+    while True:
+        processed = rollup_ratings_batch(conn, batch_size, now)
+        total += processed
+        # A short batch means the backlog (or the lag window) was reached
+        if processed < batch_size:
+            return total
 
-@app.before_request
-def initialize_database():
-    """Initialize database before first request"""
-    global _db_initialized
-    if not _db_initialized:
-        if USE_POSTGRES:
-            # For PostgreSQL, always try to initialize (init-db.sql handles IF NOT EXISTS)
-            try:
-                init_db()
-                print('PostgreSQL database initialized!')
-            except Exception as e:
-                print(f'Database initialization note: {e}')
-        else:
-            # For SQLite, check if tables exist
-            try:
-                conn = get_db_connection()
-                result = execute_query(conn, "SELECT name FROM sqlite_master WHERE type='table' AND name='songs'", fetch_one=True)
-                conn.close()
-                if not result:
-                    # Tables don't exist, initialize
-                    init_db()
-                    print(f'SQLite database {DATABASE} initialized!')
-            except Exception as e:
-                print(f'Database check/initialization error: {e}')
-        _db_initialized = True
+# Upstream now-playing document for the stream
+METADATA_URL = os.environ.get('METADATA_URL', 'https://d3d4yli4hf5bmh.cloudfront.net/metadatav2.json')
+
+# Last upstream metadata document seen by /api/metadata (shared by the page render).
+# track is the normalized form of data and payload its pre-serialized JSON bytes,
+# both rebuilt only when the upstream document changes. This is the default
+# station's; other stations get their own in _station_state (see station_state()).
+_now_playing = {'data': None, 'track': None, 'payload': b'null', 'updated_at': 0.0}
+
+# How many previous tracks to carry in the normalized track object
+METADATA_PREVIOUS_TRACKS = 3
+
+def normalize_metadata(data):
+    """
+    Reduce an upstream metadatav2.json document to the canonical track object.
+
+    Returns None when the document has neither a title nor an artist.
+    """
+    if not (data.get('title') or data.get('artist')):
+        return None
+
+    track = {
+        'title': data.get('title') or '',
+        'artist': data.get('artist') or '',
+        'album': data.get('album') or '',
+        'year': str(data.get('date') or '')
+    }
+
+    previous = []
+    for i in range(1, METADATA_PREVIOUS_TRACKS + 1):
+        title = data.get(f'prev_title_{i}')
+        artist = data.get(f'prev_artist_{i}')
+        if not (title or artist):
+            break
+        previous.append({'title': title or '', 'artist': artist or ''})
+    if previous:
+        track['previous'] = previous
+
+    return track
+
+def update_now_playing(data, now, station=None):
+    """
+    Store a station's upstream document, normalizing and serializing only on change.
+
+    Returns True when a different track (title/artist) started playing.
+    """
+    now_playing = station_state(station)[0]
+    track_changed = False
+    if data != now_playing['data']:
+        previous = now_playing['track']
+        track = normalize_metadata(data)
+        now_playing['data'] = data
+        now_playing['track'] = track
+        now_playing['payload'] = app.json.dumps(track).encode()
+        track_changed = track is not None and (
+            previous is None or
+            (previous['title'], previous['artist']) != (track['title'], track['artist'])
+        )
+    now_playing['updated_at'] = now
+    return track_changed
+
+# First pages of /api/history, keyed by (station, page size); cleared when a play is recorded
+HISTORY_CACHE_SECONDS = 10
+HISTORY_MAX_LIMIT = 100
+_history_cache = {}
+
+def record_play(track, station=None):
+    """
+    Add a plays row for a track that just started on a station.
+
+    Only the host's poller leader records plays, but each host (and a request
+    polling inline) can see the same change, so the insert is skipped when the
+    station's most recent play is already this song. The check and the insert
+    run under the database write lock (BEGIN IMMEDIATE on SQLite, a
+    self-conflicting table lock on PostgreSQL): pollers that saw the same track
+    change wait for the first to commit, then find its row.
+    """
+    station = station or DEFAULT_STATION
+    conn = get_db_connection()
+    try:
+        song_id = get_or_create_song_id(conn, track['title'], track['artist'], track['album'], track['year'], station)
+        if USE_POSTGRES:
+            execute_query(conn, 'LOCK TABLE plays IN SHARE ROW EXCLUSIVE MODE')
+        else:
+            execute_query(conn, 'BEGIN IMMEDIATE')
+        last = execute_query(conn, '''
+            SELECT plays.song_id FROM plays JOIN songs ON songs.id = plays.song_id
+            WHERE songs.station = ?
+            ORDER BY plays.started_at DESC, plays.id DESC LIMIT 1
+        ''', (station,), fetch_one=True)
+        if not last or last['song_id'] != song_id:
+            execute_query(conn, 'INSERT INTO plays (song_id) VALUES (?)', (song_id,))
+            conn.commit()
+            _history_cache.clear()
+        else:
+            conn.commit()
+    finally:
+        conn.close()
+
+# Votes for the default station's now-playing song, loaded when the track
+# changes so the burst of identical rating reads at every track boundary is
+# served from memory.
+# Each worker keeps its own copy: its own votes update it in place, other
+# workers' votes arrive over the invalidation bus (see publish_invalidation),
+# and a reload every HOT_RATINGS_TTL seconds (one query, however many
+# listeners are asking) corrects anything the bus missed.
+# The copy is the base votes are applied to, so it always loads from the
+# primary: a lagging replica would drop committed votes until the next reload.
+# _hot_ratings_lock serializes reloads with applying votes (request threads
+# and the bus thread); a reader finding the TTL expired while a reload is
+# under way is answered from the current copy instead of queueing a second one.
+HOT_RATINGS_TTL = 5
+_hot_ratings = {'key': None, 'song_id': None, 'votes': {}, 'thumbs_up': 0, 'thumbs_down': 0, 'loaded_at': 0.0}
+_hot_ratings_lock = threading.Lock()
+
+def _load_hot_ratings(title, artist, now=None):
+    """load_hot_ratings() for a caller holding _hot_ratings_lock"""
+    conn = get_db_connection()
+    try:
+        song_id = lookup_song_id(conn, title, artist)
+        if song_id is None:
+            return False
+        rows = execute_query(conn, '''
+            SELECT user_id, rating FROM ratings WHERE song_id = ?
+        ''', (song_id,), fetch_all=True)
+    finally:
+        conn.close()
+    votes = {row['user_id']: row['rating'] for row in rows}
+    thumbs_up = sum(1 for rating in votes.values() if rating == 1)
+    _hot_ratings.update(key=(title, artist), song_id=song_id, votes=votes, thumbs_up=thumbs_up,
+                        thumbs_down=len(votes) - thumbs_up, loaded_at=time.time() if now is None else now)
+    # Also re-bases the live totals, so any drift between workers is corrected
+    publish_live_totals(song_id, thumbs_up, len(votes) - thumbs_up)
+    return True
+
+def load_hot_ratings(title, artist, now=None):
+    """Make (title, artist) the hot song and load all its votes; False if the song is unknown"""
+    with _hot_ratings_lock:
+        return _load_hot_ratings(title, artist, now)
+
+def hot_rating(title, artist, user_id):
+    """Rating totals and the listener's vote from the hot cache, or None if the song is not hot"""
+    if _hot_ratings['key'] != (title, artist):
+        return None
+    if time.time() - _hot_ratings['loaded_at'] >= HOT_RATINGS_TTL and _hot_ratings_lock.acquire(blocking=False):
+        try:
+            # Another thread may have reloaded between the check and the acquire
+            if _hot_ratings['key'] == (title, artist) and time.time() - _hot_ratings['loaded_at'] >= HOT_RATINGS_TTL:
+                _load_hot_ratings(title, artist)
+        finally:
+            _hot_ratings_lock.release()
+    return {
+        'thumbs_up': _hot_ratings['thumbs_up'],
+        'thumbs_down': _hot_ratings['thumbs_down'],
+        'user_rating': _hot_ratings['votes'].get(user_id)
+    }
+
+def apply_hot_vote(song_id, user_id, rating):
+    """Fold a committed vote into the hot cache; returns the new totals, or None if the song is not hot"""
+    with _hot_ratings_lock:
+        if _hot_ratings['song_id'] != song_id:
+            return None
+        previous = _hot_ratings['votes'].get(user_id)
+        _hot_ratings['votes'][user_id] = rating
+        _hot_ratings['thumbs_up'] += (rating == 1) - (previous == 1)
+        _hot_ratings['thumbs_down'] += (rating == -1) - (previous == -1)
+        return {'thumbs_up': _hot_ratings['thumbs_up'], 'thumbs_down': _hot_ratings['thumbs_down']}
+
+# Live rating push. The now-playing song's totals live in one shared record
+# (song_id, thumbs_up, thumbs_down, sequence) that every worker updates on
+# votes. A broadcaster thread per worker checks it every RATING_PUSH_INTERVAL
+# and, if it changed, serializes one SSE event that all of that worker's
+# subscribers are woken to send, so clients get at most one update per
+# interval however fast votes arrive.
+LIVE_RATINGS_PATH = os.environ.get('LIVE_RATINGS_PATH', os.path.join(SHARED_MEMORY_DIR, 'neoradio-live-ratings'))
+RATING_PUSH_INTERVAL = 0.25
+LIVE_KEEPALIVE_SECONDS = 15
+# Each subscriber holds a worker thread; keep room for ordinary requests
+LIVE_MAX_SUBSCRIBERS = int(os.environ.get('LIVE_MAX_SUBSCRIBERS', 16))
+_LIVE_RECORD = struct.Struct('<qqqQ')
+_live_table = {'mmap': None, 'path': None, 'lock_fd': None, 'lock_path': None}
+_live_thread_lock = threading.Lock()
+_live = {
+    'lock': threading.Lock(),
+    'current': (0, None),  # (version, pre-serialized SSE event), replaced as one tuple
+    'signal': threading.Event(),  # set, then replaced, on every new version
+    'sequence': None,
+    'keys': {},  # song_id -> (title, artist)
+    'subscribers': 0,
+    'broadcaster': None
+}
+
+def live_ratings_table():
+    """Map the shared live-ratings record"""
+    return map_shared_table(_live_table, LIVE_RATINGS_PATH, _LIVE_RECORD.size)
+
+@contextlib.contextmanager
+def shared_table_locked(state, path, table, thread_lock):
+    """
+    Exclusive access to a mapped shared table. fcntl locks only exclude other
+    processes, so threads in this worker also take thread_lock. state caches
+    the lock's file descriptor ({'lock_fd', 'lock_path'}).
+    """
+    with thread_lock:
+        if state['lock_fd'] is None or state['lock_path'] != path:
+            if state['lock_fd'] is not None:
+                os.close(state['lock_fd'])
+            state['lock_fd'] = os.open(path, os.O_RDWR)
+            state['lock_path'] = path
+        fcntl.lockf(state['lock_fd'], fcntl.LOCK_EX)
+        try:
+            yield table
+        finally:
+            fcntl.lockf(state['lock_fd'], fcntl.LOCK_UN)
+
+def live_ratings_locked():
+    """Exclusive access to the shared live-ratings record"""
+    return shared_table_locked(_live_table, LIVE_RATINGS_PATH, live_ratings_table(), _live_thread_lock)
+
+def publish_live_totals(song_id, thumbs_up, thumbs_down):
+    """Make song_id the live song with these totals (on track change and cache reloads)"""
+    with live_ratings_locked() as table:
+        current_song, current_up, current_down, sequence = _LIVE_RECORD.unpack_from(table, 0)
+        if (current_song, current_up, current_down) != (song_id, thumbs_up, thumbs_down):
+            _LIVE_RECORD.pack_into(table, 0, song_id, thumbs_up, thumbs_down, sequence + 1)
+
+def publish_live_delta(song_id, up_delta, down_delta):
+    """Apply a committed vote to the live totals if it is for the live song"""
+    if not (up_delta or down_delta):
+        return
+    with live_ratings_locked() as table:
+        current_song, thumbs_up, thumbs_down, sequence = _LIVE_RECORD.unpack_from(table, 0)
+        if current_song == song_id:
+            _LIVE_RECORD.pack_into(table, 0, song_id, thumbs_up + up_delta, thumbs_down + down_delta, sequence + 1)
+
+def live_song_key(song_id):
+    """(title, artist) for a song id, so clients can match events to what they show"""
+    if _hot_ratings['song_id'] == song_id:
+        return _hot_ratings['key']
+    if song_id not in _live['keys']:
+        conn = get_db_connection(readonly=True)
+        try:
+            song = execute_query(conn, 'SELECT title, artist FROM songs WHERE id = ?', (song_id,), fetch_one=True)
+        finally:
+            conn.close()
+        _live['keys'] = {song_id: (song['title'], song['artist']) if song else (None, None)}
+    return _live['keys'][song_id]
+
+def check_live_ratings():
+    """If the shared record changed, build one event and wake every subscriber; True if so"""
+    with live_ratings_locked() as table:
+        song_id, thumbs_up, thumbs_down, sequence = _LIVE_RECORD.unpack_from(table, 0)
+    if sequence == _live['sequence'] or not song_id:
+        return False
+    title, artist = live_song_key(song_id)
+    data = app.json.dumps({'title': title, 'artist': artist, 'thumbs_up': thumbs_up, 'thumbs_down': thumbs_down})
+    event = b'event: rating\ndata: %s\n\n' % data.encode()
+    with _live['lock']:
+        _live['sequence'] = sequence
+        _live['current'] = (_live['current'][0] + 1, event)
+        # Wake everyone waiting on the old signal; later waiters get the new one.
+        # An Event rather than a Condition: waking needs no shared lock, and
+        # under gevent it is the native, much cheaper gevent.event.Event.
+        signal, _live['signal'] = _live['signal'], threading.Event()
+    signal.set()
+    return True
+
+def ensure_live_broadcaster():
+    """Start this worker's broadcaster thread (threads do not survive fork, so per process)"""
+    with _live['lock']:
+        broadcaster = _live['broadcaster']
+        if broadcaster is not None and broadcaster.is_alive():
+            return
+
+        def run():
+            while True:
+                time.sleep(RATING_PUSH_INTERVAL)
+                try:
+                    check_live_ratings()
+                except Exception as e:
+                    print(f'Live ratings broadcaster: {e}')
+
+        _live['broadcaster'] = threading.Thread(target=run, name='live-ratings', daemon=True)
+        _live['broadcaster'].start()
+
+def live_rating_events(keepalive=None):
+    """Generator of SSE chunks for one subscriber: the latest event on each change, else keepalives"""
+    keepalive = LIVE_KEEPALIVE_SECONDS if keepalive is None else keepalive
+    version = None
+    yield b'retry: 5000\n\n'
+    while True:
+        # Take the signal before checking the version: a publish in between
+        # either shows up in the check or sets this signal
+        signal = _live['signal']
+        current_version, event = _live['current']
+        if current_version != version:
+            version = current_version
+            if event:
+                yield event
+                continue
+        elif signal.wait(keepalive):
+            continue
+        yield b': keepalive\n\n'
+
+# Metadata poll scheduling (seconds)
+METADATA_MIN_POLL = int(os.environ.get('METADATA_MIN_POLL', '5'))
+METADATA_MAX_POLL = int(os.environ.get('METADATA_MAX_POLL', '90'))
+# Upstream needs a moment after the audio changes to publish new metadata
+METADATA_CHANGE_GRACE = 2
+DEFAULT_TRACK_SECONDS = 180
+
+# Observed track boundaries, used when upstream gives no start time/duration.
+# full_track is False until we have seen a track start, not just joined mid-way.
+# The default station's; other stations' are in _station_state.
+_track_timing = {
+    'key': None,
+    'started_at': None,
+    'full_track': False,
+    'average': float(DEFAULT_TRACK_SECONDS)
+}
+
+def _epoch_seconds(value):
+    """Coerce an upstream timestamp or duration (s or ms) to float seconds"""
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    # Millisecond epochs/durations are three orders of magnitude larger
+    return value / 1000.0 if value > 1e11 or 1e4 < value < 1e7 else value
+
+def upstream_track_timing(data):
+    """Return (started_at, duration) from upstream metadata, or (None, None)"""
+    started_at = None
+    for key in ('started_at', 'start_time', 'start'):
+        if key in data:
+            started_at = _epoch_seconds(data[key])
+            break
+    duration = None
+    for key in ('duration', 'length'):
+        if key in data:
+            duration = _epoch_seconds(data[key])
+            break
+    return started_at, duration
+
+def record_track_timing(data, now, station=None):
+    """Track boundary bookkeeping; learns a station's average track length from observed changes"""
+    track_timing = station_state(station)[1]
+    key = (data.get('title'), data.get('artist'))
+    if key == track_timing['key']:
+        return
+    if track_timing['key'] is not None:
+        if track_timing['full_track']:
+            played = now - track_timing['started_at']
+            if 30 <= played <= 1800:
+                # Exponentially weighted so the estimate follows programming changes
+                track_timing['average'] = 0.8 * track_timing['average'] + 0.2 * played
+        track_timing['full_track'] = True
+    track_timing['key'] = key
+    track_timing['started_at'] = now
+
+def expected_change_at(data, now, station=None):
+    """
+    Epoch time at which new metadata for the station's next track should be available.
+
+    Uses the upstream start time/duration when present, otherwise the learned
+    average track length.
+    """
+    track_timing = station_state(station)[1]
+    started_at, duration = upstream_track_timing(data)
+    if started_at is None:
+        started_at = track_timing['started_at'] if track_timing['started_at'] is not None else now
+    if duration is None:
+        duration = track_timing['average']
+    return started_at + duration + METADATA_CHANGE_GRACE
+
+def seconds_until_next_poll(data, now, station=None):
+    """
+    Seconds a client should wait before polling /api/metadata again.
+
+    Polls at the minimum interval once the expected change is overdue.
+    """
+    remaining = expected_change_at(data, now, station) - now
+    return int(max(METADATA_MIN_POLL, min(METADATA_MAX_POLL, remaining)))
+
+def get_bootstrap_state(station=None):
+    """
+    Build the initial page state from a station's cached now-playing snapshot.
+
+    Never calls upstream: if nothing has been cached yet the track is None and
+    the client falls back to fetching /api/metadata itself.
+    """
+    station = station or DEFAULT_STATION
+    now_playing = station_state(station)[0]
+    track = now_playing['track']
+    if not track:
+        return {'track': None, 'rating': None, 'refresh_after': None}
+
+    rating = {'thumbs_up': 0, 'thumbs_down': 0, 'user_rating': None}
+    try:
+        hot = hot_rating(track['title'], track['artist'], get_user_id()) if station == DEFAULT_STATION else None
+        if hot is not None:
+            rating = hot
+        else:
+            conn = get_db_connection(readonly=True)
+            try:
+                song_id = lookup_song_id(conn, track['title'], track['artist'], station)
+                if song_id:
+                    rating.update(get_rating_counts(conn, song_id))
+                    user_rating_row = execute_query(conn, '''
+                        SELECT rating FROM ratings WHERE song_id = ? AND user_id = ?
+                    ''', (song_id, get_user_id()), fetch_one=True)
+                    if user_rating_row:
+                        rating['user_rating'] = user_rating_row['rating']
+            finally:
+                conn.close()
+    except Exception as e:
+        print(f'Bootstrap rating lookup failed: {e}')
+        rating = None
+
+    # Stable for the whole track so the page ETag still matches between polls;
+    # a client rendering a copy older than this (e.g. from the service worker
+    # cache) refetches /api/metadata instead of trusting the snapshot.
+    refresh_after = int(expected_change_at(now_playing['data'] or {}, time.time(), station))
+
+    return {'track': track, 'rating': rating, 'refresh_after': refresh_after}
+
+# Versioned app shell: static assets are referenced with a content fingerprint
+# so they can be cached forever, and the service worker cache is named after them.
+APP_SHELL_ASSETS = ['css/radio.css', 'js/radio.js', 'js/visualizer-worker.js']
+HLS_JS_URL = 'https://cdn.jsdelivr.net/npm/hls.js@1.4.12/dist/hls.min.js'
+_asset_fingerprints = {}
+
+def asset_fingerprint(filename):
+    """Short content hash of a static file (recomputed on every call in debug mode)"""
+    if app.debug or filename not in _asset_fingerprints:
+        with open(os.path.join(app.static_folder, filename), 'rb') as f:
+            _asset_fingerprints[filename] = hashlib.sha256(f.read()).hexdigest()[:12]
+    return _asset_fingerprints[filename]
+
+def static_url(filename):
+    """URL for a static file with its fingerprint as a cache-busting query"""
+    return url_for('static', filename=filename, v=asset_fingerprint(filename))
+
+def app_shell_version():
+    """Combined fingerprint of the app shell; changes whenever any asset does"""
+    combined = ':'.join(asset_fingerprint(name) for name in APP_SHELL_ASSETS) + HLS_JS_URL
+    return hashlib.sha256(combined.encode()).hexdigest()[:12]
+
+@app.context_processor
+def inject_asset_helpers():
+    """Make fingerprinted asset URLs and stream URLs available to templates"""
+    return {'static_url': static_url, 'hls_js_url': HLS_JS_URL, 'stream_url': station_stream_url}
+
+@app.route('/')
+@app.route('/radio')
+@app.route('/<station>')
+def index(station=None):
+    """Radio player page, for the default station or /<station>"""
+    station = station or DEFAULT_STATION
+    if station not in STATIONS:
+        return jsonify({'error': 'Unknown station'}), 404
+    html = render_template('radio.html', station=STATIONS[station], default_station=DEFAULT_STATION,
+                           bootstrap=get_bootstrap_state(station))
+    response = make_response(html)
+    # The page embeds per-listener state, so only allow revalidation, not reuse
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.add_etag()
+    return response.make_conditional(request)
+
+@app.route('/sw.js')
+def service_worker():
+    """Service worker for the app shell (served from the root so it controls the whole site)"""
+    shell_urls = ['/radio'] + [static_url(name) for name in APP_SHELL_ASSETS] + [HLS_JS_URL]
+    script = render_template('sw.js', version=app_shell_version(), shell_urls=shell_urls)
+    response = app.response_class(script, mimetype='application/javascript')
+    # Browsers must always revalidate the worker so new fingerprints are picked up
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+# Album art proxy. Upstream only serves the cover of whatever is playing now
+# (the ?v= query just busts caches), so a cover is fetched once, while its
+# album is on air, and kept with its resized variants in an on-disk LRU
+# bounded by total bytes. File mtimes record recency.
+# Covers are identified by (station, artist, album): album names like
+# "Greatest Hits" repeat across artists, and a URL is cached for a year.
+# Tracks without an album have no shareable cover, so theirs is keyed on
+# the title as well (?artist=&title=).
+ART_SOURCE_URL = os.environ.get('ART_SOURCE_URL', 'https://d3d4yli4hf5bmh.cloudfront.net/cover.jpg')
+ART_CACHE_DIR = os.environ.get('ART_CACHE_DIR', 'art-cache')
+ART_CACHE_MAX_BYTES = int(os.environ.get('ART_CACHE_MAX_BYTES', 200 * 1024 * 1024))
+ART_MAX_SOURCE_BYTES = 10 * 1024 * 1024
+ART_SIZES = (120, 240)  # the 1x and 2x display sizes of .album-art
+ART_FORMATS = {'webp': ('WEBP', 'image/webp', {'quality': 80, 'method': 4}),
+               'jpeg': ('JPEG', 'image/jpeg', {'quality': 85, 'optimize': True, 'progressive': True})}
+ART_MAX_AGE = 365 * 86400
+# Striped locks: one fetch/resize per album at a time in a worker, bounded memory
+_art_locks = [threading.Lock() for _ in range(32)]
+
+def art_key(cover):
+    """Cache key for a cover: (station, artist, album), plus the title when there is no album"""
+    return hashlib.sha256('\0'.join(cover).encode()).hexdigest()[:24]
+
+def art_cover(track, station):
+    """The cover identity of a now-playing track"""
+    if track['album']:
+        return (station, track['artist'], track['album'])
+    return (station, track['artist'], '', track['title'])
+
+def art_cache_path(cover, suffix):
+    """Path of a cached source ('src') or variant ('240.webp') for a cover"""
+    return os.path.join(ART_CACHE_DIR, f'{art_key(cover)}-{suffix}')
+
+def write_art_file(path, data):
+    """Write atomically, so other workers never read a partial file"""
+    os.makedirs(ART_CACHE_DIR, exist_ok=True)
+    temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+def read_art_file(path):
+    """Cached bytes (marking the file recently used), or None"""
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass  # evicted by another worker meanwhile
+    return data
+
+def evict_art_cache():
+    """Delete least recently used files until the cache fits ART_CACHE_MAX_BYTES"""
+    try:
+        entries = [entry for entry in os.scandir(ART_CACHE_DIR) if entry.is_file() and not entry.name.endswith('.tmp')]
+    except FileNotFoundError:
+        return
+    stats = [(entry.stat().st_mtime, entry.stat().st_size, entry.path) for entry in entries]
+    total = sum(size for _, size, _ in stats)
+    for _, size, path in sorted(stats):
+        if total <= ART_CACHE_MAX_BYTES:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+def resize_art(source, size, file_format):
+    """Square-crop and scale a cover (like object-fit: cover) and encode it"""
+    pil_format, _, options = ART_FORMATS[file_format]
+    with Image.open(io.BytesIO(source)) as image:
+        image = ImageOps.exif_transpose(image).convert('RGB')
+        image = ImageOps.fit(image, (size, size), Image.LANCZOS)
+        output = io.BytesIO()
+        image.save(output, pil_format, **options)
+    return output.getvalue()
+
+def get_album_source(cover):
+    """The original cover, fetched once while it is on air on its station; None if unavailable"""
+    path = art_cache_path(cover, 'src')
+    source = read_art_file(path)
+    if source is None:
+        station = cover[0]
+        track = station_state(station)[0]['track']
+        art_url = STATIONS[station]['art_url']
+        if not art_url or not track or art_cover(track, station) != cover:
+            return None
+        source = fetch_art_source(art_url, art_key(cover))
+        if source is None:
+            return None
+        write_art_file(path, source)
+    return source
+
+def fetch_art_source(art_url, version):
+    """
+    Download a cover image, or None if upstream has no image. Streamed, so an
+    oversized body is abandoned at ART_MAX_SOURCE_BYTES instead of buffered.
+    """
+    with requests.get(art_url, params={'v': version}, timeout=5, stream=True) as response:
+        if response.status_code != 200 or not response.headers.get('Content-Type', '').startswith('image/'):
+            return None
+        if int(response.headers.get('Content-Length') or 0) > ART_MAX_SOURCE_BYTES:
+            return None
+        chunks = []
+        received = 0
+        for chunk in response.iter_content(chunk_size=65536):
+            received += len(chunk)
+            if received > ART_MAX_SOURCE_BYTES:
+                return None
+            chunks.append(chunk)
+    return b''.join(chunks)
+
+def get_album_art(cover, size, file_format):
+    """
+    Bytes of a cover variant, generating (and fetching the source) on a miss.
+    Returns None if the cover is not cached and not on air.
+    """
+    path = art_cache_path(cover, f'{size}.{file_format}')
+    data = read_art_file(path)
+    if data is not None:
+        return data
+
+    with _art_locks[int(art_key(cover)[:8], 16) % len(_art_locks)]:
+        data = read_art_file(path)
+        if data is not None:
+            return data
+        source = get_album_source(cover)
+        if source is None:
+            return None
+        data = resize_art(source, size, file_format)
+        write_art_file(path, data)
+    evict_art_cache()
+    return data
+
+@app.route('/api/art')
+def album_art():
+    """
+    Cover of ?artist=&album= (?artist=&title= for tracks without an album) at
+    ?size=120|240 as WebP or JPEG (?format=, else from Accept). Without
+    either, the cover of what is playing now.
+    """
+    station = request.args.get('station', DEFAULT_STATION)
+    if station not in STATIONS:
+        return jsonify({'error': 'Unknown station'}), 404
+    artist = request.args.get('artist', '')
+    album = request.args.get('album', '')
+    title = request.args.get('title', '')
+    if album:
+        cover = (station, artist, album)
+    elif title:
+        cover = (station, artist, '', title)
+    else:
+        track = station_state(station)[0]['track']
+        cover = art_cover(track, station) if track else None
+    size = request.args.get('size', ART_SIZES[0], type=int)
+    if size not in ART_SIZES:
+        return jsonify({'error': f'size must be one of {", ".join(map(str, ART_SIZES))}'}), 400
+    file_format = request.args.get('format')
+    if file_format is None:
+        file_format = 'webp' if 'image/webp' in request.headers.get('Accept', '') else 'jpeg'
+    if file_format not in ART_FORMATS:
+        return jsonify({'error': 'format must be webp or jpeg'}), 400
+
+    try:
+        if cover is None:
+            data = None
+        elif Image is None:
+            # No Pillow: pass the original cover through
+            data = get_album_source(cover)
+            if data is not None:
+                evict_art_cache()
+            mimetype = 'image/jpeg'
+        else:
+            data = get_album_art(cover, size, file_format)
+            mimetype = ART_FORMATS[file_format][1]
+    except Exception as e:
+        return jsonify({'error': str(e)}), 502
+    if data is None:
+        response = jsonify({'error': 'Album art not available'})
+        response.status_code = 404
+        response.headers['Cache-Control'] = 'public, max-age=60'
+        return response
+
+    response = app.response_class(data, mimetype=mimetype)
+    # Strong validator: the bytes of a variant never change for a given URL
+    response.set_etag(hashlib.blake2b(data, digest_size=16).hexdigest())
+    if album or title:
+        response.headers['Cache-Control'] = f'public, max-age={ART_MAX_AGE}, immutable'
+    else:
+        response.headers['Cache-Control'] = 'no-cache'  # follows the current track
+    if 'format' not in request.args:
+        response.vary.add('Accept')
+    return response.make_conditional(request)
+
+# Station registry. STATIONS_FILE is a JSON list of the stations this process
+# serves, e.g. [{"id": "main", "name": "NeoRadio", "stream_url": "...",
+# "metadata_url": "...", "art_url": "..."}]. The first is the default, served
+# at / (other stations at /<id>); songs from before stations belong to "main".
+# Without the file the single station comes from STREAM_URL, METADATA_URL and
+# ART_SOURCE_URL.
+STATIONS_FILE = os.environ.get('STATIONS_FILE', 'stations.json')
+STREAM_URL = os.environ.get('STREAM_URL', 'https://d3d4yli4hf5bmh.cloudfront.net/hls/live.m3u8')
+STATION_ID_PATTERN = re.compile(r'^[a-z0-9][a-z0-9-]{0,31}$')
+RESERVED_STATION_IDS = {'api', 'health', 'hls', 'radio', 'static'}  # taken by other routes
+
+def load_stations(path=STATIONS_FILE):
+    """Station configs by id, in file order"""
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            entries = app.json.loads(f.read())
+    else:
+        entries = [{'id': 'main', 'name': 'NeoRadio', 'stream_url': STREAM_URL,
+                    'metadata_url': METADATA_URL, 'art_url': ART_SOURCE_URL}]
+    stations = {}
+    for entry in entries:
+        station_id = entry.get('id', '')
+        if not STATION_ID_PATTERN.match(station_id) or station_id in RESERVED_STATION_IDS:
+            raise ValueError(f'{path}: invalid station id {station_id!r}')
+        if station_id in stations:
+            raise ValueError(f'{path}: duplicate station id {station_id!r}')
+        if not entry.get('stream_url') or not entry.get('metadata_url'):
+            raise ValueError(f'{path}: station {station_id!r} needs stream_url and metadata_url')
+        stations[station_id] = {
+            'id': station_id,
+            'name': entry.get('name') or station_id,
+            'stream_url': entry['stream_url'],
+            'metadata_url': entry['metadata_url'],
+            'art_url': entry.get('art_url')
+        }
+    if not stations:
+        raise ValueError(f'{path}: no stations')
+    return stations
+
+STATIONS = load_stations()
+DEFAULT_STATION = next(iter(STATIONS))
+_station_state = {}
+
+def station_state(station=None):
+    """(now playing, track timing) caches of a station; the default station's are the module-level ones"""
+    if station is None or station == DEFAULT_STATION:
+        return _now_playing, _track_timing
+    state = _station_state.get(station)
+    if state is None:
+        state = _station_state.setdefault(station, (
+            {'data': None, 'track': None, 'payload': b'null', 'updated_at': 0.0},
+            {'key': None, 'started_at': None, 'full_track': False, 'average': float(DEFAULT_TRACK_SECONDS)}
+        ))
+    return state
+
+def poll_upstream_metadata(timeout=5, station=None):
+    """
+    Fetch a station's upstream metadata document into its now-playing cache.
+
+    Returns (status_code, next_poll_after); next_poll_after is None unless
+    upstream answered 200.
+    """
+    station = station or DEFAULT_STATION
+    response = requests.get(STATIONS[station]['metadata_url'], timeout=timeout)
+    if response.status_code != 200:
+        return response.status_code, None
+
+    data = response.json()
+    now = time.time()
+    if update_now_playing(data, now, station):
+        track = station_state(station)[0]['track']
+        try:
+            # Also creates the song row, so the hot cache below can find it
+            record_play(track, station)
+            if station == DEFAULT_STATION:
+                load_hot_ratings(track['title'], track['artist'])
+        except Exception as e:
+            print(f'Could not record play: {e}')
+    record_track_timing(data, now, station)
+    return 200, seconds_until_next_poll(data, now, station)
+
+# Metadata poller: one thread per process, of which one per host (the holder
+# of an fcntl lock on NOW_PLAYING_PATH + '.leader') polls upstream. Each
+# station is polled on its own schedule (when its next track is due, like
+# clients) on a bounded pool, so a refresh round costs the slowest upstream,
+# not the sum. The leader records plays and publishes each station's
+# document and next poll time into a shared table; the other workers' pollers
+# only read the table into their own caches, so /api/metadata never waits on
+# upstream and a track change costs one fetch and one plays insert per host.
+# When the leader exits the OS releases its lock and the next worker to try
+# takes over.
+METADATA_POLL_THREADS = int(os.environ.get('METADATA_POLL_THREADS', 8))
+METADATA_POLL_TICK = 0.5  # seconds between checks for due stations (and leadership)
+_station_poller = {'lock': threading.Lock(), 'pid': None, 'next_poll_at': {}, 'in_flight': set(),
+                   'leader_fd': None, 'versions': {}}
+# Per station, in STATIONS order: version, fetched_at, due_at, length, then
+# the upstream document as JSON
+NOW_PLAYING_PATH = os.environ.get('NOW_PLAYING_PATH', os.path.join(SHARED_MEMORY_DIR, 'neoradio-now-playing'))
+NOW_PLAYING_MAX_BYTES = 16384
+_NOW_PLAYING_HEADER = struct.Struct('<QddI')
+_NOW_PLAYING_SLOT = _NOW_PLAYING_HEADER.size + NOW_PLAYING_MAX_BYTES
+_now_playing_table = {'mmap': None, 'path': None, 'lock_fd': None, 'lock_path': None}
+_now_playing_thread_lock = threading.Lock()
+
+def now_playing_table():
+    """Map the shared now-playing table"""
+    return map_shared_table(_now_playing_table, NOW_PLAYING_PATH, len(STATIONS) * _NOW_PLAYING_SLOT)
+
+def now_playing_locked():
+    """Exclusive access to the shared now-playing table"""
+    return shared_table_locked(_now_playing_table, NOW_PLAYING_PATH, now_playing_table(), _now_playing_thread_lock)
+
+def publish_now_playing(station, due_at):
+    """Share a station's cached upstream document and next poll time with the host's other workers"""
+    now_playing = station_state(station)[0]
+    body = app.json.dumps(now_playing['data']).encode()
+    if len(body) > NOW_PLAYING_MAX_BYTES:
+        print(f'Now playing for {station} is {len(body)} bytes, over NOW_PLAYING_MAX_BYTES; not shared')
+        return
+    offset = list(STATIONS).index(station) * _NOW_PLAYING_SLOT
+    with now_playing_locked() as table:
+        version = _NOW_PLAYING_HEADER.unpack_from(table, offset)[0]
+        _NOW_PLAYING_HEADER.pack_into(table, offset, version + 1, now_playing['updated_at'], due_at, len(body))
+        start = offset + _NOW_PLAYING_HEADER.size
+        table[start:start + len(body)] = body
+
+def read_now_playing(poller):
+    """Apply the stations whose shared snapshot changed since this worker last read it"""
+    table = now_playing_table()
+    for index, station in enumerate(STATIONS):
+        offset = index * _NOW_PLAYING_SLOT
+        version = _NOW_PLAYING_HEADER.unpack_from(table, offset)[0]
+        if version == 0 or version == poller['versions'].get(station):
+            continue
+        with now_playing_locked() as table:
+            version, fetched_at, due_at, length = _NOW_PLAYING_HEADER.unpack_from(table, offset)
+            start = offset + _NOW_PLAYING_HEADER.size
+            body = bytes(table[start:start + length])
+        data = app.json.loads(body)
+        if update_now_playing(data, fetched_at, station) and station == DEFAULT_STATION:
+            # The leader recorded the play (and created the song); the hot
+            # copy of its votes is per worker
+            track = station_state(station)[0]['track']
+            try:
+                load_hot_ratings(track['title'], track['artist'])
+            except Exception as e:
+                print(f'Could not load hot ratings: {e}')
+        record_track_timing(data, fetched_at, station)
+        with poller['lock']:
+            poller['next_poll_at'][station] = due_at
+        poller['versions'][station] = version
+
+def claim_poller_leadership():
+    """The leader lock's file descriptor if this process now holds it, else None"""
+    fd = os.open(NOW_PLAYING_PATH + '.leader', os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.lockf(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        return None
+    return fd
+
+def poll_stations(stations=None, timeout=5, executor=None):
+    """Poll stations' upstreams concurrently; {station: (status_code or None, next_poll_after)}"""
+    stations = list(STATIONS) if stations is None else list(stations)
+    own_executor = executor is None
+    if own_executor:
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(METADATA_POLL_THREADS, len(stations))))
+    try:
+        futures = {executor.submit(poll_upstream_metadata, timeout, station): station for station in stations}
+        results = {}
+        for future in concurrent.futures.as_completed(futures):
+            station = futures[future]
+            try:
+                results[station] = future.result()
+            except Exception as e:
+                print(f'Metadata poll for {station} failed: {e}')
+                results[station] = (None, None)
+        return results
+    finally:
+        if own_executor:
+            # Every future is done; joining the idle threads means none is
+            # left mid-exit when a preloaded master forks (gevent trips on those)
+            executor.shutdown(wait=True)
+
+def poll_station_in_background(poller, station):
+    """Pool task: refresh one station, schedule its next poll and share the result"""
+    try:
+        status_code, next_poll_after = poll_upstream_metadata(station=station)
+    except Exception as e:
+        print(f'Metadata poll for {station} failed: {e}')
+        status_code, next_poll_after = None, None
+    due_at = time.time() + (next_poll_after or METADATA_MIN_POLL)
+    with poller['lock']:
+        poller['next_poll_at'][station] = due_at
+        poller['in_flight'].discard(station)
+    if status_code == 200:
+        try:
+            publish_now_playing(station, due_at)
+        except Exception as e:
+            print(f'Could not share now playing for {station}: {e}')
+
+def run_station_poller(poller):
+    """
+    Poll due stations while this process holds the leader lock, else read the
+    shared snapshots; exits once poller['pid'] is no longer this process
+    """
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=METADATA_POLL_THREADS,
+                                                     thread_name_prefix='metadata-poll')
+    try:
+        while poller['pid'] == os.getpid():
+            if poller['leader_fd'] is None:
+                poller['leader_fd'] = claim_poller_leadership()
+            if poller['leader_fd'] is None:
+                try:
+                    read_now_playing(poller)
+                except Exception as e:
+                    print(f'Could not read shared now playing: {e}')
+            else:
+                now = time.time()
+                with poller['lock']:
+                    due = [station for station in STATIONS
+                           if station not in poller['in_flight']
+                           and poller['next_poll_at'].get(station, 0) <= now]
+                    poller['in_flight'].update(due)
+                for station in due:
+                    executor.submit(poll_station_in_background, poller, station)
+            time.sleep(METADATA_POLL_TICK)
+    finally:
+        executor.shutdown(wait=False)
+        if poller['leader_fd'] is not None:
+            os.close(poller['leader_fd'])  # releases the leader lock
+            poller['leader_fd'] = None
+
+def ensure_station_poller():
+    """Start this process's metadata poller (after fork: threads do not survive it)"""
+    with _station_poller['lock']:
+        if _station_poller['pid'] == os.getpid():
+            return
+        _station_poller['pid'] = os.getpid()
+        _station_poller['next_poll_at'].clear()
+        _station_poller['in_flight'].clear()
+        _station_poller['versions'].clear()
+        # Inherited from a parent that led; fcntl locks are not
+        _station_poller['leader_fd'] = None
+    # Pick up what is already shared, so requests arriving before the
+    # thread's first tick are answered from it
+    try:
+        read_now_playing(_station_poller)
+    except Exception as e:
+        print(f'Could not read shared now playing: {e}')
+    threading.Thread(target=run_station_poller, args=(_station_poller,), name='metadata-poller', daemon=True).start()
+
+def station_poll_due_at(station):
+    """When the poller (this worker's, or the leader's it reads) will next refresh a station, or None if none runs"""
+    if _station_poller['pid'] != os.getpid():
+        return None
+    return _station_poller['next_poll_at'].get(station)
+
+# HLS relay (HLS_RELAY=1). Players load the stream from /hls/<station>/...
+# instead of the origin CDN. Each worker fetches a playlist at most once per
+# HLS_PLAYLIST_TTL and each segment once, coalescing concurrent misses into
+# a single upstream request, and serves every listener from memory. nginx
+# caches these responses in front of the app (see nginx.conf), so a host
+# makes one upstream request per playlist refresh and per segment however
+# many listeners it has.
+HLS_RELAY = os.environ.get('HLS_RELAY', '').lower() in ('1', 'true', 'yes')
+HLS_PLAYLIST_TTL = int(os.environ.get('HLS_PLAYLIST_TTL', 1))  # seconds; keep well under the target duration
+HLS_PLAYLIST_STALE_SECONDS = 30  # serve the last good playlist this long while the origin fails
+HLS_SEGMENT_CACHE_BYTES = int(os.environ.get('HLS_SEGMENT_CACHE_BYTES', 64 * 1024 * 1024))
+HLS_SEGMENT_MAX_AGE = 86400
+HLS_UPSTREAM_TIMEOUT = 10
+HLS_CONTENT_TYPES = {
+    '.m3u8': 'application/vnd.apple.mpegurl',
+    '.ts': 'video/mp2t',
+    '.aac': 'audio/aac',
+    '.m4s': 'video/iso.segment',
+    '.mp4': 'video/mp4',
+    '.m4a': 'audio/mp4',
+    '.vtt': 'text/vtt'
+}
+# Path segments may not start with a dot, which also rules out ..
+HLS_PATH_PATTERN = re.compile(r'^[A-Za-z0-9_-][A-Za-z0-9_.-]*(/[A-Za-z0-9_-][A-Za-z0-9_.-]*)*$')
+_hls_playlists = {}  # (station, path) -> {'body', 'fetched_at'}
+_hls_segments = collections.OrderedDict()  # (station, path) -> {'body', 'content_type'}, LRU order
+_hls = {'lock': threading.Lock(), 'in_flight': {}, 'segment_bytes': 0}
+
+def hls_origin(station):
+    """The directory of a station's stream URL, which relay paths are relative to"""
+    return STATIONS[station]['stream_url'].rsplit('/', 1)[0] + '/'
+
+def station_stream_url(station):
+    """The URL players should load a station's stream from"""
+    stream_url = station['stream_url']
+    if not HLS_RELAY:
+        return stream_url
+    return url_for('hls_relay', station=station['id'], path=stream_url.rsplit('/', 1)[1])
+
+def coalesced(key, fetch):
+    """Call fetch() once for all concurrent callers with the same key; each gets its result or exception"""
+    with _hls['lock']:
+        future = _hls['in_flight'].get(key)
+        leader = future is None
+        if leader:
+            future = _hls['in_flight'][key] = concurrent.futures.Future()
+    if not leader:
+        return future.result(timeout=HLS_UPSTREAM_TIMEOUT * 2)
+    try:
+        result = fetch()
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        with _hls['lock']:
+            del _hls['in_flight'][key]
+
+def fetch_hls_upstream(station, path):
+    """GET a playlist or segment from the station's origin; (status code, body, content type)"""
+    response = requests.get(hls_origin(station) + path, timeout=HLS_UPSTREAM_TIMEOUT)
+    return response.status_code, response.content, response.headers.get('Content-Type')
+
+def get_hls_playlist(station, path):
+    """(status code, playlist bytes) fresh within HLS_PLAYLIST_TTL, or stale while the origin fails"""
+    key = (station, path)
+    cached = _hls_playlists.get(key)
+    if cached and time.time() - cached['fetched_at'] < HLS_PLAYLIST_TTL:
+        return 200, cached['body']
+
+    def fetch():
+        # Re-check: another request may have refreshed it while we waited for the lock
+        cached = _hls_playlists.get(key)
+        if cached and time.time() - cached['fetched_at'] < HLS_PLAYLIST_TTL:
+            return 200, cached['body']
+        status_code, body, _ = fetch_hls_upstream(station, path)
+        if status_code != 200:
+            return status_code, None
+        # Absolute URIs on the origin would send players around the relay
+        body = body.replace(hls_origin(station).encode(), f'{request.script_root}/hls/{station}/'.encode())
+        _hls_playlists[key] = {'body': body, 'fetched_at': time.time()}
+        return 200, body
+
+    try:
+        status_code, body = coalesced(key, fetch)
+    except (requests.RequestException, concurrent.futures.TimeoutError):
+        status_code, body = 502, None
+    if body is None and status_code != 404 and cached \
+            and time.time() - cached['fetched_at'] < HLS_PLAYLIST_STALE_SECONDS:
+        return 200, cached['body']
+    return status_code, body
+
+def get_hls_segment(station, path):
+    """(status code, segment bytes, content type), fetched from the origin once and kept in the LRU"""
+    key = (station, path)
+    with _hls['lock']:
+        cached = _hls_segments.get(key)
+        if cached:
+            _hls_segments.move_to_end(key)
+            return 200, cached['body'], cached['content_type']
+
+    def fetch():
+        with _hls['lock']:
+            cached = _hls_segments.get(key)
+        if cached:
+            return 200, cached['body'], cached['content_type']
+        status_code, body, content_type = fetch_hls_upstream(station, path)
+        if status_code != 200:
+            return status_code, None, None
+        if len(body) <= HLS_SEGMENT_CACHE_BYTES:
+            with _hls['lock']:
+                _hls_segments[key] = {'body': body, 'content_type': content_type}
+                _hls['segment_bytes'] += len(body)
+                while _hls['segment_bytes'] > HLS_SEGMENT_CACHE_BYTES:
+                    _, evicted = _hls_segments.popitem(last=False)
+                    _hls['segment_bytes'] -= len(evicted['body'])
+        return 200, body, content_type
+
+    try:
+        return coalesced(key, fetch)
+    except (requests.RequestException, concurrent.futures.TimeoutError):
+        return 502, None, None
+
+@app.route('/hls/<station>/<path:path>')
+def hls_relay(station, path):
+    """A station's HLS playlist or segment through the relay"""
+    extension = os.path.splitext(path)[1].lower()
+    if not HLS_RELAY or station not in STATIONS or extension not in HLS_CONTENT_TYPES \
+            or not HLS_PATH_PATTERN.match(path):
+        return jsonify({'error': 'Not found'}), 404
+
+    if extension == '.m3u8':
+        status_code, body = get_hls_playlist(station, path)
+        content_type, cache_control = HLS_CONTENT_TYPES[extension], f'public, max-age={HLS_PLAYLIST_TTL}'
+    else:
+        status_code, body, content_type = get_hls_segment(station, path)
+        # Live segment names are never reused, so browsers and nginx can keep them
+        content_type = HLS_CONTENT_TYPES[extension] if not content_type or content_type == 'application/octet-stream' \
+            else content_type
+        cache_control = f'public, max-age={HLS_SEGMENT_MAX_AGE}, immutable'
+
+    if body is None:
+        response = jsonify({'error': 'Not found' if status_code == 404 else 'Upstream unavailable'})
+        response.status_code = 404 if status_code == 404 else 502
+        response.headers['Cache-Control'] = f'public, max-age={HLS_PLAYLIST_TTL}'
+        return response
+    response = app.response_class(body, content_type=content_type)
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+@app.route('/api/metadata')
+def get_metadata():
+    """Current track metadata for ?station= (default station if omitted)"""
+    station = request.args.get('station', DEFAULT_STATION)
+    if station not in STATIONS:
+        return jsonify({'error': 'Unknown station'}), 404
+    try:
+        now_playing = station_state(station)[0]
+        due_at = station_poll_due_at(station)
+        if due_at is not None and now_playing['data'] is not None:
+            # Served from the poller's cache: ask the client back just after the next refresh
+            status_code = 200
+            next_poll_after = int(max(METADATA_MIN_POLL, min(METADATA_MAX_POLL, due_at - time.time() + 1)))
+        else:
+            status_code, next_poll_after = poll_upstream_metadata(station=station)
+
+        if status_code == 200:
+            # Splice the cached track bytes in; nothing is re-encoded per request
+            body = b'{"track":%s,"next_poll_after":%d}' % (now_playing['payload'], next_poll_after)
+            result = app.response_class(body, mimetype='application/json')
+            # Per-browser only: a shared cache would hand out the track after it changed
+            result.headers['Cache-Control'] = f'private, max-age={next_poll_after}'
+            return result
+        else:
+            return jsonify({'error': f'HTTP {status_code}'}), status_code
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/history')
+def get_history():
+    """A station's recently played tracks, newest first, paginated with ?before=<play id>"""
+    station = request.args.get('station', DEFAULT_STATION)
+    if station not in STATIONS:
+        return jsonify({'error': 'Unknown station'}), 404
+    limit = request.args.get('limit', 20, type=int)
+    limit = max(1, min(limit, HISTORY_MAX_LIMIT))
+    before = request.args.get('before', type=int)
+
+    if before is None:
+        cached = _history_cache.get((station, limit))
+        if cached and time.time() - cached['created_at'] < HISTORY_CACHE_SECONDS:
+            return app.response_class(cached['body'], mimetype='application/json')
+
+    conn = get_db_connection(readonly=True)
+    # Keyset pagination on (started_at, id), served by idx_plays_started_at
+    if before is None:
+        rows = execute_query(conn, '''
+            SELECT plays.id, plays.started_at, songs.title, songs.artist, songs.album, songs.year
+            FROM plays JOIN songs ON songs.id = plays.song_id
+            WHERE songs.station = ?
+            ORDER BY plays.started_at DESC, plays.id DESC
+            LIMIT ?
+        ''', (station, limit), fetch_all=True)
+    else:
+        rows = execute_query(conn, '''
+            SELECT plays.id, plays.started_at, songs.title, songs.artist, songs.album, songs.year
+            FROM plays JOIN songs ON songs.id = plays.song_id
+            WHERE songs.station = ? AND (plays.started_at, plays.id) < (SELECT started_at, id FROM plays WHERE id = ?)
+            ORDER BY plays.started_at DESC, plays.id DESC
+            LIMIT ?
+        ''', (station, before, limit), fetch_all=True)
+    conn.close()
+
+    plays = [{
+        'id': row['id'],
+        'title': row['title'],
+        'artist': row['artist'],
+        'album': row['album'],
+        'year': row['year'],
+        'started_at': format_timestamp(row['started_at'])
+    } for row in rows]
+    body = app.json.dumps({
+        'plays': plays,
+        'next_before': plays[-1]['id'] if len(plays) == limit else None
+    })
+
+    if before is None:
+        _history_cache[(station, limit)] = {'body': body, 'created_at': time.time()}
+    return app.response_class(body, mimetype='application/json')
+
+@app.route('/api/songs/rating', methods=['POST'])
+@admission_controlled('vote')
+def rate_song():
+    """Rate a song (thumbs up = 1, thumbs down = -1)"""
+    data = request.get_json()
+
+    user_id = get_user_id()
+    title = data.get('title')
+    artist = data.get('artist')
+    album = data.get('album', '')
+    year = data.get('year', '')
+    rating = data.get('rating')  # 1 for thumbs up, -1 for thumbs down
+    station = data.get('station') or DEFAULT_STATION
+
+    if not title or not artist or rating not in [1, -1] or station not in STATIONS:
+        return jsonify({'error': 'Invalid data'}), 400
+
+    # Opened once the payload is valid, and closed on every path below
+    conn = get_db_connection()
+    try:
+        # Insert or get song
+        song_id = get_or_create_song_id(conn, title, artist, album, year, station)
+
+        # Look up the listener's existing vote first: its old value and
+        # created_at are needed for the chart deltas, and checking first keeps
+        # one vote per listener even when ratings is partitioned (see
+        # partition-ratings.sql), where UNIQUE must include created_at
+        IntegrityError = psycopg2.IntegrityError if USE_POSTGRES else sqlite3.IntegrityError
+        existing = execute_query(conn, '''
+            SELECT id, rating, created_at FROM ratings
+            WHERE song_id = ? AND user_id = ?
+        ''', (song_id, user_id), fetch_one=True)
+        if not existing:
+            try:
+                execute_query(conn, '''
+                    INSERT INTO ratings (song_id, user_id, rating)
+                    VALUES (?, ?, ?)
+                ''', (song_id, user_id, rating))
+            except IntegrityError:
+                # Lost a race with a concurrent first vote from the same user
+                # For PostgreSQL, we need to rollback the failed transaction first
+                conn.rollback()
+                existing = execute_query(conn, '''
+                    SELECT id, rating, created_at FROM ratings
+                    WHERE song_id = ? AND user_id = ?
+                ''', (song_id, user_id), fetch_one=True)
+
+        if existing:
+            # User already rated, update the rating
+            execute_query(conn, '''
+                UPDATE ratings SET rating = ?
+                WHERE song_id = ? AND user_id = ?
+            ''', (rating, song_id, user_id))
+            previous = existing['rating']
+            created_at = parse_timestamp(existing['created_at'])
+        else:
+            previous = None
+            created_at = datetime.now(timezone.utc).replace(tzinfo=None)
+
+        # Keep the precomputed charts in step, in the same transaction as the vote
+        up_delta = (rating == 1) - (previous == 1)
+        down_delta = (rating == -1) - (previous == -1)
+        apply_chart_delta(conn, song_id, created_at, up_delta, down_delta, station)
+        if existing:
+            apply_rollup_delta(conn, existing['id'], song_id, created_at, up_delta, down_delta)
+        if USE_POSTGRES:
+            publish_invalidation(conn, song_id, user_id, rating)
+        conn.commit()
+        if up_delta or down_delta:
+            _charts_cache.clear()
+        if not USE_POSTGRES:
+            publish_invalidation(conn, song_id, user_id, rating)
+        publish_live_delta(song_id, up_delta, down_delta)
+        forget_my_ratings(user_id)
+
+        # Get updated counts (in memory when voting on the now-playing song)
+        counts = apply_hot_vote(song_id, user_id, rating) or get_rating_counts(conn, song_id)
+
+        response = jsonify({
+            'success': True,
+            'thumbs_up': counts['thumbs_up'],
+            'thumbs_down': counts['thumbs_down']
+        })
+        if DATABASE_REPLICA_URLS:
+            # Read-your-writes: keep this caller on the primary while replicas catch up
+            response.set_cookie(PRIMARY_STICKY_COOKIE, f'{time.time() + REPLICA_STICKY_SECONDS:.3f}',
+                                max_age=REPLICA_STICKY_SECONDS, httponly=True, samesite='Lax')
+        return response
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    finally:
+        conn.close()
+
+@app.route('/api/songs/rating/<title>/<artist>')
+@admission_controlled('read')
+def get_song_rating(title, artist):
+    """Get rating counts for a specific song (on ?station=, default station if omitted)"""
+    station = request.args.get('station', DEFAULT_STATION)
+    if station not in STATIONS:
+        return jsonify({'error': 'Unknown station'}), 404
+    hot = hot_rating(title, artist, get_user_id()) if station == DEFAULT_STATION else None
+    if hot is not None:
+        return jsonify(hot)
+
+    conn = get_db_connection(readonly=True)
+
+    song_id = lookup_song_id(conn, title, artist, station)
+
+    if not song_id:
+        conn.close()
+        return jsonify({'thumbs_up': 0, 'thumbs_down': 0, 'user_rating': None})
+
+    # Get counts
+    counts = get_rating_counts(conn, song_id)
+
+    # Get user's rating if they have one
+    user_id = get_user_id()
+
+    user_rating = None
+    user_rating_row = execute_query(conn, '''
+        SELECT rating FROM ratings WHERE song_id = ? AND user_id = ?
+    ''', (song_id, user_id), fetch_one=True)
+    if user_rating_row:
+        user_rating = user_rating_row['rating']
+
+    conn.close()
+
+    return jsonify({
+        'thumbs_up': counts['thumbs_up'],
+        'thumbs_down': counts['thumbs_down'],
+        'user_rating': user_rating
+    })
+
+MY_RATINGS_MAX_LIMIT = 100
+MY_RATINGS_CACHE_SECONDS = 30
+MY_RATINGS_CACHE_MAX = 10000  # listeners whose first page is kept per worker
+_my_ratings_cache = collections.OrderedDict()  # user_id -> {limit: cached first page}
+_my_ratings_cache_lock = threading.Lock()
+
+def forget_my_ratings(user_id):
+    """Drop a listener's cached first pages after they vote"""
+    with _my_ratings_cache_lock:
+        _my_ratings_cache.pop(user_id, None)
+
+@app.route('/api/me/ratings')
+@admission_controlled('read')
+def get_my_ratings():
+    """The caller's votes, newest first, paginated with ?before=<rating id>"""
+    user_id = get_user_id()
+    limit = request.args.get('limit', 20, type=int)
+    limit = max(1, min(limit, MY_RATINGS_MAX_LIMIT))
+    before = request.args.get('before', type=int)
+
+    if before is None:
+        with _my_ratings_cache_lock:
+            cached = _my_ratings_cache.get(user_id, {}).get(limit)
+            if cached and time.time() - cached['created_at'] < MY_RATINGS_CACHE_SECONDS:
+                _my_ratings_cache.move_to_end(user_id)
+                return app.response_class(cached['body'], mimetype='application/json')
+
+    conn = get_db_connection(readonly=True)
+    # Keyset pagination on (user_id, created_at, id); idx_ratings_user_recent
+    # holds every ratings column used, so only songs rows are fetched
+    if before is None:
+        rows = execute_query(conn, '''
+            SELECT ratings.id, ratings.rating, ratings.created_at,
+                songs.id AS song_id, songs.title, songs.artist, songs.album, songs.year
+            FROM ratings JOIN songs ON songs.id = ratings.song_id
+            WHERE ratings.user_id = ?
+            ORDER BY ratings.created_at DESC, ratings.id DESC
+            LIMIT ?
+        ''', (user_id, limit), fetch_all=True)
+    else:
+        rows = execute_query(conn, '''
+            SELECT ratings.id, ratings.rating, ratings.created_at,
+                songs.id AS song_id, songs.title, songs.artist, songs.album, songs.year
+            FROM ratings JOIN songs ON songs.id = ratings.song_id
+            WHERE ratings.user_id = ? AND (ratings.created_at, ratings.id) < (
+                SELECT created_at, id FROM ratings WHERE user_id = ? AND id = ?
+            )
+            ORDER BY ratings.created_at DESC, ratings.id DESC
+            LIMIT ?
+        ''', (user_id, user_id, before, limit), fetch_all=True)
+    conn.close()
+
+    ratings = [{
+        'id': row['id'],
+        'song_id': row['song_id'],
+        'title': row['title'],
+        'artist': row['artist'],
+        'album': row['album'],
+        'year': row['year'],
+        'rating': row['rating'],
+        'created_at': format_timestamp(row['created_at'])
+    } for row in rows]
+    body = app.json.dumps({
+        'ratings': ratings,
+        'next_before': ratings[-1]['id'] if len(ratings) == limit else None
+    })
+
+    if before is None:
+        with _my_ratings_cache_lock:
+            _my_ratings_cache.setdefault(user_id, {})[limit] = {'body': body, 'created_at': time.time()}
+            _my_ratings_cache.move_to_end(user_id)
+            while len(_my_ratings_cache) > MY_RATINGS_CACHE_MAX:
+                _my_ratings_cache.popitem(last=False)
+    return app.response_class(body, mimetype='application/json')
+
+# Cross-worker cache invalidation. Workers cache vote-derived state (the hot
+# song's votes, listeners' first page of /api/me/ratings), so rate_song()
+# publishes every committed vote and the other workers' bus threads fold it
+# into their own caches: the vote itself goes into the hot cache (no reload)
+# and the listener's cached pages are dropped. PostgreSQL carries messages
+# with LISTEN/NOTIFY, reaching workers on every host; SQLite (single host)
+# uses a ring of recent messages in shared memory behind a generation
+# counter. A worker that may have missed messages (its LISTEN connection
+# dropped, or it fell more than the ring behind) flushes those caches
+# instead. Song ids never change and now-playing is refreshed by each
+# worker's poller, so neither needs invalidating.
+INVALIDATION_CHANNEL = 'neoradio_invalidate'
+INVALIDATION_PATH = os.environ.get('INVALIDATION_PATH', os.path.join(SHARED_MEMORY_DIR, 'neoradio-invalidations'))
+INVALIDATION_SLOTS = 4096
+INVALIDATION_POLL_SECONDS = 0.005  # how often SQLite workers check the generation counter
+INVALIDATION_RECONNECT_SECONDS = 1
+_INVALIDATION_HEADER = struct.Struct('<Q')  # generation of the newest message
+_INVALIDATION_SLOT = struct.Struct('<QdQq32sb')  # generation, published_at, origin, song_id, user_id, rating
+_invalidation_table = {'mmap': None, 'path': None, 'slots': None, 'lock_fd': None, 'lock_path': None}
+_invalidation_thread_lock = threading.Lock()
+_invalidation_bus = {
+    'pid': None,
+    'origin': None,  # random id of this worker, so it skips its own messages
+    'generation': None,  # SQLite: newest message applied
+    'running': False,
+    'thread': None,
+    'applied': 0,
+    'flushes': 0,
+    'lags': collections.deque(maxlen=1024)  # seconds from publish to apply, most recent messages
+}
+
+def invalidation_origin():
+    """This worker's id on the bus (regenerated after fork)"""
+    if _invalidation_bus['pid'] != os.getpid():
+        _invalidation_bus.update(pid=os.getpid(), origin=uuid.uuid4().int >> 65, generation=None, running=False)
+    return _invalidation_bus['origin']
+
+def invalidation_table():
+    """Map the shared invalidation ring (the slot count is fixed per mapping)"""
+    if _invalidation_table['slots'] != INVALIDATION_SLOTS:
+        _invalidation_table['path'] = None  # remap at the new size
+        _invalidation_table['slots'] = INVALIDATION_SLOTS
+    return map_shared_table(_invalidation_table, INVALIDATION_PATH,
+                            _INVALIDATION_HEADER.size + INVALIDATION_SLOTS * _INVALIDATION_SLOT.size)
+
+def invalidation_locked():
+    return shared_table_locked(_invalidation_table, INVALIDATION_PATH, invalidation_table(), _invalidation_thread_lock)
+
+def publish_invalidation(conn, song_id, user_id, rating):
+    """
+    Tell the other workers about a vote. On PostgreSQL call it before the
+    vote's commit (NOTIFY is delivered when, and only if, the transaction
+    commits); on SQLite after it.
+    """
+    origin = invalidation_origin()
+    if USE_POSTGRES:
+        payload = app.json.dumps([origin, song_id, user_id, rating, time.time()])
+        execute_query(conn, 'SELECT pg_notify(?, ?)', (INVALIDATION_CHANNEL, payload))
+        return
+    with invalidation_locked() as table:
+        generation, = _INVALIDATION_HEADER.unpack_from(table, 0)
+        generation += 1
+        offset = _INVALIDATION_HEADER.size + (generation % INVALIDATION_SLOTS) * _INVALIDATION_SLOT.size
+        _INVALIDATION_SLOT.pack_into(table, offset, generation, time.time(), origin, song_id, user_id.encode(), rating)
+        _INVALIDATION_HEADER.pack_into(table, 0, generation)
+
+def apply_invalidation(origin, song_id, user_id, rating, published_at):
+    """Fold another worker's vote into this worker's caches"""
+    if origin == invalidation_origin():
+        return
+    apply_hot_vote(song_id, user_id, rating)
+    forget_my_ratings(user_id)
+    _invalidation_bus['applied'] += 1
+    _invalidation_bus['lags'].append(max(0.0, time.time() - published_at))
+
+def flush_vote_caches():
+    """Full flush when messages may have been missed: reload the hot song on next read, drop every cached page"""
+    _hot_ratings['loaded_at'] = 0.0
+    with _my_ratings_cache_lock:
+        _my_ratings_cache.clear()
+    _invalidation_bus['flushes'] += 1
+
+def apply_invalidations():
+    """SQLite: apply messages published since the last call; returns how many were read"""
+    invalidation_origin()
+    table = invalidation_table()
+    generation, = _INVALIDATION_HEADER.unpack_from(table, 0)
+    seen = _invalidation_bus['generation']
+    if generation == seen:
+        return 0
+    messages = []
+    if seen is not None and seen < generation:
+        with invalidation_locked() as table:
+            for number in range(seen + 1, generation + 1):
+                offset = _INVALIDATION_HEADER.size + (number % INVALIDATION_SLOTS) * _INVALIDATION_SLOT.size
+                message = _INVALIDATION_SLOT.unpack_from(table, offset)
+                if message[0] != number:
+                    break  # overwritten: we fell more than the ring behind
+                messages.append(message)
+    _invalidation_bus['generation'] = generation
+    if len(messages) != generation - (seen or 0) or seen is None:
+        # First look after start, a recreated ring, or overrun: cannot tell what was missed
+        flush_vote_caches()
+        return 0
+    for number, published_at, origin, song_id, user_id, rating in messages:
+        apply_invalidation(origin, song_id, user_id.decode(), rating, published_at)
+    return len(messages)
+
+def listen_for_invalidations():
+    """PostgreSQL: apply NOTIFY messages as they arrive, reconnecting (and flushing) when the connection drops"""
+    conn = None
+    while _invalidation_bus['running'] and _invalidation_bus['pid'] == os.getpid():
+        try:
+            if conn is None:
+                conn = psycopg2.connect(DATABASE_URL)
+                conn.autocommit = True
+                execute_query(conn, f'LISTEN {INVALIDATION_CHANNEL}')
+                # Anything published while we were not listening is lost
+                flush_vote_caches()
+            if select.select([conn], [], [], 5)[0]:
+                conn.poll()
+                while conn.notifies:
+                    notify = conn.notifies.pop(0)
+                    apply_invalidation(*app.json.loads(notify.payload))
+        except (psycopg2.Error, OSError) as e:
+            print(f'Invalidation listener: {e}; reconnecting')
+            if conn is not None:
+                conn.close()
+            conn = None
+            time.sleep(INVALIDATION_RECONNECT_SECONDS)
+    if conn is not None:
+        conn.close()
+
+def poll_invalidations():
+    """SQLite: check the shared generation counter every INVALIDATION_POLL_SECONDS"""
+    while _invalidation_bus['running'] and _invalidation_bus['pid'] == os.getpid():
+        try:
+            apply_invalidations()
+        except Exception as e:
+            print(f'Invalidation poller: {e}')
+        time.sleep(INVALIDATION_POLL_SECONDS)
+
+def ensure_invalidation_listener():
+    """Start this worker's bus thread (threads do not survive fork, so per process)"""
+    invalidation_origin()
+    with _invalidation_thread_lock:
+        if _invalidation_bus['running']:
+            return
+        _invalidation_bus['running'] = True
+    target = listen_for_invalidations if USE_POSTGRES else poll_invalidations
+    _invalidation_bus['thread'] = threading.Thread(target=target, name='cache-invalidation', daemon=True)
+    _invalidation_bus['thread'].start()
+
+@app.route('/api/cache/invalidations')
+def invalidation_stats():
+    """This worker's bus counters and recent publish-to-apply lag"""
+    lags = sorted(_invalidation_bus['lags'])
+
+    def lag_ms(pct):
+        return round(lags[min(len(lags) - 1, int(len(lags) * pct / 100))] * 1000, 3) if lags else None
+
+    return jsonify({
+        'transport': 'notify' if USE_POSTGRES else 'shared-memory',
+        'listening': _invalidation_bus['running'] and _invalidation_bus['pid'] == os.getpid(),
+        'applied': _invalidation_bus['applied'],
+        'flushes': _invalidation_bus['flushes'],
+        'lag_ms': {'p50': lag_ms(50), 'p99': lag_ms(99), 'max': round(lags[-1] * 1000, 3) if lags else None}
+    })
+
+# Song search. Every word but the last must match a whole title/artist word;
+# the last is a prefix, so results follow the user's typing. Results come in
+# rank tiers: songs whose title matches the last word, then those that match
+# it only by artist. Within a tier the order is the song's search key, shorter
+# titles first (the typed words cover more of them), then older songs. Both
+# backends index matches in that order (the FTS5 rowid on SQLite,
+# idx_songs_search_key on PostgreSQL), so a page reads its rows and stops,
+# however much of the catalogue a prefix matches. Pages continue after
+# (tier, key) of the last row.
+SEARCH_MAX_LIMIT = 50
+SEARCH_MAX_TERMS = 8
+SEARCH_ID_BITS = 40  # the low bits of a search key are the song id
+SEARCH_CACHE_MAX = 2048  # distinct (station, query, cursor, limit) results kept per worker
+SEARCH_CACHE_SECONDS = 30
+_search_cache = collections.OrderedDict()
+_search_cache_lock = threading.Lock()
+
+def search_key(row=None):
+    """SQL for a song's search key: title length (capped at 255) above the song id"""
+    column = f'{row}.' if row else ''
+    shortest = 'least' if USE_POSTGRES else 'min'
+    return f'(CAST({shortest}(length({column}title), 255) AS BIGINT) << {SEARCH_ID_BITS}) + {column}id'
+
+def search_terms(query):
+    """Lowercased words of a query, or None if it is too short to search"""
+    terms = re.findall(r'\w+', query.lower())[:SEARCH_MAX_TERMS]
+    # A single letter prefix would match most of the catalogue: after complete
+    # words it adds nothing worth the cost, on its own it is not searched
+    if len(terms) > 1 and len(terms[-1]) < 2:
+        terms.pop()
+    if not terms or (len(terms) == 1 and len(terms[0]) < 2):
+        return None
+    return terms
+
+def search_songs(conn, terms, after=None, limit=20, station=None):
+    """(tier, row) for ranked matches of search_terms() on a station, continuing after a (tier, key) cursor"""
+    words, prefix = terms[:-1], terms[-1]
+    if USE_POSTGRES:
+        words = ''.join(f'{word} & ' for word in words)
+        tiers = [f'{words}{prefix}:*A', f'{words}{prefix}:*B & !{prefix}:*A']
+        query = """
+            SELECT id, title, artist, album, year, station, search_key AS key FROM songs
+            WHERE search_vector @@ to_tsquery('simple', ?) AND station = ? AND search_key > ?
+            ORDER BY search_key LIMIT ?
+        """
+    else:
+        words = ''.join(f'"{word}" AND ' for word in words)
+        tiers = [f'{words}title : "{prefix}"*', f'{words}(artist : "{prefix}"* NOT title : "{prefix}"*)']
+        query = f"""
+            SELECT songs.id, songs.title, songs.artist, songs.album, songs.year, songs.station,
+                   songs_search.rowid AS key
+            FROM songs_search JOIN songs ON songs.id = songs_search.rowid & {(1 << SEARCH_ID_BITS) - 1}
+            WHERE songs_search MATCH ? AND songs.station = ? AND songs_search.rowid > ?
+            ORDER BY songs_search.rowid LIMIT ?
+        """
+    first_tier, after_key = after or (0, -1)
+    matches = []
+    for tier in range(first_tier, len(tiers)):
+        rows = execute_query(conn, query, (
+            tiers[tier], station or DEFAULT_STATION, after_key if tier == first_tier else -1, limit - len(matches)
+        ), fetch_all=True)
+        matches += [(tier, row) for row in rows]
+        if len(matches) == limit:
+            break
+    return matches
+
+def parse_search_cursor(cursor):
+    """(tier, key) from a next_cursor value; raises ValueError if malformed"""
+    tier, _, key = cursor.partition(':')
+    if tier not in ('0', '1'):
+        raise ValueError(f'Unknown search tier: {tier}')
+    return int(tier), int(key)
+
+@app.route('/api/songs/search')
+@admission_controlled('read')
+def search():
+    """Songs on ?station= (default station if omitted) matching ?q= by title or artist, best first, paginated with ?cursor="""
+    station = request.args.get('station', DEFAULT_STATION)
+    if station not in STATIONS:
+        return jsonify({'error': 'Unknown station'}), 404
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'q is required'}), 400
+    limit = request.args.get('limit', 20, type=int)
+    limit = max(1, min(limit, SEARCH_MAX_LIMIT))
+    cursor = request.args.get('cursor')
+    after = None
+    if cursor:
+        try:
+            after = parse_search_cursor(cursor)
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+
+    terms = search_terms(query)
+    if terms is None:
+        return jsonify({'songs': [], 'next_cursor': None})
+
+    key = (station, tuple(terms), after, limit)
+    with _search_cache_lock:
+        cached = _search_cache.get(key)
+        if cached and time.time() - cached['created_at'] < SEARCH_CACHE_SECONDS:
+            _search_cache.move_to_end(key)
+            return app.response_class(cached['body'], mimetype='application/json')
+
+    conn = get_db_connection(readonly=True)
+    matches = search_songs(conn, terms, after, limit, station)
+    conn.close()
+
+    songs = [{
+        'id': row['id'],
+        'title': row['title'],
+        'artist': row['artist'],
+        'album': row['album'],
+        'year': row['year'],
+        'station': row['station']
+    } for _, row in matches]
+    next_cursor = None
+    if len(matches) == limit:
+        tier, row = matches[-1]
+        next_cursor = f"{tier}:{row['key']}"
+    body = app.json.dumps({'songs': songs, 'next_cursor': next_cursor})
+
+    with _search_cache_lock:
+        _search_cache[key] = {'body': body, 'created_at': time.time()}
+        _search_cache.move_to_end(key)
+        while len(_search_cache) > SEARCH_CACHE_MAX:
+            _search_cache.popitem(last=False)
+    return app.response_class(body, mimetype='application/json')
+
+@app.route('/api/ratings/live')
+def live_ratings():
+    """Server-Sent Events stream of rating totals for the now-playing song"""
+    with _live['lock']:
+        if _live['subscribers'] >= LIVE_MAX_SUBSCRIBERS:
+            # The client keeps loading the rating on each track change instead
+            response = jsonify({'error': 'Live updates unavailable'})
+            response.status_code = 503
+            response.headers['Retry-After'] = '30'
+            return response
+        _live['subscribers'] += 1
+    ensure_live_broadcaster()
+
+    def stream():
+        try:
+            yield from live_rating_events()
+        finally:
+            with _live['lock']:
+                _live['subscribers'] -= 1
+
+    response = app.response_class(stream(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Let nginx pass events through as they are written
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/api/charts')
+def get_charts():
+    """Top-rated songs on ?station= (default station if omitted) for a window (all, week, day), ranked by Wilson lower bound"""
+    station = request.args.get('station', DEFAULT_STATION)
+    if station not in STATIONS:
+        return jsonify({'error': 'Unknown station'}), 404
+    window = request.args.get('window', 'week')
+    if window not in CHART_WINDOWS:
+        return jsonify({'error': f'window must be one of {", ".join(CHART_WINDOWS)}'}), 400
+    limit = request.args.get('limit', 20, type=int)
+    limit = max(1, min(limit, CHART_MAX_LIMIT))
+
+    period = chart_periods(datetime.now(timezone.utc))[window]
+    cached = _charts_cache.get((station, period, limit))
+    if cached and time.time() - cached['created_at'] < CHART_CACHE_SECONDS:
+        return app.response_class(cached['body'], mimetype='application/json')
+
+    # Reads only the top of idx_chart_scores_station_rank, independent of ratings volume
+    conn = get_db_connection(readonly=True)
+    rows = execute_query(conn, '''
+        SELECT songs.id, songs.title, songs.artist, songs.album, songs.year, chart_scores.station,
+            chart_scores.thumbs_up, chart_scores.thumbs_down, chart_scores.score
+        FROM chart_scores JOIN songs ON songs.id = chart_scores.song_id
+        WHERE chart_scores.station = ? AND chart_scores.period = ?
+            AND chart_scores.thumbs_up + chart_scores.thumbs_down > 0
+        ORDER BY chart_scores.score DESC
+        LIMIT ?
+    ''', (station, period, limit), fetch_all=True)
+    conn.close()
+
+    body = app.json.dumps({'station': station, 'window': window, 'period': period, 'songs': rows})
+    _charts_cache[(station, period, limit)] = {'body': body, 'created_at': time.time()}
+    return app.response_class(body, mimetype='application/json')
+
+@app.cli.command('rebuild-charts')
+def rebuild_charts_command():
+    """Recompute chart rankings from the ratings table"""
+    conn = get_db_connection()
+    try:
+        count = rebuild_charts(conn)
+    finally:
+        conn.close()
+    print(f'Rebuilt {count} chart entries')
+
+@app.route('/api/songs/<int:song_id>/stats')
+def get_song_stats(song_id):
+    """Vote time series for a song from the hourly/daily rollups (never raw ratings)"""
+    bucket = request.args.get('bucket', 'hour')
+    if bucket not in ROLLUP_BUCKETS:
+        return jsonify({'error': f'bucket must be one of {", ".join(ROLLUP_BUCKETS)}'}), 400
+    try:
+        until = datetime.fromisoformat(request.args['until'].rstrip('Z')) if 'until' in request.args \
+            else datetime.now(timezone.utc).replace(tzinfo=None)
+        since = datetime.fromisoformat(request.args['since'].rstrip('Z')) if 'since' in request.args \
+            else until - timedelta(seconds=STATS_DEFAULT_RANGE[bucket])
+    except ValueError:
+        return jsonify({'error': 'since/until must be ISO 8601 timestamps'}), 400
+
+    conn = get_db_connection(readonly=True)
+    rows = execute_query(conn, '''
+        SELECT bucket_start, thumbs_up, thumbs_down FROM rating_rollups
+        WHERE bucket_size = ? AND song_id = ? AND bucket_start >= ? AND bucket_start <= ?
+        ORDER BY bucket_start
+    ''', (bucket, song_id,
+          bucket_start(since, bucket).strftime('%Y-%m-%d %H:%M:%S'),
+          until.strftime('%Y-%m-%d %H:%M:%S')), fetch_all=True)
+    conn.close()
+
+    return jsonify({
+        'song_id': song_id,
+        'bucket': bucket,
+        'series': [{
+            'bucket_start': format_timestamp(row['bucket_start']),
+            'thumbs_up': row['thumbs_up'],
+            'thumbs_down': row['thumbs_down']
+        } for row in rows]
+    })
+
+@app.cli.command('rollup-ratings')
+def rollup_ratings_command():
+    """Aggregate new ratings into hourly/daily rollups (safe to run repeatedly, e.g. from cron)"""
+    conn = get_db_connection()
+    try:
+        count = rollup_ratings(conn)
+    finally:
+        conn.close()
+    print(f'Rolled up {count} ratings')
+
+@app.route('/api/songs/export')
+def export_songs():
+    """Stream every song on ?station= (default station if omitted) with its all-time vote totals as NDJSON (default) or CSV"""
+    station = request.args.get('station', DEFAULT_STATION)
+    if station not in STATIONS:
+        return jsonify({'error': 'Unknown station'}), 404
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in ('ndjson', 'csv'):
+        return jsonify({'error': 'format must be ndjson or csv'}), 400
+
+    columns = ['id', 'title', 'artist', 'album', 'year', 'station', 'thumbs_up', 'thumbs_down']
+    conn = get_db_connection(readonly=True)
+    rows = iter_query(conn, '''
+        SELECT songs.id, songs.title, songs.artist, songs.album, songs.year, songs.station,
+            COALESCE(chart_scores.thumbs_up, 0) AS thumbs_up,
+            COALESCE(chart_scores.thumbs_down, 0) AS thumbs_down
+        FROM songs
+        LEFT JOIN chart_scores ON chart_scores.song_id = songs.id AND chart_scores.period = 'all'
+        WHERE songs.station = ?
+        ORDER BY songs.id
+    ''', (station,), as_tuples=export_format == 'csv')
+
+    if export_format == 'csv':
+        response = csv_response(rows, columns, filename='songs.csv')
+    else:
+        response = ndjson_response(rows, filename='songs.ndjson')
+    # The connection has to outlive the view: close it once the body is sent
+    response.call_on_close(conn.close)
+    return response
+
+# Bulk export/import: column order is the file format contract
+BULK_TABLES = {
+    'songs': ['id', 'title', 'artist', 'album', 'year', 'station'],
+    'ratings': ['id', 'song_id', 'user_id', 'rating', 'created_at']
+}
+BULK_INTEGER_COLUMNS = {'id', 'song_id', 'rating'}
+BULK_BATCH_SIZE = 50000
+BULK_PROGRESS_EVERY = 500000
+
+def bulk_format(path, explicit=None):
+    """Pick csv, ndjson or parquet from an explicit option or the file extension"""
+    if explicit:
+        return explicit
+    extension = os.path.splitext(path)[1].lower()
+    formats = {'.csv': 'csv', '.ndjson': 'ndjson', '.jsonl': 'ndjson', '.parquet': 'parquet'}
+    if extension not in formats:
+        raise click.UsageError(f'Cannot infer format from {path!r}; pass --format')
+    return formats[extension]
+
+def _bulk_value(value):
+    """Normalize a DB value for export (PostgreSQL datetimes become SQLite-style text)"""
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    return value
+
+def _parquet_schema(columns):
+    return pyarrow.schema([
+        (column, pyarrow.int64() if column in BULK_INTEGER_COLUMNS else pyarrow.string())
+        for column in columns
+    ])
+
+class _Progress:
+    """Prints row counts and throughput every BULK_PROGRESS_EVERY rows"""
+
+    def __init__(self, label):
+        self.label = label
+        self.count = 0
+        self.started = time.perf_counter()
+
+    def add(self, rows):
+        before = self.count
+        self.count += rows
+        if self.count // BULK_PROGRESS_EVERY != before // BULK_PROGRESS_EVERY:
+            self.report()
+
+    def report(self, final=False):
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        prefix = 'Done: ' if final else ''
+        click.echo(f'{prefix}{self.label} {self.count:,} rows ({self.count / elapsed:,.0f} rows/s)', err=True)
+
+def export_table(conn, table, path, file_format):
+    """Stream a table to a CSV, NDJSON or Parquet file; returns the row count"""
+    columns = BULK_TABLES[table]
+    rows = iter_query(conn, f'SELECT {", ".join(columns)} FROM {table} ORDER BY id',
+                      chunk_size=BULK_BATCH_SIZE, as_tuples=True)
+    progress = _Progress(f'exported {table}:')
+
+    if file_format == 'parquet':
+        if pyarrow is None:
+            raise click.ClickException('Parquet export needs pyarrow (pip install pyarrow)')
+        schema = _parquet_schema(columns)
+        with pyarrow.parquet.ParquetWriter(path, schema, compression='zstd') as writer:
+            batch = []
+            for row in rows:
+                batch.append(tuple(_bulk_value(value) for value in row))
+                if len(batch) >= BULK_BATCH_SIZE:
+                    writer.write_table(pyarrow.Table.from_arrays(
+                        [pyarrow.array(values, type=field.type) for values, field in zip(zip(*batch), schema)],
+                        schema=schema))
+                    progress.add(len(batch))
+                    batch = []
+            if batch:
+                writer.write_table(pyarrow.Table.from_arrays(
+                    [pyarrow.array(values, type=field.type) for values, field in zip(zip(*batch), schema)],
+                    schema=schema))
+                progress.add(len(batch))
+    else:
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f) if file_format == 'csv' else None
+            if writer:
+                writer.writerow(columns)
+            for row in rows:
+                values = [_bulk_value(value) for value in row]
+                if writer:
+                    writer.writerow(values)
+                else:
+                    f.write(app.json.dumps(dict(zip(columns, values))) + '\n')
+                progress.add(1)
+
+    progress.report(final=True)
+    return progress.count
+
+def read_bulk_file(path, columns, file_format):
+    """Yield lists of row tuples (in columns order) from an export file"""
+    if file_format == 'parquet':
+        if pyarrow is None:
+            raise click.ClickException('Parquet import needs pyarrow (pip install pyarrow)')
+        parquet_file = pyarrow.parquet.ParquetFile(path)
+        for batch in parquet_file.iter_batches(batch_size=BULK_BATCH_SIZE, columns=columns):
+            yield list(zip(*(batch.column(column).to_pylist() for column in columns)))
+        return
+
+    with open(path, newline='', encoding='utf-8') as f:
+        if file_format == 'csv':
+            reader = csv.reader(f)
+            header = next(reader)
+            if header != columns:
+                raise click.ClickException(f'Expected columns {columns}, found {header}')
+            source = reader
+        else:
+            source = ([document.get(column) for column in columns]
+                      for document in map(app.json.loads, filter(str.strip, f)))
+
+        batch = []
+        for values in source:
+            batch.append(tuple(
+                (int(value) if value not in (None, '') else None) if column in BULK_INTEGER_COLUMNS
+                else value
+                for column, value in zip(columns, values)
+            ))
+            if len(batch) >= BULK_BATCH_SIZE:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+class _BatchesAsCSV:
+    """File-like view of row batches as CSV text, so COPY can stream without a temp file"""
+
+    def __init__(self, batches, progress):
+        self._batches = iter(batches)
+        self._progress = progress
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer)
+        self._pending = ''
+
+    def read(self, size=-1):
+        while size < 0 or len(self._pending) < size:
+            batch = next(self._batches, None)
+            if batch is None:
+                break
+            self._writer.writerows(batch)
+            self._pending += self._buffer.getvalue()
+            self._buffer.seek(0)
+            self._buffer.truncate()
+            self._progress.add(len(batch))
+        if size < 0:
+            data, self._pending = self._pending, ''
+        else:
+            data, self._pending = self._pending[:size], self._pending[size:]
+        return data
+
+    readline = read
+
+def _secondary_indexes(conn, table):
+    """(name, CREATE statement) for non-unique indexes that can be rebuilt after a load"""
+    if USE_POSTGRES:
+        rows = execute_query(conn, '''
+            SELECT indexname AS name, indexdef AS sql FROM pg_indexes
+            WHERE tablename = ? AND indexdef NOT LIKE 'CREATE UNIQUE%%'
+        ''', (table,), fetch_all=True)
+    else:
+        # Automatic (constraint) indexes have no SQL and cannot be dropped
+        rows = execute_query(conn, '''
+            SELECT name, sql FROM sqlite_master
+            WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL
+        ''', (table,), fetch_all=True)
+    return [(row['name'], row['sql']) for row in rows]
+
+def import_table(conn, table, path, file_format):
+    """
+    Load an export file into an empty table, keeping ids; returns the row count.
+
+    PostgreSQL streams the rows through COPY FROM STDIN, in one transaction.
+    SQLite inserts in batched transactions with synchronous writes off; if
+    the load fails part way, the rows already committed are deleted, so the
+    table is empty again and the import can simply be rerun. On both,
+    secondary indexes are dropped first and rebuilt once at the end.
+    """
+    columns = BULK_TABLES[table]
+    existing = execute_query(conn, f'SELECT COUNT(*) AS count FROM {table}', fetch_one=True)
+    if existing['count']:
+        raise click.ClickException(f'{table} already has {existing["count"]} rows; import needs an empty table')
+
+    indexes = _secondary_indexes(conn, table)
+    for name, _ in indexes:
+        execute_query(conn, f'DROP INDEX {name}')
+    conn.commit()
+
+    progress = _Progress(f'imported {table}:')
+    batches = read_bulk_file(path, columns, file_format)
+    try:
+        if USE_POSTGRES:
+            cursor = conn.cursor()
+            cursor.copy_expert(
+                f'COPY {table} ({", ".join(columns)}) FROM STDIN WITH (FORMAT csv)',
+                _BatchesAsCSV(batches, progress)
+            )
+            # Ids were copied verbatim; move the SERIAL sequence past them
+            cursor.execute(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                           f"COALESCE((SELECT MAX(id) FROM {table}), 0) + 1, false)")
+            cursor.close()
+            conn.commit()
+        else:
+            conn.execute('PRAGMA synchronous = OFF')
+            insert = f'INSERT INTO {table} ({", ".join(columns)}) VALUES ({", ".join("?" for _ in columns)})'
+            try:
+                for batch in batches:
+                    conn.executemany(insert, batch)
+                    conn.commit()
+                    progress.add(len(batch))
+            except BaseException:
+                # The table was empty before: take out the batches that made it in
+                conn.rollback()
+                conn.execute(f'DELETE FROM {table}')
+                conn.commit()
+                raise
+            finally:
+                conn.execute('PRAGMA synchronous = FULL')
+    finally:
+        conn.rollback()
+        for _, sql in indexes:
+            execute_query(conn, sql)
+        conn.commit()
+
+    progress.report(final=True)
+    return progress.count
+
+@app.cli.command('export-data')
+@click.argument('table', type=click.Choice(list(BULK_TABLES)))
+@click.argument('path')
+@click.option('--format', 'file_format', type=click.Choice(['csv', 'ndjson', 'parquet']),
+              help='Defaults to the file extension (.csv, .ndjson/.jsonl, .parquet)')
+def export_data_command(table, path, file_format):
+    """Stream TABLE (songs or ratings) to PATH"""
+    conn = get_db_connection()
+    try:
+        export_table(conn, table, path, bulk_format(path, file_format))
+    finally:
+        conn.close()
+
+@app.cli.command('import-data')
+@click.argument('table', type=click.Choice(list(BULK_TABLES)))
+@click.argument('path')
+@click.option('--format', 'file_format', type=click.Choice(['csv', 'ndjson', 'parquet']),
+              help='Defaults to the file extension (.csv, .ndjson/.jsonl, .parquet)')
+def import_data_command(table, path, file_format):
+    """Load PATH into the empty TABLE (import songs before ratings)"""
+    conn = get_db_connection()
+    try:
+        import_table(conn, table, path, bulk_format(path, file_format))
+    finally:
+        conn.close()
+    if table == 'ratings':
+        click.echo('Run `flask rebuild-charts` and `flask rollup-ratings` to refresh derived tables', err=True)
+
+# Database initialization flag
+_db_initialized = False
+
+@app.before_request
+def initialize_database():
+    """Initialize database before first request"""
+    global _db_initialized
+    if not _db_initialized:
+        if USE_POSTGRES:
+            # For PostgreSQL, always try to initialize (init-db.sql handles IF NOT EXISTS)
+            try:
+                init_db()
+                print('PostgreSQL database initialized!')
+            except Exception as e:
+                print(f'Database initialization note: {e}')
+        else:
+            # For SQLite, check if tables exist
+            try:
+                conn = get_db_connection()
+                result = execute_query(conn, "SELECT name FROM sqlite_master WHERE type='table' AND name='songs'", fetch_one=True)
+                conn.close()
+                # Always run init_db (IF NOT EXISTS) so tables added since the
+                # database file was created are picked up too
+                init_db()
+                if not result:
+                    print(f'SQLite database {DATABASE} initialized!')
+            except Exception as e:
+                print(f'Database check/initialization error: {e}')
+        _db_initialized = True
+
+# Listener counting: HyperLogLog sketches in a shared file, fed by player
+# heartbeats. A ring of per-minute sketches gives "listening now" (union of
+# the last LISTENER_ACTIVE_MINUTES) and per-UTC-day sketches the daily uniques.
+# 2**12 one-byte registers per sketch: standard error 1.04 / sqrt(4096) = 1.6%.
+HLL_PRECISION = 12
+HLL_REGISTERS = 1 << HLL_PRECISION
+HLL_STANDARD_ERROR = 1.04 / math.sqrt(HLL_REGISTERS)
+LISTENER_ACTIVE_MINUTES = 3  # the player heartbeats at least once a minute while playing
+LISTENER_MINUTE_SLOTS = LISTENER_ACTIVE_MINUTES + 1  # one spare, reset as the clock moves on
+LISTENER_DAY_SLOTS = 2
+LISTENERS_CACHE_SECONDS = 5
+LISTENER_SKETCH_PATH = os.environ.get('LISTENER_SKETCH_PATH', os.path.join(SHARED_MEMORY_DIR, 'neoradio-listeners'))
+_SKETCH_HEADER = struct.Struct('<Q')  # window number + 1 (0 = never used)
+_SKETCH_SIZE = _SKETCH_HEADER.size + HLL_REGISTERS
+_listener_table = {'mmap': None, 'path': None}
+_listeners_cache = {}
+
+def listener_table():
+    """Map the shared sketch file: minute slots first, then day slots"""
+    return map_shared_table(_listener_table, LISTENER_SKETCH_PATH,
+                            (LISTENER_MINUTE_SLOTS + LISTENER_DAY_SLOTS) * _SKETCH_SIZE)
+
+def _sketch_offset(window, first_slot, slots):
+    return (first_slot + window % slots) * _SKETCH_SIZE
+
+def _sketch_windows(now):
+    """(minute number, day number) for a Unix time"""
+    return int(now // 60), int(now // 86400)
+
+def hll_position(user_id):
+    """Register index and rank (1 + leading zero bits of the rest) for an identity hash"""
+    bits = int(user_id[:16], 16)
+    rest_bits = 64 - HLL_PRECISION
+    rest = bits & ((1 << rest_bits) - 1)
+    return bits >> rest_bits, rest_bits - rest.bit_length() + 1
+
+def hll_estimate(registers):
+    """Cardinality estimate from HyperLogLog registers, with small-range correction"""
+    m = len(registers)
+    harmonic = sum(registers.count(rank) * 2.0 ** -rank for rank in set(registers))
+    estimate = 0.7213 / (1 + 1.079 / m) * m * m / harmonic
+    zeros = registers.count(0)
+    if estimate <= 2.5 * m and zeros:
+        # Linear counting is more accurate while most registers are empty
+        estimate = m * math.log(m / zeros)
+    return estimate
+
+def record_heartbeat(user_id, now=None):
+    """
+    Add a listener to the current minute and day sketches.
+
+    Registers only ever grow, and updates are lock-free. Two workers racing
+    on the same register can keep the smaller rank, which is a negligible
+    underestimate at this scale.
+    """
+    table = listener_table()
+    now = time.time() if now is None else now
+    minute, day = _sketch_windows(now)
+    index, rank = hll_position(user_id)
+    for window, first_slot, slots in ((minute, 0, LISTENER_MINUTE_SLOTS),
+                                      (day, LISTENER_MINUTE_SLOTS, LISTENER_DAY_SLOTS)):
+        offset = _sketch_offset(window, first_slot, slots)
+        if _SKETCH_HEADER.unpack_from(table, offset)[0] != window + 1:
+            # Slot still holds an older window: recycle it
+            table[offset + _SKETCH_HEADER.size:offset + _SKETCH_SIZE] = bytes(HLL_REGISTERS)
+            _SKETCH_HEADER.pack_into(table, offset, window + 1)
+        position = offset + _SKETCH_HEADER.size + index
+        if table[position] < rank:
+            table[position] = rank
+
+def read_sketch(window, first_slot, slots):
+    """Registers for a window, or None if that window's slot was never written or was recycled"""
+    table = listener_table()
+    offset = _sketch_offset(window, first_slot, slots)
+    if _SKETCH_HEADER.unpack_from(table, offset)[0] != window + 1:
+        return None
+    return table[offset + _SKETCH_HEADER.size:offset + _SKETCH_SIZE]
+
+def listener_counts(now=None):
+    """Approximate concurrent and daily-unique listeners; fixed cost, independent of audience size"""
+    now = time.time() if now is None else now
+    minute, day = _sketch_windows(now)
+
+    active = bytes(HLL_REGISTERS)
+    for window in range(minute - LISTENER_ACTIVE_MINUTES + 1, minute + 1):
+        registers = read_sketch(window, 0, LISTENER_MINUTE_SLOTS)
+        if registers is not None:
+            # Union of HyperLogLog sketches is the register-wise max
+            active = bytes(map(max, active, registers))
+    daily = read_sketch(day, LISTENER_MINUTE_SLOTS, LISTENER_DAY_SLOTS) or bytes(HLL_REGISTERS)
+
+    return {
+        'concurrent': round(hll_estimate(active)),
+        'daily_unique': round(hll_estimate(daily)),
+        'active_window_seconds': LISTENER_ACTIVE_MINUTES * 60,
+        'standard_error': round(HLL_STANDARD_ERROR, 4)
+    }
+
+@app.route('/api/heartbeat', methods=['POST'])
+def heartbeat():
+    """Player heartbeat while audio is playing; feeds the listener sketches"""
+    record_heartbeat(get_user_id())
+    return '', 204
+
+@app.route('/api/listeners')
+def get_listeners():
+    """Approximate listeners right now and today (UTC), with the sketch's standard error"""
+    body = _listeners_cache.get('body')
+    if not body or time.time() - _listeners_cache['created_at'] >= LISTENERS_CACHE_SECONDS:
+        body = app.json.dumps(listener_counts())
+        _listeners_cache.update(body=body, created_at=time.time())
+
+    response = app.response_class(body, mimetype='application/json')
+    response.headers['Cache-Control'] = f'public, max-age={LISTENERS_CACHE_SECONDS}'
+    return response
+
+# Warm start: work a cold worker would otherwise do on its first requests.
+# gunicorn.conf.py runs prewarm_app() once in the preloaded master (so
+# workers inherit the results) and prewarm_worker() in each worker before it
+# accepts connections.
+METADATA_PREWARM_TIMEOUT = 2
+_warm_state = {'app': False, 'worker_pid': None, 'worker_seconds': None}
+
+def prewarm_app():
+    """Process-independent warm-up: schema, templates, fingerprints, now playing and its votes"""
+    started = time.perf_counter()
+    initialize_database()
+    for template in ('radio.html', 'sw.js'):
+        app.jinja_env.get_template(template)
+    app_shell_version()
+    # Every station at once, so startup does not grow with the number of stations
+    for station, (status_code, next_poll_after) in poll_stations(timeout=METADATA_PREWARM_TIMEOUT).items():
+        if status_code != 200:
+            print(f'Prewarm: no now-playing snapshot for {station}')
+            continue
+        try:
+            # Workers that do not lead read this until the leader's first poll
+            publish_now_playing(station, time.time() + next_poll_after)
+        except Exception as e:
+            print(f'Prewarm: could not share now playing for {station}: {e}')
+    _warm_state['app'] = True
+    return time.perf_counter() - started
+
+def prewarm_worker():
+    """
+    Per-process warm-up, run after fork: connections, shared-memory mappings
+    and one in-process page render. Readiness reports ready once this is done.
+    """
+    started = time.perf_counter()
+    if not _warm_state['app']:
+        prewarm_app()
+    # Connections cannot be inherited across fork; open (and health-check) them here
+    get_db_connection().close()
+    if DATABASE_REPLICA_URLS:
+        get_db_connection(readonly=True).close()
+    rate_limit_table()
+    listener_table()
+    # Exercise routing, url_for, the bootstrap queries and the template once
+    with app.test_request_context('/radio'):
+        render_template('radio.html', station=STATIONS[DEFAULT_STATION], default_station=DEFAULT_STATION,
+                        bootstrap=get_bootstrap_state())
+    _warm_state['worker_pid'] = os.getpid()
+    _warm_state['worker_seconds'] = time.perf_counter() - started
+    return _warm_state['worker_seconds']
+
+@app.route('/api/ready')
+def readiness():
+    """200 once this worker has been prewarmed, else 503 (for load balancers and healthchecks)"""
+    if _warm_state['worker_pid'] != os.getpid():
+        response = jsonify({'ready': False})
+        response.status_code = 503
+        response.headers['Retry-After'] = '1'
+        return response
+    return jsonify({'ready': True, 'prewarm_ms': round(_warm_state['worker_seconds'] * 1000, 1)})
 
 if __name__ == '__main__':
     print('Starting Flask server...')
     print('Visit http://127.0.0.1:5000 in your browser')
+    prewarm_worker()
+    ensure_station_poller()
+    ensure_invalidation_listener()
     app.run(debug=True, host='127.0.0.1', port=5000)
@@ -0,0 +1,124 @@
+"""
+Benchmark /api/charts against a synthetic ratings table.
+
+Generates a SQLite database with N votes spread over the last few weeks,
+builds chart_scores with rebuild_charts(), then compares request latency of
+the precomputed chart with an equivalent GROUP BY over ratings.
+
+Usage:
+    python benchmarks/bench_charts.py --votes 10000000 --songs 50000
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module  # noqa: E402
+
+
+def generate(db_path, votes, songs, days, seed=42):
+    """Fill songs and ratings with a skewed (popular songs get more votes) dataset."""
+    rng = random.Random(seed)
+    conn = sqlite3.connect(db_path)
+    conn.execute('PRAGMA journal_mode = OFF')
+    conn.execute('PRAGMA synchronous = OFF')
+    conn.executemany(
+        'INSERT INTO songs (id, title, artist, album, year) VALUES (?, ?, ?, ?, ?)',
+        ((i, f'Song {i}', f'Artist {i % 997}', f'Album {i % 4999}', '2025') for i in range(1, songs + 1))
+    )
+    # Each song has its own approval probability so rankings are meaningful
+    approval = [rng.random() for _ in range(songs + 1)]
+    now = datetime.now(timezone.utc)
+
+    def rows():
+        for i in range(votes):
+            song_id = min(songs, int(rng.paretovariate(1.2))) if rng.random() < 0.5 else rng.randint(1, songs)
+            rating = 1 if rng.random() < approval[song_id] else -1
+            created_at = now - timedelta(seconds=rng.randint(0, days * 86400))
+            # user_id only has to be unique per song for the UNIQUE constraint
+            yield (song_id, f'user-{i}', rating, created_at.strftime('%Y-%m-%d %H:%M:%S'))
+
+    conn.executemany('INSERT INTO ratings (song_id, user_id, rating, created_at) VALUES (?, ?, ?, ?)', rows())
+    conn.commit()
+    conn.close()
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def time_requests(client, url, repeats):
+    samples = []
+    for _ in range(repeats):
+        app_module._charts_cache.clear()  # measure the database path, not the cache
+        started = time.perf_counter()
+        response = client.get(url)
+        samples.append((time.perf_counter() - started) * 1000)
+        assert response.status_code == 200
+    return samples
+
+
+def time_group_by(db_path, repeats):
+    conn = sqlite3.connect(db_path)
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        conn.execute('''
+            SELECT song_id,
+                SUM(CASE WHEN rating = 1 THEN 1 ELSE 0 END) AS thumbs_up,
+                SUM(CASE WHEN rating = -1 THEN 1 ELSE 0 END) AS thumbs_down
+            FROM ratings
+            WHERE created_at >= datetime('now', '-7 days')
+            GROUP BY song_id
+        ''').fetchall()
+        samples.append((time.perf_counter() - started) * 1000)
+    conn.close()
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--votes', type=int, default=1_000_000)
+    parser.add_argument('--songs', type=int, default=20_000)
+    parser.add_argument('--days', type=int, default=28)
+    parser.add_argument('--repeats', type=int, default=200)
+    args = parser.parse_args()
+
+    db_fd, db_path = tempfile.mkstemp(suffix='.db')
+    os.close(db_fd)
+    app_module.DATABASE = db_path
+    app_module.init_db()
+
+    try:
+        started = time.perf_counter()
+        generate(db_path, args.votes, args.songs, args.days)
+        print(f'Generated {args.votes:,} votes over {args.songs:,} songs in {time.perf_counter() - started:.1f}s')
+
+        conn = app_module.get_db_connection()
+        started = time.perf_counter()
+        entries = app_module.rebuild_charts(conn)
+        conn.close()
+        print(f'rebuild_charts: {entries:,} entries in {time.perf_counter() - started:.1f}s')
+
+        client = app_module.app.test_client()
+        for window in app_module.CHART_WINDOWS:
+            samples = time_requests(client, f'/api/charts?window={window}&limit=20', args.repeats)
+            print(f'/api/charts window={window:<4}  p50 {percentile(samples, 50):6.2f} ms  '
+                  f'p99 {percentile(samples, 99):6.2f} ms')
+
+        samples = time_group_by(db_path, max(3, args.repeats // 50))
+        print(f'GROUP BY over ratings (7 days)  p50 {percentile(samples, 50):6.2f} ms')
+    finally:
+        os.unlink(db_path)
+
+
+if __name__ == '__main__':
+    main()
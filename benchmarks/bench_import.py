@@ -0,0 +1,90 @@
+"""
+Benchmark `flask import-data ratings` against a synthetic export.
+
+Writes a ratings export of N votes (CSV, in the export-data column order)
+for a catalogue of songs, then times import_table() into a fresh SQLite
+database: the batched load, the secondary index rebuild, and the total,
+with the rate and the time that rate implies for 50M ratings.
+
+Usage:
+    python benchmarks/bench_import.py --ratings 50000000 --songs 100000
+"""
+
+import argparse
+import csv
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module  # noqa: E402
+
+TARGET_RATINGS = 50_000_000
+
+
+def write_export(path, ratings, songs, seed=42):
+    """A ratings file as export-data writes it; user_id is unique per song, as the table requires."""
+    rng = random.Random(seed)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(app_module.BULK_TABLES['ratings'])
+        for i in range(1, ratings + 1):
+            song_id = rng.randint(1, songs)
+            created_at = f'2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} 12:{i % 60:02d}:00'
+            writer.writerow((i, song_id, f'{i:016x}', 1 if rng.random() < 0.7 else -1, created_at))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--ratings', type=int, default=TARGET_RATINGS)
+    parser.add_argument('--songs', type=int, default=100_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app_module.DATABASE = os.path.join(tmp, 'bench.db')
+        app_module.init_db()
+        conn = sqlite3.connect(app_module.DATABASE)
+        conn.executemany('INSERT INTO songs (id, title, artist) VALUES (?, ?, ?)',
+                         ((i, f'Song {i}', f'Artist {i % 997}') for i in range(1, args.songs + 1)))
+        conn.commit()
+        conn.close()
+
+        path = os.path.join(tmp, 'ratings.csv')
+        started = time.perf_counter()
+        write_export(path, args.ratings, args.songs)
+        print(f'Wrote {args.ratings:,} ratings ({os.path.getsize(path) / 1e9:.1f} GB) '
+              f'in {time.perf_counter() - started:.1f}s')
+
+        app_module.BULK_PROGRESS_EVERY = max(app_module.BULK_BATCH_SIZE, args.ratings // 10)
+        conn = app_module.get_db_connection()
+        # Split load from index rebuild: the rebuild runs in import_table's finally
+        rebuild = {}
+        real_execute_query = app_module.execute_query
+
+        def timed_execute_query(conn, query, *rest, **kwargs):
+            if query.lstrip().startswith('CREATE INDEX'):
+                rebuild.setdefault('started', time.perf_counter())
+            return real_execute_query(conn, query, *rest, **kwargs)
+
+        app_module.execute_query = timed_execute_query
+        started = time.perf_counter()
+        try:
+            count = app_module.import_table(conn, 'ratings', path, 'csv')
+        finally:
+            app_module.execute_query = real_execute_query
+            conn.close()
+        total = time.perf_counter() - started
+        load = rebuild.get('started', started + total) - started
+
+        print(f'load                {load:7.1f}s  ({count / load:,.0f} rows/s)')
+        print(f'index rebuild       {total - load:7.1f}s')
+        print(f'total               {total:7.1f}s  ({count / total:,.0f} rows/s; '
+              f'{TARGET_RATINGS / (count / total) / 60:.1f} min for {TARGET_RATINGS:,})')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Benchmark cross-worker invalidation delivery on the shared-memory bus.
+
+Forks W worker processes, each running its bus thread as a gunicorn worker
+would, then publishes votes from the parent at a steady rate. Each worker
+reports how many votes it applied and the publish-to-apply lag.
+
+Usage:
+    python benchmarks/bench_invalidation.py --workers 4 --votes 5000 --rate 1000
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module  # noqa: E402
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def worker(write_fd, votes):
+    app_module.ensure_invalidation_listener()
+    deadline = time.time() + 30
+    while app_module._invalidation_bus['applied'] < votes and time.time() < deadline:
+        time.sleep(0.01)
+    lags = list(app_module._invalidation_bus['lags'])
+    os.write(write_fd, json.dumps({'applied': app_module._invalidation_bus['applied'],
+                                   'flushes': app_module._invalidation_bus['flushes'], 'lags': lags}).encode())
+    os._exit(0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--votes', type=int, default=5000)
+    parser.add_argument('--rate', type=float, default=1000, help='votes per second')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app_module.INVALIDATION_PATH = os.path.join(tmp, 'invalidations')
+        app_module._invalidation_bus['lags'] = app_module.collections.deque(maxlen=args.votes)
+        app_module.invalidation_table()
+
+        pipes, pids = [], []
+        for _ in range(args.workers):
+            read_fd, write_fd = os.pipe()
+            pid = os.fork()
+            if pid == 0:
+                os.close(read_fd)
+                worker(write_fd, args.votes)
+            os.close(write_fd)
+            pipes.append(read_fd)
+            pids.append(pid)
+        time.sleep(0.2)  # let every worker take its first look at the ring
+
+        started = time.perf_counter()
+        for number in range(args.votes):
+            app_module.publish_invalidation(None, number % 50, f'{number:032x}', 1)
+            pause = started + (number + 1) / args.rate - time.perf_counter()
+            if pause > 0:
+                time.sleep(pause)
+        publish_seconds = time.perf_counter() - started
+
+        reports = []
+        for read_fd, pid in zip(pipes, pids):
+            data = b''
+            while chunk := os.read(read_fd, 1 << 20):
+                data += chunk
+            os.waitpid(pid, 0)
+            reports.append(json.loads(data))
+
+    lags = [lag * 1000 for report in reports for lag in report['lags']]
+    print(f'{args.votes} votes published in {publish_seconds:.2f}s to {args.workers} workers')
+    print(f'applied per worker: {[report["applied"] for report in reports]}  '
+          f'flushes: {[report["flushes"] - 1 for report in reports]}')
+    print(f'lag  p50 {percentile(lags, 50):6.2f} ms  p99 {percentile(lags, 99):6.2f} ms  max {max(lags):6.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Fan-out cost of live rating updates.
+
+Starts N subscribers, each consuming live_rating_events() the way a worker
+serving an SSE response would (writes are discarded), then publishes vote
+bursts and measures, per coalesced update, the time from
+check_live_ratings() until every subscriber has the event, plus the CPU
+spent. The event is serialized once per update, whatever N is.
+
+--mode gevent runs subscribers as greenlets (GUNICORN_WORKER_CLASS=gevent);
+--mode threads as OS threads (the default gthread worker), where each
+wake-up costs a GIL hand-off and N should stay near LIVE_MAX_SUBSCRIBERS.
+
+Usage:
+    python benchmarks/bench_live_fanout.py --mode gevent --subscribers 10000
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=['gevent', 'threads'], default='gevent')
+    parser.add_argument('--subscribers', type=int, default=10000)
+    parser.add_argument('--updates', type=int, default=10)
+    parser.add_argument('--votes-per-update', type=int, default=500)
+    args = parser.parse_args()
+
+    if args.mode == 'gevent':
+        # Must patch before the app (and its threading primitives) is imported
+        from gevent import monkey
+        monkey.patch_all()
+    import threading
+    import time
+    import app as app_module
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app_module.DATABASE = os.path.join(tmp, 'bench.db')
+        app_module.LIVE_RATINGS_PATH = os.path.join(tmp, 'live')
+        app_module.init_db()
+        conn = app_module.get_db_connection()
+        song_id = app_module.get_or_create_song_id(conn, 'Bench Song', 'Bench Artist')
+        conn.close()
+        app_module.publish_live_totals(song_id, 0, 0)
+        app_module.check_live_ratings()
+
+        # list.append is atomic, so subscribers report arrival without a shared lock
+        received = [[] for _ in range(args.updates + 1)]
+
+        def subscriber():
+            events = app_module.live_rating_events(keepalive=60)
+            next(events)
+            next(events)  # the current snapshot
+            for update in range(1, args.updates + 1):
+                received[update].append(next(events))
+
+        if args.mode == 'threads':
+            threading.stack_size(256 * 1024)
+        threads = [threading.Thread(target=subscriber, daemon=True) for _ in range(args.subscribers)]
+        for thread in threads:
+            thread.start()
+        time.sleep(1)  # let every subscriber reach its wait
+
+        latencies, cpu = [], []
+        for update in range(1, args.updates + 1):
+            for _ in range(args.votes_per_update):
+                app_module.publish_live_delta(song_id, 1, 0)
+            start, start_cpu = time.perf_counter(), time.process_time()
+            app_module.check_live_ratings()
+            while len(received[update]) < args.subscribers:
+                time.sleep(0.0005)
+            latencies.append(time.perf_counter() - start)
+            cpu.append(time.process_time() - start_cpu)
+            time.sleep(app_module.RATING_PUSH_INTERVAL)
+
+    print(f'{args.mode}: {args.subscribers} subscribers, {args.votes_per_update} votes coalesced per update')
+    print(f'fan-out wall time: median {statistics.median(latencies) * 1000:.1f} ms, max {max(latencies) * 1000:.1f} ms')
+    print(f'fan-out CPU: median {statistics.median(cpu) * 1000:.1f} ms '
+          f'({statistics.median(cpu) / args.subscribers * 1e6:.1f} us per subscriber)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+Measure the per-request overhead of admission control.
+
+Times get_user_id() + take_token() + the host-wide in-flight count inside a
+request context, spread over many distinct listeners so the bucket table
+sees realistic slot traffic.
+
+Usage:
+    python benchmarks/bench_rate_limit.py --iterations 200000 --listeners 10000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=200000)
+    parser.add_argument('--listeners', type=int, default=10000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app_module.RATE_LIMIT_PATH = os.path.join(tmp, 'ratelimit')
+        app_module.ADMISSION_PATH = os.path.join(tmp, 'admission')
+        contexts = [
+            app_module.app.test_request_context('/api/songs/rating/a/b', environ_base={'REMOTE_ADDR': f'10.0.{i // 256}.{i % 256}'},
+                                                headers={'User-Agent': 'Mozilla/5.0 (bench)'})
+            for i in range(min(args.listeners, 65536))
+        ]
+        app_module.take_token('0' * 32, 'read')  # map the tables before timing
+        app_module.admit_request()
+        app_module.release_request()
+
+        samples = []
+        for i in range(args.iterations):
+            with contexts[i % len(contexts)]:
+                start = time.perf_counter()
+                app_module.take_token(app_module.get_user_id(), 'read')
+                app_module.admit_request()
+                app_module.release_request()
+                samples.append(time.perf_counter() - start)
+
+    samples.sort()
+    for label, pct in (('p50', 50), ('p99', 99)):
+        value = samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+        print(f'admission control {label}: {value * 1e6:.2f} us')
+
+
+if __name__ == '__main__':
+    main()
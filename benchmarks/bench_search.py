@@ -0,0 +1,130 @@
+"""
+Benchmark /api/songs/search against a synthetic catalogue.
+
+Generates a SQLite database with N songs (titles and artists drawn from a
+Zipf-like vocabulary, so common words match many songs), then replays
+typeahead sessions: a listener types a title one character at a time and
+every keystroke from the second on is a search. Reports request latency
+with the result cache cleared before each request and with it enabled.
+
+Usage:
+    python benchmarks/bench_search.py --songs 1000000 --sessions 300
+"""
+
+import argparse
+import itertools
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module  # noqa: E402
+
+
+def make_vocabulary(rng, size):
+    consonants, vowels = 'bcdfghjklmnprstvwz', 'aeiou'
+    words = set()
+    while len(words) < size:
+        length = rng.randint(2, 5)
+        words.add(''.join(rng.choice(consonants) + rng.choice(vowels) for _ in range(length))[:rng.randint(3, 10)])
+    words = sorted(words)
+    rng.shuffle(words)  # popularity (list position) independent of spelling
+    return words
+
+
+def generate(db_path, songs, seed=42):
+    """Fill songs; returns the titles so sessions can type real ones."""
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(rng, 20000)
+    # Zipf-like word popularity: a few words appear in a large share of titles
+    weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+    artists = [' '.join(rng.choices(vocabulary, cum_weights=weights, k=2)).title() for _ in range(max(1, songs // 20))]
+
+    titles = []
+    conn = sqlite3.connect(db_path)
+    conn.execute('PRAGMA journal_mode = OFF')
+    conn.execute('PRAGMA synchronous = OFF')
+
+    def rows():
+        seen = set()
+        for i in range(1, songs + 1):
+            title = ' '.join(rng.choices(vocabulary, cum_weights=weights, k=rng.randint(1, 4))).title()
+            artist = artists[i % len(artists)]
+            if (title, artist) in seen:
+                title = f'{title} {i}'
+            seen.add((title, artist))
+            if i % 1000 == 0:
+                titles.append(title)
+            yield (i, title, artist, '', '2025')
+
+    conn.executemany('INSERT INTO songs (id, title, artist, album, year) VALUES (?, ?, ?, ?, ?)', rows())
+    conn.commit()
+    conn.close()
+    return titles
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def typeahead_queries(rng, titles, sessions):
+    queries = []
+    for _ in range(sessions):
+        # Popular titles are searched more often, so sessions share prefixes
+        title = titles[min(len(titles) - 1, int(rng.paretovariate(1.0)) - 1)] if rng.random() < 0.5 else rng.choice(titles)
+        queries.extend(title[:length] for length in range(2, len(title) + 1))
+    return queries
+
+
+def time_requests(client, queries, cached):
+    samples = []
+    for number, query in enumerate(queries):
+        if not cached:
+            app_module._search_cache.clear()
+        started = time.perf_counter()
+        # A distinct address per request keeps the per-listener token bucket out of the measurement
+        response = client.get('/api/songs/search', query_string={'q': query},
+                              environ_base={'REMOTE_ADDR': f'10.{number // 65536 % 256}.{number // 256 % 256}.{number % 256}'})
+        samples.append((time.perf_counter() - started) * 1000)
+        assert response.status_code == 200, response.status_code
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--songs', type=int, default=1_000_000)
+    parser.add_argument('--sessions', type=int, default=300)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app_module.DATABASE = os.path.join(tmp, 'bench.db')
+        app_module.RATE_LIMIT_PATH = os.path.join(tmp, 'ratelimit')
+        app_module.ADMISSION_PATH = os.path.join(tmp, 'admission')
+        app_module.init_db()
+
+        started = time.perf_counter()
+        titles = generate(app_module.DATABASE, args.songs)
+        print(f'Generated and indexed {args.songs:,} songs in {time.perf_counter() - started:.1f}s')
+
+        queries = typeahead_queries(random.Random(7), titles, args.sessions)
+        client = app_module.app.test_client()
+        samples = time_requests(client, queries, cached=False)
+        print(f'uncached            {len(queries)} keystrokes  p50 {percentile(samples, 50):6.2f} ms  '
+              f'p99 {percentile(samples, 99):6.2f} ms  max {max(samples):7.2f} ms')
+
+        # Steady state: earlier sessions have filled the cache with the hot prefixes
+        app_module._search_cache.clear()
+        time_requests(client, typeahead_queries(random.Random(8), titles, args.sessions * 5), cached=True)
+        samples = time_requests(client, queries, cached=True)
+        print(f'warm result cache   {len(queries)} keystrokes  p50 {percentile(samples, 50):6.2f} ms  '
+              f'p99 {percentile(samples, 99):6.2f} ms  max {max(samples):7.2f} ms  '
+              f'({len(app_module._search_cache)} cached results)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Benchmark one metadata refresh round across many stations.
+
+Registers N stations whose upstreams answer after a fixed latency, then
+times refreshing all of them one after another (the old single-station
+loop, repeated) against poll_stations(), which fans the requests out over
+METADATA_POLL_THREADS threads.
+
+Usage:
+    python benchmarks/bench_station_poll.py --stations 50 --latency 0.15
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module  # noqa: E402
+
+
+class Upstream:
+    def __init__(self, latency):
+        self.latency = latency
+
+    def get(self, url, timeout=None):
+        time.sleep(self.latency)
+        station = url.split('/')[3]
+
+        class Response:
+            status_code = 200
+
+            def json(self):
+                return {'title': f'{station} track', 'artist': 'Bench Artist', 'album': '', 'date': '2025'}
+        return Response()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--stations', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.15, help='upstream response time in seconds')
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app_module.DATABASE = os.path.join(tmp, 'bench.db')
+        app_module.init_db()
+        app_module.requests.get = Upstream(args.latency).get
+        app_module.STATIONS = {
+            f'station-{i}': {'id': f'station-{i}', 'name': f'Station {i}', 'art_url': None,
+                             'stream_url': f'https://cdn.example/station-{i}/live.m3u8',
+                             'metadata_url': f'https://cdn.example/station-{i}/metadatav2.json'}
+            for i in range(args.stations)
+        }
+        app_module.DEFAULT_STATION = 'station-0'
+
+        for label, refresh in (
+            ('sequential', lambda: [app_module.poll_upstream_metadata(station=station) for station in app_module.STATIONS]),
+            (f'concurrent ({app_module.METADATA_POLL_THREADS} threads)', app_module.poll_stations),
+        ):
+            samples = []
+            for _ in range(args.rounds):
+                started = time.perf_counter()
+                refresh()
+                samples.append(time.perf_counter() - started)
+            print(f'{label:<26} {args.stations} stations  best {min(samples) * 1000:8.1f} ms  '
+                  f'worst {max(samples) * 1000:8.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Load test: DB queries caused by the listener herd at each track change.
+
+Simulates a number of track changes; after each one every listener's
+client asks for the new track's rating at once, a few of them vote, and
+reads continue at a trickle until the next change. Counts execute_query()
+calls per phase with the hot rating cache on and off.
+
+Usage:
+    python benchmarks/bench_track_change.py --listeners 2000 --tracks 5
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+from urllib.parse import quote
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module  # noqa: E402
+
+
+class Upstream:
+    def __init__(self):
+        self.document = {}
+
+    def get(self, url, timeout=None):
+        document = self.document
+
+        class Response:
+            status_code = 200
+
+            def json(self):
+                return dict(document)
+        return Response()
+
+
+def run(listeners, tracks, hot):
+    queries = []
+    real_execute_query = app_module.execute_query
+    app_module.execute_query = lambda conn, query, *args, **kwargs: (
+        queries.append(query), real_execute_query(conn, query, *args, **kwargs))[1]
+    real_hot_rating, real_load = app_module.hot_rating, app_module.load_hot_ratings
+    if not hot:
+        app_module.hot_rating = lambda *args: None
+        app_module.load_hot_ratings = lambda *args, **kwargs: False
+
+    upstream = Upstream()
+    app_module.requests.get = upstream.get
+    client = app_module.app.test_client()
+    phases = []
+    try:
+        for track in range(tracks):
+            upstream.document = {'title': f'Track {track}', 'artist': 'Bench Artist', 'album': '', 'date': '2025'}
+            url = f'/api/songs/rating/{quote(f"Track {track}")}/Bench%20Artist'
+
+            start = len(queries)
+            client.get('/api/metadata')
+            poll = len(queries) - start
+
+            start = len(queries)
+            for listener in range(listeners):
+                client.get(url, environ_base={'REMOTE_ADDR': f'10.{listener // 65536}.{listener // 256 % 256}.{listener % 256}'})
+            herd = len(queries) - start
+
+            start = len(queries)
+            for listener in range(0, listeners, 20):
+                client.post('/api/songs/rating', json={'title': f'Track {track}', 'artist': 'Bench Artist', 'rating': 1},
+                            environ_base={'REMOTE_ADDR': f'10.{listener // 65536}.{listener // 256 % 256}.{listener % 256}'})
+            votes = len(queries) - start
+            phases.append((poll, herd, votes))
+    finally:
+        app_module.execute_query = real_execute_query
+        app_module.hot_rating, app_module.load_hot_ratings = real_hot_rating, real_load
+    return phases
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--listeners', type=int, default=2000)
+    parser.add_argument('--tracks', type=int, default=5)
+    args = parser.parse_args()
+
+    for hot in (False, True):
+        with tempfile.TemporaryDirectory() as tmp:
+            app_module.DATABASE = os.path.join(tmp, 'bench.db')
+            app_module.RATE_LIMIT_PATH = os.path.join(tmp, 'ratelimit')
+            app_module.ADMISSION_PATH = os.path.join(tmp, 'admission')
+            app_module._song_ids.clear()
+            app_module._hot_ratings.update(key=None, song_id=None, votes={})
+            app_module.init_db()
+            phases = run(args.listeners, args.tracks, hot)
+
+        label = 'hot cache' if hot else 'no cache '
+        for track, (poll, herd, votes) in enumerate(phases):
+            print(f'{label} track {track}: poll {poll:3d} queries, herd of {args.listeners} reads '
+                  f'{herd:5d} queries, {args.listeners // 20} votes {votes:5d} queries')
+
+
+if __name__ == '__main__':
+    main()
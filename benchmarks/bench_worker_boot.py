@@ -0,0 +1,124 @@
+"""
+Measure time-to-first-fast-response of a freshly started gunicorn.
+
+Boots gunicorn twice against a temporary SQLite database and a local
+stand-in for the upstream metadata server: once cold (no config: lazy
+app load, nothing prewarmed) and once with gunicorn.conf.py (preload +
+prewarm). For each run it polls the page from the moment the process is
+spawned and reports when the first response arrived, how slow it was, and
+when responses first came in under 2x the steady-state median. With
+--workers > 1 the per-worker "ready ... after fork" log lines are echoed.
+
+Usage:
+    python benchmarks/bench_worker_boot.py --workers 1
+"""
+
+import argparse
+import http.client
+import http.server
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+UPSTREAM_DOCUMENT = {
+    'title': 'Warm Song', 'artist': 'Warm Artist', 'album': 'Warm Album', 'date': '2025',
+    'prev_title_1': 'Earlier', 'prev_artist_1': 'Someone'
+}
+
+
+class UpstreamHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = json.dumps(UPSTREAM_DOCUMENT).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def get(port, path):
+    start = time.perf_counter()
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    try:
+        conn.request('GET', path)
+        response = conn.getresponse()
+        response.read()
+        return response.status, time.perf_counter() - start
+    finally:
+        conn.close()
+
+
+def measure(mode, port, workers, env, paths):
+    args = [sys.executable, '-m', 'gunicorn', '--workers', str(workers), '--bind', f'127.0.0.1:{port}']
+    if mode == 'warm':
+        args += ['--config', os.path.join(ROOT, 'gunicorn.conf.py')]
+    else:
+        # An empty config file stops gunicorn picking up ./gunicorn.conf.py
+        empty = os.path.join(env['NEORADIO_BENCH_DIR'], 'empty.conf.py')
+        open(empty, 'w').close()
+        args += ['--config', empty]
+    args.append('app:app')
+
+    spawned = time.perf_counter()
+    process = subprocess.Popen(args, cwd=ROOT, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    try:
+        # First response (the socket is bound before workers are ready, so
+        # connection errors mean the master is still starting)
+        while True:
+            try:
+                status, first_latency = get(port, paths[0])
+                break
+            except OSError:
+                time.sleep(0.002)
+        first_at = time.perf_counter() - spawned
+
+        timeline = [(first_at, first_latency)]
+        for _ in range(200):
+            for path in paths:
+                _, latency = get(port, path)
+                timeline.append((time.perf_counter() - spawned, latency))
+        steady = statistics.median(latency for _, latency in timeline[-100:])
+        fast_at = next(at for at, latency in timeline if latency < 2 * steady)
+    finally:
+        process.terminate()
+        output, _ = process.communicate(timeout=30)
+
+    print(f'{mode:>4}: first response {first_at * 1000:7.1f} ms after spawn ({first_latency * 1000:6.1f} ms), '
+          f'first fast response {fast_at * 1000:7.1f} ms, steady median {steady * 1000:5.2f} ms')
+    for line in output.splitlines():
+        if 'ready' in line and 'after fork' in line:
+            print('      ' + line.split('] ', 2)[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--port', type=int, default=5055)
+    args = parser.parse_args()
+
+    upstream = http.server.ThreadingHTTPServer(('127.0.0.1', 0), UpstreamHandler)
+    threading.Thread(target=upstream.serve_forever, daemon=True).start()
+
+    paths = ['/radio', '/api/songs/rating/Warm%20Song/Warm%20Artist']
+    for mode in ('cold', 'warm'):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, DATABASE=os.path.join(tmp, 'bench.db'), NEORADIO_BENCH_DIR=tmp,
+                       METADATA_URL=f'http://127.0.0.1:{upstream.server_address[1]}/metadatav2.json',
+                       RATE_LIMIT_PATH=os.path.join(tmp, 'ratelimit'), RATE_LIMIT_READ_BURST='100000',
+                       ADMISSION_PATH=os.path.join(tmp, 'admission'))
+            measure(mode, args.port, args.workers, env, paths)
+    upstream.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,369 @@
+"""
+Microbenchmarks for the hot paths, with a regression gate.
+
+Times query rewriting, listener identity hashing, JSON responses, and the
+rating read/write paths on each database backend:
+
+    sqlite-file     SQLite database in a temporary directory
+    sqlite-memory   SQLite database on tmpfs (/dev/shm), so no disk I/O
+    postgres        the database at BENCH_POSTGRES_URL (skipped if unset);
+                    its tables are truncated, so point it at a scratch database
+
+The backend is fixed when app is imported, so each backend runs in its own
+subprocess. Each benchmark is calibrated to run for about --min-time
+seconds, repeated --repeats times, and the fastest repeat is reported
+(the least disturbed by other load on the machine).
+
+Results are compared with a baseline file. Benchmarks more than
+--threshold slower than their baseline are measured again (--confirm
+times), and any that are still slower fail the run (exit status 1).
+Baselines depend on the machine, so record them where the gate runs:
+
+    make bench-baseline     # on the reference commit, e.g. main
+    make bench              # on the change; fails on regressions
+
+The baseline is usually recorded by running this script against an older
+checkout, so the suite seeds through the schema and the public routes. With
+--save, a benchmark that fails on the checkout being measured (one that
+times a helper the older code does not have) is left out of the baseline
+and reported as having none, instead of failing the run.
+
+Usage:
+    python benchmarks/microbench.py [--save] [--threshold 0.25] [--backend sqlite-file] [-k rating]
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+BACKENDS = ['sqlite-file', 'sqlite-memory', 'postgres']
+SEED_SONGS = 2000
+SEED_VOTERS = 10
+
+
+def measure(fn, min_time, repeats):
+    """Seconds per call: the fastest of `repeats` runs of about min_time each"""
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time / 5:
+            break
+        number *= 2 if elapsed > min_time / 50 else 10
+    number = max(1, int(number * min_time / max(elapsed, 1e-9)))
+
+    best = float('inf')
+    for _ in range(repeats):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - started) / number)
+    return best
+
+
+def core_benchmarks(app_module):
+    """Backend-independent hot paths"""
+    app = app_module.app
+    select = 'SELECT rating FROM ratings WHERE song_id = ? AND user_id = ?'
+    insert = 'INSERT OR IGNORE INTO songs (station, title, artist, album, year) VALUES (?, ?, ?, ?, ?)'
+
+    def adapt_postgres():
+        app_module.USE_POSTGRES = True
+        try:
+            app_module.adapt_query(select)
+            app_module.adapt_query(insert)
+        finally:
+            app_module.USE_POSTGRES = False
+
+    identity_context = app.test_request_context(environ_base={'REMOTE_ADDR': '203.0.113.7'},
+                                                headers={'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) Firefox/131.0'})
+    identity_context.push()
+    environ = app_module.request.environ
+    identity_context.pop()
+
+    def identity():
+        with identity_context:
+            environ.pop('neoradio.user_id', None)
+            app_module.get_user_id()
+
+    rating = {'thumbs_up': 1204, 'thumbs_down': 87, 'user_rating': 1}
+    plays = [{'id': i, 'title': f'Song {i}', 'artist': 'Artist', 'album': 'Album', 'year': '2025',
+              'played_at': '2025-01-01T12:00:00Z'} for i in range(50)]
+    app_context = app.app_context()
+
+    def jsonify(payload):
+        def run():
+            with app_context:
+                app_module.jsonify(payload).get_data()
+        return run
+
+    return {
+        'adapt_query.sqlite': lambda: (app_module.adapt_query(select), app_module.adapt_query(insert)),
+        'adapt_query.postgres': adapt_postgres,
+        'identity.get_user_id': identity,
+        'json.rating': jsonify(rating),
+        'json.history': jsonify({'plays': plays}),
+    }
+
+
+def seed(app_module):
+    """A catalogue with votes, so queries run against realistic indexes"""
+    # Only columns every version of the schema has, so this also seeds the
+    # baseline's checkout
+    conn = app_module.get_db_connection()
+    if app_module.USE_POSTGRES:
+        app_module.execute_query(conn, 'TRUNCATE songs RESTART IDENTITY CASCADE')
+    for i in range(SEED_SONGS):
+        song_id = i + 1
+        app_module.execute_query(conn, 'INSERT INTO songs (id, title, artist) VALUES (?, ?, ?)',
+                                 (song_id, f'Song {i}', 'Artist'))
+        for voter in range(SEED_VOTERS):
+            app_module.execute_query(conn, 'INSERT INTO ratings (song_id, user_id, rating) VALUES (?, ?, ?)',
+                                     (song_id, f'{voter:032x}', 1 if (i + voter) % 3 else -1))
+    if app_module.USE_POSTGRES:
+        app_module.execute_query(conn, "SELECT setval(pg_get_serial_sequence('songs', 'id'), ?)", (SEED_SONGS,))
+    conn.commit()
+    conn.close()
+
+
+def database_benchmarks(app_module):
+    """Benchmarks that go through the active backend"""
+    seed(app_module)
+    client = app_module.app.test_client()
+    counter = [0]
+
+    def connect():
+        app_module.get_db_connection().close()
+
+    conn = app_module.get_db_connection()
+
+    def fetch_one():
+        counter[0] += 1
+        app_module.execute_query(conn, 'SELECT id, title, artist FROM songs WHERE id = ?',
+                                 (counter[0] % SEED_SONGS + 1,), fetch_one=True)
+
+    def fetch_all():
+        counter[0] += 1
+        app_module.execute_query(conn, 'SELECT id, title, artist, album, year FROM songs WHERE id > ? ORDER BY id LIMIT 50',
+                                 (counter[0] % (SEED_SONGS - 50),), fetch_all=True)
+
+    def read():
+        counter[0] += 1
+        response = client.get(f'/api/songs/rating/Song%20{counter[0] % SEED_SONGS}/Artist',
+                              environ_base={'REMOTE_ADDR': f'10.0.{counter[0] // 256 % 256}.{counter[0] % 256}'})
+        assert response.status_code == 200, response.status_code
+
+    def write():
+        # A new listener's first vote: the common case at a track change
+        counter[0] += 1
+        n = counter[0]
+        response = client.post('/api/songs/rating',
+                               json={'title': f'Song {n % SEED_SONGS}', 'artist': 'Artist', 'rating': 1 if n % 4 else -1},
+                               environ_base={'REMOTE_ADDR': f'10.{n // 65536 % 256}.{n // 256 % 256}.{n % 256}'})
+        assert response.status_code == 200, response.status_code
+
+    def change_vote():
+        counter[0] += 1
+        response = client.post('/api/songs/rating',
+                               json={'title': 'Song 1', 'artist': 'Artist', 'rating': 1 if counter[0] % 2 else -1},
+                               environ_base={'REMOTE_ADDR': '10.255.255.1'})
+        assert response.status_code == 200, response.status_code
+
+    return {
+        'db.connect': connect,
+        'execute_query.fetch_one': fetch_one,
+        'execute_query.fetch_all': fetch_all,
+        'rating.read': read,
+        'rating.write': write,
+        'rating.change_vote': change_vote,
+    }
+
+
+def run_worker(backend, include_core, args):
+    """Child process: import app on the configured backend and time everything"""
+    sys.path.insert(0, ROOT)
+    import app as app_module
+
+    app_module.init_db()
+    benchmarks = {}
+    if include_core:
+        benchmarks.update({f'core/{name}': fn for name, fn in core_benchmarks(app_module).items()})
+    benchmarks.update({f'{backend}/{name}': fn for name, fn in database_benchmarks(app_module).items()})
+
+    only = set(args.only.split(',')) if args.only else None
+    results = {}
+    for name, fn in benchmarks.items():
+        if args.k not in name or (only is not None and name not in only):
+            continue
+        if args.lenient:
+            try:
+                fn()
+            except Exception as e:
+                print(f'  {name:<36} skipped, fails here ({type(e).__name__}: {e})', file=sys.stderr)
+                continue
+        results[name] = measure(fn, args.min_time, args.repeats)
+        print(f'  {name:<36} {format_time(results[name])}', file=sys.stderr)
+    json.dump(results, sys.stdout)
+
+
+def backend_env(backend, tmp):
+    """Environment for a backend's worker, or None if it is unavailable"""
+    env = dict(os.environ)
+    env.pop('DATABASE_URL', None)
+    env.pop('DATABASE_REPLICA_URLS', None)
+    env.update({
+        'RATE_LIMIT_PATH': os.path.join(tmp, f'{backend}.ratelimit'),
+        'ADMISSION_PATH': os.path.join(tmp, f'{backend}.admission'),
+        # The gate measures the handlers, not the per-listener limits
+        'RATE_LIMIT_READ_RATE': '1e9', 'RATE_LIMIT_READ_BURST': '1000000000',
+        'RATE_LIMIT_VOTE_RATE': '1e9', 'RATE_LIMIT_VOTE_BURST': '1000000000',
+        'STATIONS_FILE': os.path.join(tmp, 'no-stations.json'),
+    })
+    if backend == 'sqlite-file':
+        env['DATABASE'] = os.path.join(tmp, 'bench.db')
+    elif backend == 'sqlite-memory':
+        if not os.path.isdir('/dev/shm'):
+            return None
+        env['DATABASE'] = os.path.join('/dev/shm', f'neoradio-bench-{os.getpid()}.db')
+    elif backend == 'postgres':
+        if not os.environ.get('BENCH_POSTGRES_URL'):
+            return None
+        env['DATABASE_URL'] = os.environ['BENCH_POSTGRES_URL']
+    return env
+
+
+def format_time(seconds):
+    if seconds < 1e-3:
+        return f'{seconds * 1e6:9.2f} µs'
+    return f'{seconds * 1e3:9.2f} ms'
+
+
+def regressed(results, baseline, threshold):
+    """Names of benchmarks more than threshold slower than their baseline"""
+    return [name for name, seconds in results.items()
+            if name in baseline and seconds / baseline[name] > 1 + threshold]
+
+
+def report(results, baseline, threshold):
+    """Print results, with the ratio to the baseline where there is one"""
+    for name, seconds in results.items():
+        before = baseline.get(name)
+        if before is None:
+            print(f'{name:<40} {format_time(seconds)}   (no baseline)')
+            continue
+        ratio = seconds / before
+        flag = '  REGRESSION' if ratio > 1 + threshold else ''
+        print(f'{name:<40} {format_time(seconds)}   baseline {format_time(before)}   {ratio:5.2f}x{flag}')
+
+
+def run_suite(args, only=None):
+    """Run each backend's worker; returns {name: seconds per call}"""
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        core_pending = only is None or any(name.startswith('core/') for name in only)
+        for backend in args.backend or BACKENDS:
+            if only is not None and not core_pending and not any(name.startswith(f'{backend}/') for name in only):
+                continue
+            env = backend_env(backend, tmp)
+            if env is None:
+                print(f'{backend}: skipped (not available here)', file=sys.stderr)
+                continue
+            print(f'{backend}:', file=sys.stderr)
+            command = [sys.executable, os.path.abspath(__file__), '--worker', backend, '-k', args.k,
+                       '--min-time', str(args.min_time), '--repeats', str(args.repeats)]
+            if only is not None:
+                command += ['--only', ','.join(only)]
+            if core_pending:
+                command.append('--core')
+                core_pending = False
+            if args.save:
+                command.append('--lenient')
+            try:
+                output = subprocess.run(command, env=env, cwd=tmp, stdout=subprocess.PIPE, check=True).stdout
+            finally:
+                if backend == 'sqlite-memory':
+                    for suffix in ('', '-wal', '-shm', '-journal'):
+                        if os.path.exists(env['DATABASE'] + suffix):
+                            os.remove(env['DATABASE'] + suffix)
+            results.update(json.loads(output))
+    return results
+
+
+def machine_info():
+    return {'python': platform.python_version(), 'platform': platform.platform(),
+            'processor': platform.processor() or platform.machine(), 'cpus': os.cpu_count()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--backend', action='append', choices=BACKENDS, help='repeatable; default all available')
+    parser.add_argument('-k', default='', help='only run benchmarks whose name contains this')
+    parser.add_argument('--baseline', default=os.environ.get('BENCH_BASELINE', DEFAULT_BASELINE))
+    parser.add_argument('--save', action='store_true', help='record these results as the baseline')
+    parser.add_argument('--threshold', type=float, default=float(os.environ.get('BENCH_THRESHOLD', 0.25)),
+                        help='allowed slowdown before failing, as a fraction (default 0.25 = 25%%)')
+    parser.add_argument('--min-time', type=float, default=0.2, help='seconds per repeat')
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--confirm', type=int, default=2, help='re-runs of apparent regressions before failing')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    parser.add_argument('--core', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--only', help=argparse.SUPPRESS)
+    parser.add_argument('--lenient', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.core, args)
+        return
+
+    results = run_suite(args)
+    baseline = None
+    if not args.save and os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        # A slow outlier on a busy machine should not fail the gate: keep the
+        # fastest measurement, so a regression has to reproduce every time
+        for _ in range(args.confirm):
+            suspects = regressed(results, baseline['results'], args.threshold)
+            if not suspects:
+                break
+            print(f'\nRe-running {len(suspects)} slower benchmark(s) to confirm', file=sys.stderr)
+            for name, seconds in run_suite(args, only=suspects).items():
+                results[name] = min(results[name], seconds)
+
+    print()
+    if args.save:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({'machine': machine_info(), 'recorded_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                       'results': results}, f, indent=2, sort_keys=True)
+            f.write('\n')
+        report(results, {}, args.threshold)
+        print(f'\nBaseline saved to {os.path.relpath(args.baseline)}')
+        return
+
+    if baseline is None:
+        report(results, {}, args.threshold)
+        print(f'\nNo baseline at {os.path.relpath(args.baseline)}; record one with `make bench-baseline`.')
+        return
+
+    if baseline.get('machine') != machine_info():
+        print(f'Warning: baseline was recorded on a different machine ({baseline.get("machine")})\n')
+    report(results, baseline['results'], args.threshold)
+    regressions = regressed(results, baseline['results'], args.threshold)
+    if regressions:
+        print(f'\n{len(regressions)} benchmark(s) more than {args.threshold:.0%} slower than baseline: '
+              f'{", ".join(regressions)}')
+        sys.exit(1)
+    print(f'\nNo regressions over {args.threshold:.0%}.')
+
+
+if __name__ == '__main__':
+    main()
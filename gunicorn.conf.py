@@ -0,0 +1,67 @@
+"""
+gunicorn configuration for NeoRadio.
+
+The app is preloaded in the master: imports, schema checks, template
+compilation and the first now-playing snapshot happen once there, and the
+forked workers share those pages copy-on-write. Each worker then runs
+app.prewarm_worker() before it accepts connections and starts its
+metadata poller and cache invalidation listener. Only one worker's poller
+(the holder of the leader lock) fetches upstream; the others read its
+snapshots from shared memory.
+
+    gunicorn --config gunicorn.conf.py app:app
+
+GUNICORN_ROLE=live runs the same app as the live-ratings service: one
+gevent worker that holds thousands of /api/ratings/live streams (nginx
+routes that path to it, see docker-compose.yml), without the pollers.
+"""
+
+import gc
+import os
+import time
+
+role = os.environ.get('GUNICORN_ROLE', 'app')
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_CONCURRENCY', 1 if role == 'live' else 4))
+# Threads, so a live-ratings subscriber (a long-lived SSE response) does not
+# occupy a whole worker; the app role still caps them at LIVE_MAX_SUBSCRIBERS
+# per worker. A greenlet per subscriber lets the live role hold thousands.
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gevent' if role == 'live' else 'gthread')
+# Simultaneous clients per gevent worker (gunicorn's default is 1000)
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 10000))
+if worker_class == 'gevent':
+    # The app is preloaded in the master, so patch before it is imported
+    from gevent import monkey
+    monkey.patch_all()
+threads = int(os.environ.get('GUNICORN_THREADS', 32))
+timeout = 120
+preload_app = True
+
+
+def when_ready(server):
+    """Master, after the app is loaded: do the shared warm-up before forking"""
+    import app
+
+    server.log.info('Prewarmed app in %.1f ms', app.prewarm_app() * 1000)
+    # Move everything allocated so far out of the collector's generations, so
+    # GC passes in the workers do not write to (and un-share) inherited pages
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    worker.neoradio_forked_at = time.perf_counter()
+
+
+def post_worker_init(worker):
+    """Worker, before serving: per-process warm-up (connections, mmaps, first render)"""
+    import app
+
+    prewarm_seconds = app.prewarm_worker()
+    if role != 'live':
+        # Keeps every station's now-playing snapshot fresh in this worker:
+        # polled upstream by the host's leader, read from it by the rest
+        app.ensure_station_poller()
+        # Applies other workers' votes to this worker's caches
+        app.ensure_invalidation_listener()
+    worker.log.info('Worker %s ready %.1f ms after fork (prewarm %.1f ms)', worker.pid,
+                    (time.perf_counter() - worker.neoradio_forked_at) * 1000, prewarm_seconds * 1000)
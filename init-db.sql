@@ -7,7 +7,15 @@ CREATE TABLE IF NOT EXISTS songs (
     artist TEXT NOT NULL,
     album TEXT,
     year TEXT,
-    UNIQUE(title, artist)
+    -- Station id from the registry (stations.json); 'main' is the original station
+    station TEXT NOT NULL DEFAULT 'main',
+    -- Full-text search over title (weight A) and artist (weight B)
+    search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', title), 'A') || setweight(to_tsvector('simple', artist), 'B')
+    ) STORED,
+    -- Search rank order: title length (capped at 255) above the song id
+    search_key BIGINT GENERATED ALWAYS AS ((CAST(least(length(title), 255) AS BIGINT) << 40) + id) STORED,
+    UNIQUE(station, title, artist)
 );
 
 -- Create ratings table
@@ -21,8 +29,50 @@ CREATE TABLE IF NOT EXISTS ratings (
     FOREIGN KEY (song_id) REFERENCES songs (id) ON DELETE CASCADE
 );
 
+-- Create precomputed chart rankings (maintained incrementally on each vote)
+-- period is 'all', 'week:YYYY-Www' or 'day:YYYY-MM-DD'
+CREATE TABLE IF NOT EXISTS chart_scores (
+    period TEXT NOT NULL,
+    song_id INTEGER NOT NULL,
+    -- The song's station: each station has its own charts
+    station TEXT NOT NULL DEFAULT 'main',
+    thumbs_up INTEGER NOT NULL DEFAULT 0,
+    thumbs_down INTEGER NOT NULL DEFAULT 0,
+    score DOUBLE PRECISION NOT NULL DEFAULT 0,
+    PRIMARY KEY (period, song_id),
+    FOREIGN KEY (song_id) REFERENCES songs (id) ON DELETE CASCADE
+);
+
+-- Create hourly/daily vote rollups and the watermark of the last rolled-up rating
+CREATE TABLE IF NOT EXISTS rating_rollups (
+    bucket_size TEXT NOT NULL,
+    song_id INTEGER NOT NULL,
+    bucket_start TIMESTAMP NOT NULL,
+    thumbs_up INTEGER NOT NULL DEFAULT 0,
+    thumbs_down INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (bucket_size, song_id, bucket_start)
+);
+
+CREATE TABLE IF NOT EXISTS rollup_state (
+    name TEXT PRIMARY KEY,
+    watermark BIGINT NOT NULL DEFAULT 0
+);
+
+-- Create play history table (one row per track change seen by the metadata poller)
+CREATE TABLE IF NOT EXISTS plays (
+    id SERIAL PRIMARY KEY,
+    song_id INTEGER NOT NULL,
+    started_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (song_id) REFERENCES songs (id) ON DELETE CASCADE
+);
+
 -- Create indexes for better performance
 CREATE INDEX IF NOT EXISTS idx_ratings_song_id ON ratings(song_id);
-CREATE INDEX IF NOT EXISTS idx_ratings_user_id ON ratings(user_id);
+-- Covering index for a listener's votes in order (/api/me/ratings)
+CREATE INDEX IF NOT EXISTS idx_ratings_user_recent ON ratings(user_id, created_at, id, song_id, rating);
 CREATE INDEX IF NOT EXISTS idx_songs_artist ON songs(artist);
 CREATE INDEX IF NOT EXISTS idx_songs_title ON songs(title);
+CREATE INDEX IF NOT EXISTS idx_songs_search ON songs USING GIN (search_vector);
+CREATE INDEX IF NOT EXISTS idx_songs_search_key ON songs(station, search_key);
+CREATE INDEX IF NOT EXISTS idx_plays_started_at ON plays(started_at);
+CREATE INDEX IF NOT EXISTS idx_chart_scores_station_rank ON chart_scores(station, period, score DESC);
@@ -0,0 +1,75 @@
+-- NeoRadio: optional monthly range partitioning of ratings (PostgreSQL 12+)
+--
+-- Converts ratings into a table partitioned by created_at so old months can be
+-- archived by detaching a partition instead of running a large DELETE.
+-- Hourly/daily analytics keep working after archiving because
+-- /api/songs/<id>/stats reads rating_rollups, not raw ratings.
+--
+-- Run `flask rollup-ratings` before archiving a partition.
+--
+-- Trade-off: a unique constraint on a partitioned table must include the
+-- partition key, so UNIQUE(song_id, user_id) becomes
+-- UNIQUE(song_id, user_id, created_at). rate_song() checks for an existing
+-- vote before inserting, so a listener still gets one vote per song; two
+-- simultaneous first votes from the same listener could both be stored.
+--
+-- Usage (with the application stopped):
+--   psql "$DATABASE_URL" -f partition-ratings.sql
+--
+-- Afterwards, create next month's partition ahead of time (e.g. from cron):
+--   SELECT create_ratings_partition(date_trunc('month', now() + interval '1 month')::date);
+--
+-- Archive a month:
+--   ALTER TABLE ratings DETACH PARTITION ratings_2025_01;
+--   -- pg_dump -t ratings_2025_01 ... then DROP TABLE ratings_2025_01;
+
+BEGIN;
+
+CREATE OR REPLACE FUNCTION create_ratings_partition(month_start DATE) RETURNS VOID AS $$
+BEGIN
+    EXECUTE format(
+        'CREATE TABLE IF NOT EXISTS %I PARTITION OF ratings FOR VALUES FROM (%L) TO (%L)',
+        'ratings_' || to_char(month_start, 'YYYY_MM'),
+        month_start,
+        (month_start + INTERVAL '1 month')::date
+    );
+END;
+$$ LANGUAGE plpgsql;
+
+ALTER TABLE ratings RENAME TO ratings_unpartitioned;
+ALTER INDEX IF EXISTS idx_ratings_song_id RENAME TO idx_ratings_unpartitioned_song_id;
+ALTER INDEX IF EXISTS idx_ratings_user_id RENAME TO idx_ratings_unpartitioned_user_id;
+ALTER INDEX IF EXISTS idx_ratings_user_recent RENAME TO idx_ratings_unpartitioned_user_recent;
+
+CREATE TABLE ratings (
+    id SERIAL,
+    song_id INTEGER NOT NULL REFERENCES songs (id) ON DELETE CASCADE,
+    user_id TEXT NOT NULL,
+    rating INTEGER NOT NULL CHECK(rating IN (1, -1)),
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, created_at),
+    UNIQUE (song_id, user_id, created_at)
+) PARTITION BY RANGE (created_at);
+
+-- One partition per month from the oldest rating through next month
+SELECT create_ratings_partition(month::date)
+FROM generate_series(
+    date_trunc('month', COALESCE((SELECT MIN(created_at) FROM ratings_unpartitioned), now())),
+    date_trunc('month', now() + INTERVAL '1 month'),
+    INTERVAL '1 month'
+) AS month;
+
+INSERT INTO ratings (id, song_id, user_id, rating, created_at)
+SELECT id, song_id, user_id, rating, COALESCE(created_at, CURRENT_TIMESTAMP)
+FROM ratings_unpartitioned;
+
+SELECT setval(pg_get_serial_sequence('ratings', 'id'),
+              COALESCE((SELECT MAX(id) FROM ratings), 0) + 1, false);
+
+CREATE INDEX IF NOT EXISTS idx_ratings_song_id ON ratings(song_id);
+CREATE INDEX IF NOT EXISTS idx_ratings_user_recent ON ratings(user_id, created_at, id, song_id, rating);
+
+-- chart_scores and rating_rollups reference songs, not ratings, so nothing else moves
+DROP TABLE ratings_unpartitioned;
+
+COMMIT;
@@ -2,7 +2,9 @@
 const DEBUG = false; // Set to true for development, false for production
 const log = DEBUG ? console.log.bind(console) : () => {};
 
-const streamUrl = 'https://d3d4yli4hf5bmh.cloudfront.net/hls/live.m3u8';
+// The page is rendered for one station; data-station is empty for the default one
+const station = document.body.dataset.station || '';
+const streamUrl = document.body.dataset.streamUrl || 'https://d3d4yli4hf5bmh.cloudfront.net/hls/live.m3u8';
 const audio = document.getElementById('audio');
 const statusEl = document.getElementById('status');
 const playBtn = document.getElementById('playBtn');
@@ -11,16 +13,20 @@ const connectionStatus = document.getElementById('connectionStatus');
 let hls;
 let trackHistory = [];
 let currentTrack = null;
-let previousAlbum = null;
+let previousCover = null;
+let currentUserRating = null;
 
-// Initialize visualizer bars
+// Scope an API URL to this page's station
+function stationUrl(url) {
+    if (!station) {
+        return url;
+    }
+    return url + (url.includes('?') ? '&' : '?') + 'station=' + encodeURIComponent(station);
+}
+
+// Spectrum visualizer canvas (drawn in a worker via OffscreenCanvas when supported)
 const visualizer = document.getElementById('visualizer');
 const barCount = 40;
-for (let i = 0; i < barCount; i++) {
-    const bar = document.createElement('div');
-    bar.className = 'bar';
-    visualizer.appendChild(bar);
-}
 
 function updateStatus(message, className) {
     statusEl.textContent = message;
@@ -28,6 +34,9 @@ function updateStatus(message, className) {
 }
 
 function playStream() {
+    // Still inside the click: the only place Safari/iOS lets an AudioContext start
+    unlockAudioContext();
+
     if (Hls.isSupported()) {
         updateStatus('Loading stream...', 'loading');
 
@@ -199,29 +208,188 @@ function changeVolume(value) {
     document.getElementById('volumeValue').textContent = value;
 }
 
-// Simple visualizer animation
-let visualizerInterval;
+// Spectrum visualizer: an AnalyserNode tapped off the <audio> element, drawn on
+// requestAnimationFrame. The frame interval adapts to how long frames take.
+const MIN_FRAME_INTERVAL = 1000 / 60;
+const MAX_FRAME_INTERVAL = 1000 / 15;
+const FRAME_BUDGET_MS = 4;
+
+let audioContext = null;
+let audioContextResuming = null; // resume() started by the last Play click
+let analyser = null;
+let spectrum = null;
+let visualizerWorker = null;
+let visualizerCtx = null;
+let visualizerFrame = null;
+let visualizerRunning = false;
+let frameInterval = MIN_FRAME_INTERVAL;
+let lastFrameTime = 0;
+let frameCost = 0;
+
+// Create or resume the AudioContext; must run synchronously in a user gesture.
+// Nothing is routed through it yet, so a context the browser refuses to start
+// costs nothing but the visualizer.
+function unlockAudioContext() {
+    if (!audioContext) {
+        const AudioContextClass = window.AudioContext || window.webkitAudioContext;
+        if (!AudioContextClass) {
+            return;
+        }
+        audioContext = new AudioContextClass();
+        // iOS suspends ("interrupts") the context on calls and screen lock; audio
+        // routed through it is silent until it runs again
+        audioContext.onstatechange = () => {
+            if (analyser && audioContext.state !== 'running' && !audio.paused) {
+                audioContext.resume().catch(() => {});
+            }
+        };
+    }
+    if (audioContext.state !== 'running') {
+        audioContextResuming = audioContext.resume().catch(() => {});
+    }
+}
+
+function setupVisualizer() {
+    if (analyser) {
+        return true;
+    }
+    // Routing the <audio> element into a context that is not running would
+    // silence playback; without a running context, play without the visualizer
+    if (!audioContext || audioContext.state !== 'running') {
+        return false;
+    }
+
+    analyser = audioContext.createAnalyser();
+    analyser.fftSize = 256;
+    analyser.smoothingTimeConstant = 0.8;
+    // A media element can only be routed once; the graph lives as long as the page
+    const source = audioContext.createMediaElementSource(audio);
+    source.connect(analyser);
+    analyser.connect(audioContext.destination);
+    spectrum = new Uint8Array(analyser.frequencyBinCount);
+
+    const dpr = window.devicePixelRatio || 1;
+    const width = Math.round(visualizer.clientWidth * dpr);
+    const height = Math.round(visualizer.clientHeight * dpr);
+
+    if (visualizer.transferControlToOffscreen && window.Worker) {
+        const offscreen = visualizer.transferControlToOffscreen();
+        visualizerWorker = new Worker(visualizer.dataset.worker);
+        visualizerWorker.postMessage({ type: 'init', canvas: offscreen, width, height, barCount }, [offscreen]);
+    } else {
+        visualizer.width = width;
+        visualizer.height = height;
+        visualizerCtx = visualizer.getContext('2d');
+    }
+    return true;
+}
+
+// Average the analyser bins into barCount values on a roughly logarithmic scale
+function spectrumToBars(bins) {
+    const bars = new Uint8Array(barCount);
+    const maxBin = bins.length * 0.75; // top of the spectrum is mostly empty
+    for (let i = 0; i < barCount; i++) {
+        const start = Math.floor(Math.pow(maxBin, i / barCount));
+        const end = Math.max(start + 1, Math.floor(Math.pow(maxBin, (i + 1) / barCount)));
+        let sum = 0;
+        for (let j = start; j < end; j++) {
+            sum += bins[j];
+        }
+        bars[i] = sum / (end - start);
+    }
+    return bars;
+}
+
+function drawBars(ctx, bars) {
+    const { width, height } = ctx.canvas;
+    ctx.clearRect(0, 0, width, height);
+    ctx.fillStyle = '#5568d3';
+    const slot = width / bars.length;
+    const barWidth = Math.max(1, slot - 2);
+    for (let i = 0; i < bars.length; i++) {
+        const barHeight = Math.max(2, (bars[i] / 255) * height);
+        ctx.fillRect(i * slot, height - barHeight, barWidth, barHeight);
+    }
+}
+
+function renderVisualizerFrame(now) {
+    if (!visualizerRunning) {
+        return;
+    }
+    visualizerFrame = requestAnimationFrame(renderVisualizerFrame);
+    if (now - lastFrameTime < frameInterval) {
+        return;
+    }
+    lastFrameTime = now;
+
+    const started = performance.now();
+    analyser.getByteFrequencyData(spectrum);
+    const bars = spectrumToBars(spectrum);
+    if (visualizerWorker) {
+        visualizerWorker.postMessage({ type: 'frame', bars }, [bars.buffer]);
+    } else {
+        drawBars(visualizerCtx, bars);
+    }
+
+    // Back off when frames are expensive, speed up again when there is headroom
+    frameCost = frameCost * 0.9 + (performance.now() - started) * 0.1;
+    if (frameCost > FRAME_BUDGET_MS && frameInterval < MAX_FRAME_INTERVAL) {
+        frameInterval = Math.min(MAX_FRAME_INTERVAL, frameInterval * 2);
+        frameCost = 0;
+    } else if (frameCost < FRAME_BUDGET_MS / 4 && frameInterval > MIN_FRAME_INTERVAL) {
+        frameInterval = Math.max(MIN_FRAME_INTERVAL, frameInterval / 2);
+    }
+}
 
 function startVisualizer() {
-    const bars = document.querySelectorAll('.bar');
-    visualizerInterval = setInterval(() => {
-        bars.forEach(bar => {
-            const height = Math.random() * 40 + 10;
-            bar.style.height = height + 'px';
-        });
-    }, 150);
+    if (!setupVisualizer()) {
+        // The resume started by the click may not have settled yet
+        const resuming = audioContextResuming;
+        audioContextResuming = null;
+        if (resuming) {
+            resuming.then(() => {
+                if (!audio.paused && audioContext.state === 'running') {
+                    startVisualizer();
+                }
+            });
+        }
+        return;
+    }
+    visualizerRunning = true;
+    if (!document.hidden && !visualizerFrame) {
+        visualizerFrame = requestAnimationFrame(renderVisualizerFrame);
+    }
 }
 
 function stopVisualizer() {
-    if (visualizerInterval) {
-        clearInterval(visualizerInterval);
-        const bars = document.querySelectorAll('.bar');
-        bars.forEach(bar => {
-            bar.style.height = '5px';
-        });
+    visualizerRunning = false;
+    if (visualizerFrame) {
+        cancelAnimationFrame(visualizerFrame);
+        visualizerFrame = null;
+    }
+    const idle = new Uint8Array(barCount);
+    if (visualizerWorker) {
+        visualizerWorker.postMessage({ type: 'frame', bars: idle }, [idle.buffer]);
+    } else if (visualizerCtx) {
+        drawBars(visualizerCtx, idle);
     }
 }
 
+// Nobody sees the spectrum in a hidden tab; stop drawing until it is visible
+document.addEventListener('visibilitychange', () => {
+    if (!visualizerRunning) {
+        return;
+    }
+    if (document.hidden) {
+        if (visualizerFrame) {
+            cancelAnimationFrame(visualizerFrame);
+            visualizerFrame = null;
+        }
+    } else if (!visualizerFrame) {
+        visualizerFrame = requestAnimationFrame(renderVisualizerFrame);
+    }
+});
+
 // Handle audio events
 audio.addEventListener('waiting', () => {
     updateStatus('Buffering...', 'loading');
@@ -245,58 +413,159 @@ audio.addEventListener('ended', () => {
 audio.volume = 1.0;
 
 // Poll for metadata from API (fallback if HLS doesn't have embedded metadata)
-let metadataPollingInterval = null;
+// The server tells us when the next track change is due via next_poll_after
+const DEFAULT_POLL_SECONDS = 10;
+let metadataPollingTimer = null;
+let metadataPollingActive = false;
 
 function startMetadataPolling() {
-    // Poll every 10 seconds
-    metadataPollingInterval = setInterval(fetchMetadataFromAPI, 10000);
-    // Fetch immediately
-    fetchMetadataFromAPI();
+    metadataPollingActive = true;
+    // Fetch immediately; each response schedules the next poll
+    pollMetadata();
+    // Polls can be 90s apart and stop while the tab is hidden, so heartbeats
+    // also run on their own timer to stay inside the server's active window
+    if (heartbeatTimer) {
+        clearInterval(heartbeatTimer);
+    }
+    heartbeatTimer = setInterval(heartbeatIfDue, HEARTBEAT_SECONDS * 1000);
+    openLiveRatings();
+}
+
+// Live rating totals for the current track, pushed by the server (coalesced
+// to a few updates per second). If the server has no room for another
+// subscriber the ratings simply load on each track change as before.
+let liveRatings = null;
+
+function openLiveRatings() {
+    // Live totals are only published for the default station
+    if (liveRatings || !window.EventSource || station) {
+        return;
+    }
+    liveRatings = new EventSource('/api/ratings/live');
+    liveRatings.addEventListener('rating', (event) => {
+        const data = JSON.parse(event.data);
+        if (currentTrack && data.title === currentTrack.title && data.artist === currentTrack.artist) {
+            updateRatingDisplay(data.thumbs_up, data.thumbs_down, currentUserRating);
+        }
+    });
+    liveRatings.onerror = () => {
+        // EventSource retries by itself unless the server refused (e.g. 503)
+        if (liveRatings && liveRatings.readyState === EventSource.CLOSED) {
+            liveRatings = null;
+        }
+    };
+}
+
+function closeLiveRatings() {
+    if (liveRatings) {
+        liveRatings.close();
+        liveRatings = null;
+    }
 }
 
 function stopMetadataPolling() {
-    if (metadataPollingInterval) {
-        clearInterval(metadataPollingInterval);
-        metadataPollingInterval = null;
+    metadataPollingActive = false;
+    if (metadataPollingTimer) {
+        clearTimeout(metadataPollingTimer);
+        metadataPollingTimer = null;
+    }
+    if (heartbeatTimer) {
+        clearInterval(heartbeatTimer);
+        heartbeatTimer = null;
+    }
+    closeLiveRatings();
+}
+
+// Listener heartbeats feed the /api/listeners estimate; only sent while audio plays
+const HEARTBEAT_SECONDS = 50;
+let heartbeatTimer = null;
+let lastHeartbeat = 0;
+
+function heartbeatIfDue() {
+    if (audio.paused || Date.now() - lastHeartbeat < HEARTBEAT_SECONDS * 1000) {
+        return;
+    }
+    lastHeartbeat = Date.now();
+    if (!(navigator.sendBeacon && navigator.sendBeacon('/api/heartbeat'))) {
+        fetch('/api/heartbeat', { method: 'POST', keepalive: true }).catch(() => {});
+    }
+}
+
+async function pollMetadata(cache = 'default') {
+    metadataPollingTimer = null;
+    heartbeatIfDue();
+    const nextPollAfter = await fetchMetadataFromAPI(cache);
+    scheduleMetadataPoll(nextPollAfter || DEFAULT_POLL_SECONDS);
+}
+
+function scheduleMetadataPoll(seconds) {
+    if (!metadataPollingActive || document.hidden) {
+        return;
+    }
+    if (metadataPollingTimer) {
+        clearTimeout(metadataPollingTimer);
     }
+    // Up to 10% + 1s of jitter so listeners don't all hit the boundary at once
+    const jitter = Math.random() * (seconds * 0.1 + 1);
+    metadataPollingTimer = setTimeout(pollMetadata, (seconds + jitter) * 1000);
 }
 
-async function fetchMetadataFromAPI() {
+// Pause polling while the tab is hidden, catch up as soon as it is visible again
+document.addEventListener('visibilitychange', () => {
+    if (!metadataPollingActive) {
+        return;
+    }
+    if (document.hidden) {
+        if (metadataPollingTimer) {
+            clearTimeout(metadataPollingTimer);
+            metadataPollingTimer = null;
+        }
+    } else {
+        // The last response may still be fresh in the HTTP cache (max-age is
+        // the expected track change), but the track may have changed while
+        // the tab was hidden: ask the server
+        pollMetadata('no-cache');
+    }
+});
+
+async function fetchMetadataFromAPI(cache = 'default') {
     try {
-        const response = await fetch('/api/metadata');
+        const response = await fetch(stationUrl('/api/metadata'), { cache });
         if (!response.ok) {
             // No metadata API available - this is expected
-            return;
+            return null;
         }
 
         const data = await response.json();
         log('API metadata response:', data);
 
-        if (data.data) {
+        if (data.track) {
             // Parse the API response
-            parseAPIMetadata(data.data);
+            parseAPIMetadata(data.track);
         }
+        return data.next_poll_after;
     } catch (error) {
         // Silently fail - no metadata API available
         log('No metadata API available');
+        return null;
     }
 }
 
-function parseAPIMetadata(data) {
+function parseAPIMetadata(data, knownRating) {
     log('Parsing API metadata:', data);
 
     const track = {};
 
-    // Extract current track info from metadatav2.json format
+    // Extract current track info from the server's normalized track object
     if (data.title) track.title = data.title;
     if (data.artist) track.artist = data.artist;
     if (data.album) track.album = data.album;
-    if (data.date) track.year = data.date;
+    if (data.year) track.year = data.year;
 
     // Only update if we have at least a title or artist
     if (track.title || track.artist) {
         log('Track data from API:', track);
-        updateTrackInfo(track);
+        updateTrackInfo(track, knownRating);
     } else {
         log('No track data found in metadata');
     }
@@ -373,8 +642,19 @@ function parseID3Metadata(metadata) {
     }
 }
 
+// /api/art query naming a track's cover: by artist and album, or by artist
+// and title when upstream gives no album (never the display placeholders)
+function albumArtQuery(trackData) {
+    const artist = `artist=${encodeURIComponent(trackData.artist || '')}`;
+    if (trackData.album) {
+        return `${artist}&album=${encodeURIComponent(trackData.album)}`;
+    }
+    return `${artist}&title=${encodeURIComponent(trackData.title || '')}`;
+}
+
 // Update track information from metadata
-function updateTrackInfo(trackData) {
+// knownRating (optional) skips the rating lookup when counts are already known
+function updateTrackInfo(trackData, knownRating) {
     const track = {
         title: trackData.title || 'Live Stream',
         artist: trackData.artist || 'NeoRadio',
@@ -395,15 +675,22 @@ function updateTrackInfo(trackData) {
         currentTrack = track;
         addToHistory(track);
 
-        // Only refresh album art if album actually changed (better caching)
+        // Only refresh album art if the cover actually changed (better caching)
         const albumArt = document.getElementById('albumArt');
-        if (track.album !== previousAlbum) {
-            albumArt.src = `https://d3d4yli4hf5bmh.cloudfront.net/cover.jpg?v=${encodeURIComponent(track.album || 'default')}`;
-            previousAlbum = track.album;
+        const cover = albumArtQuery(trackData);
+        if (cover !== previousCover) {
+            // Resized, long-cached variants from /api/art (WebP where the browser accepts it)
+            albumArt.srcset = `${stationUrl(`/api/art?${cover}&size=240`)} 2x`;
+            albumArt.src = stationUrl(`/api/art?${cover}&size=120`);
+            previousCover = cover;
         }
 
         // Load rating for this track
-        loadSongRating(track.title, track.artist);
+        if (knownRating) {
+            updateRatingDisplay(knownRating.thumbs_up, knownRating.thumbs_down, knownRating.user_rating);
+        } else {
+            loadSongRating(track.title, track.artist);
+        }
     } else if (hasRealData) {
         // Even if not new, load rating on initial load
         loadSongRating(track.title, track.artist);
@@ -412,6 +699,12 @@ function updateTrackInfo(trackData) {
 
 // Add track to history
 function addToHistory(track) {
+    // The server-side history may already start with this track
+    if (trackHistory.length > 0 &&
+        trackHistory[0].title === track.title && trackHistory[0].artist === track.artist) {
+        return;
+    }
+
     const historyItem = {
         ...track,
         timestamp: new Date()
@@ -427,6 +720,30 @@ function addToHistory(track) {
     updateHistoryDisplay();
 }
 
+// Load recent plays recorded by the server (survives reloads, unlike trackHistory)
+async function loadServerHistory() {
+    try {
+        const response = await fetch(stationUrl('/api/history?limit=10'));
+        if (!response.ok) {
+            return;
+        }
+        const data = await response.json();
+        if (data.plays.length === 0) {
+            return;
+        }
+        trackHistory = data.plays.map(play => ({
+            title: play.title,
+            artist: play.artist,
+            album: play.album || 'Live Broadcast',
+            year: play.year || '-',
+            timestamp: new Date(play.started_at)
+        }));
+        updateHistoryDisplay();
+    } catch (error) {
+        log('Could not load history:', error);
+    }
+}
+
 // Update history display
 function updateHistoryDisplay() {
     const historyContainer = document.getElementById('trackHistory');
@@ -481,14 +798,39 @@ function updateAudioQuality(levelIndex) {
     document.getElementById('channels').textContent = 'Stereo (2.0)';
 }
 
+// Read the now-playing snapshot the server rendered into the page
+function readBootstrap() {
+    const el = document.getElementById('bootstrap');
+    if (!el) {
+        return null;
+    }
+    try {
+        return JSON.parse(el.textContent);
+    } catch (error) {
+        log('Invalid bootstrap data:', error);
+        return null;
+    }
+}
+
 // Load initial track metadata on page load
 async function loadInitialMetadata() {
+    // Prefer the server-rendered snapshot: no /api/metadata or rating round trip
+    const bootstrap = readBootstrap();
+    if (bootstrap && bootstrap.track) {
+        parseAPIMetadata(bootstrap.track, bootstrap.rating);
+        // A page served from the service worker cache may predate the current
+        // track; paint it immediately, then refresh if the track should have changed
+        if (!bootstrap.refresh_after || Date.now() / 1000 < bootstrap.refresh_after) {
+            return;
+        }
+    }
+
     try {
-        const response = await fetch('/api/metadata');
+        const response = await fetch(stationUrl('/api/metadata'));
         if (response.ok) {
             const data = await response.json();
-            if (data.data) {
-                parseAPIMetadata(data.data);
+            if (data.track) {
+                parseAPIMetadata(data.track);
             }
         }
     } catch (error) {
@@ -496,8 +838,18 @@ async function loadInitialMetadata() {
     }
 }
 
-// Load metadata when page loads
+// Load metadata and play history when page loads
 loadInitialMetadata();
+loadServerHistory();
+
+// Cache the app shell for instant repeat visits
+if ('serviceWorker' in navigator) {
+    window.addEventListener('load', () => {
+        navigator.serviceWorker.register('/sw.js').catch(error => {
+            log('Service worker registration failed:', error);
+        });
+    });
+}
 
 // Rating functionality
 async function rateSong(rating) {
@@ -517,7 +869,8 @@ async function rateSong(rating) {
                 artist: currentTrack.artist,
                 album: currentTrack.album,
                 year: currentTrack.year,
-                rating: rating
+                rating: rating,
+                station: station || undefined
             })
         });
 
@@ -534,7 +887,7 @@ async function rateSong(rating) {
 
 async function loadSongRating(title, artist) {
     try {
-        const response = await fetch(`/api/songs/rating/${encodeURIComponent(title)}/${encodeURIComponent(artist)}`);
+        const response = await fetch(stationUrl(`/api/songs/rating/${encodeURIComponent(title)}/${encodeURIComponent(artist)}`));
         if (response.ok) {
             const data = await response.json();
             updateRatingDisplay(data.thumbs_up, data.thumbs_down, data.user_rating);
@@ -546,6 +899,7 @@ async function loadSongRating(title, artist) {
 }
 
 function updateRatingDisplay(thumbsUp, thumbsDown, userRating) {
+    currentUserRating = userRating;
     document.getElementById('thumbsUpCount').textContent = thumbsUp;
     document.getElementById('thumbsDownCount').textContent = thumbsDown;
 
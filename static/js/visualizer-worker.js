@@ -0,0 +1,27 @@
+// Draws visualizer bars on an OffscreenCanvas off the main thread.
+// radio.js posts {type: 'init', canvas, width, height} once, then {type: 'frame', bars}.
+let ctx = null;
+
+function drawBars(bars) {
+    const { width, height } = ctx.canvas;
+    ctx.clearRect(0, 0, width, height);
+    ctx.fillStyle = '#5568d3';
+    const slot = width / bars.length;
+    const barWidth = Math.max(1, slot - 2);
+    for (let i = 0; i < bars.length; i++) {
+        const barHeight = Math.max(2, (bars[i] / 255) * height);
+        ctx.fillRect(i * slot, height - barHeight, barWidth, barHeight);
+    }
+}
+
+self.onmessage = (event) => {
+    const message = event.data;
+    if (message.type === 'init') {
+        message.canvas.width = message.width;
+        message.canvas.height = message.height;
+        ctx = message.canvas.getContext('2d');
+        drawBars(new Uint8Array(message.barCount));
+    } else if (message.type === 'frame' && ctx) {
+        drawBars(message.bars);
+    }
+};
@@ -0,0 +1,76 @@
+// NeoRadio service worker: precaches the versioned app shell and serves it
+// cache-first, revalidating in the background. Live HLS playlists/segments and
+// /api/* responses always go to the network and are never cached.
+// Rendered by app.py; the cache name changes whenever an asset fingerprint does.
+const CACHE_PREFIX = 'neoradio-shell-';
+const CACHE_NAME = CACHE_PREFIX + '{{ version }}';
+const SHELL_URLS = {{ shell_urls|tojson }};
+const PAGE_URL = '/radio';
+
+self.addEventListener('install', (event) => {
+    event.waitUntil(
+        caches.open(CACHE_NAME)
+            .then((cache) => cache.addAll(SHELL_URLS.map((url) => new Request(url, { mode: 'cors' }))))
+            .then(() => self.skipWaiting())
+    );
+});
+
+self.addEventListener('activate', (event) => {
+    // Drop shells from previous fingerprints
+    event.waitUntil(
+        caches.keys()
+            .then((names) => Promise.all(
+                names
+                    .filter((name) => name.startsWith(CACHE_PREFIX) && name !== CACHE_NAME)
+                    .map((name) => caches.delete(name))
+            ))
+            .then(() => self.clients.claim())
+    );
+});
+
+function isLiveOrApi(url) {
+    return url.pathname.startsWith('/api/') ||
+        url.pathname.startsWith('/hls/') ||
+        /\.(m3u8|ts|aac|m4s|mp4)$/.test(url.pathname);
+}
+
+function shellKey(request, url) {
+    if (request.mode === 'navigate' && (url.pathname === '/' || url.pathname === '/radio')) {
+        return PAGE_URL;
+    }
+    if (SHELL_URLS.includes(request.url) || SHELL_URLS.includes(url.pathname + url.search)) {
+        return request.url;
+    }
+    return null;
+}
+
+self.addEventListener('fetch', (event) => {
+    const request = event.request;
+    if (request.method !== 'GET') {
+        return;
+    }
+    const url = new URL(request.url);
+    if (isLiveOrApi(url)) {
+        return;
+    }
+    const key = shellKey(request, url);
+    if (!key) {
+        return;
+    }
+
+    event.respondWith(caches.open(CACHE_NAME).then(async (cache) => {
+        const cached = await cache.match(key);
+        const refresh = fetch(key === PAGE_URL ? PAGE_URL : request).then((response) => {
+            if (response.ok) {
+                cache.put(key, response.clone());
+            }
+            return response;
+        });
+        if (cached) {
+            // Stale-while-revalidate: answer now, update the cache for next time
+            event.waitUntil(refresh.catch(() => {}));
+            return cached;
+        }
+        return refresh;
+    }));
+});
@@ -4,6 +4,7 @@ Pytest configuration and fixtures for NeoRadio tests.
 
 import pytest
 import os
+import shutil
 import tempfile
 from app import app, init_db, DATABASE
 
@@ -26,6 +27,34 @@ def test_app():
     # Initialize the test database
     init_db()
 
+    # Per-process caches must not leak results between test databases
+    app_module._history_cache.clear()
+    app_module._charts_cache.clear()
+    app_module._replica_state.clear()
+    app_module._song_ids.clear()
+    app_module._search_cache.clear()
+    app_module._my_ratings_cache.clear()
+    app_module._hot_ratings.update(key=None, song_id=None, votes={}, thumbs_up=0, thumbs_down=0, loaded_at=0.0)
+
+    # Each test gets its own rate-limit bucket table
+    original_rate_limit_path = app_module.RATE_LIMIT_PATH
+    app_module.RATE_LIMIT_PATH = db_path + '.ratelimit'
+    original_admission_path = app_module.ADMISSION_PATH
+    app_module.ADMISSION_PATH = db_path + '.admission'
+    original_listener_path = app_module.LISTENER_SKETCH_PATH
+    app_module.LISTENER_SKETCH_PATH = db_path + '.listeners'
+    app_module._listeners_cache.clear()
+    original_live_path = app_module.LIVE_RATINGS_PATH
+    app_module.LIVE_RATINGS_PATH = db_path + '.live'
+    original_now_playing_path = app_module.NOW_PLAYING_PATH
+    app_module.NOW_PLAYING_PATH = db_path + '.now-playing'
+    original_art_dir = app_module.ART_CACHE_DIR
+    app_module.ART_CACHE_DIR = db_path + '.art'
+    original_invalidation_path = app_module.INVALIDATION_PATH
+    app_module.INVALIDATION_PATH = db_path + '.invalidations'
+    app_module._invalidation_bus.update(pid=None, generation=None, running=False, applied=0, flushes=0)
+    app_module._invalidation_bus['lags'].clear()
+
     yield app
 
     # Cleanup - ensure all connections are closed
@@ -46,6 +75,20 @@ def test_app():
             pass  # If it still fails, the temp file will be cleaned up by OS
 
     app_module.DATABASE = original_db
+    app_module.RATE_LIMIT_PATH = original_rate_limit_path
+    app_module.ADMISSION_PATH = original_admission_path
+    app_module.LISTENER_SKETCH_PATH = original_listener_path
+    app_module.LIVE_RATINGS_PATH = original_live_path
+    app_module.NOW_PLAYING_PATH = original_now_playing_path
+    app_module.ART_CACHE_DIR = original_art_dir
+    app_module.INVALIDATION_PATH = original_invalidation_path
+    app_module._invalidation_bus['running'] = False  # stops a bus thread a test started
+    if app_module._invalidation_bus['thread'] is not None:
+        app_module._invalidation_bus['thread'].join(1)
+    shutil.rmtree(db_path + '.art', ignore_errors=True)
+    for suffix in ('.ratelimit', '.listeners', '.live', '.invalidations', '.now-playing', '.now-playing.leader'):
+        if os.path.exists(db_path + suffix):
+            os.unlink(db_path + suffix)
 
 
 @pytest.fixture
@@ -58,3 +101,58 @@ def client(test_app):
 def runner(test_app):
     """Create a test CLI runner."""
     return test_app.test_cli_runner()
+
+
+
+class FakeUpstream:
+    """Stand-in for the metadata CDN: a mutable document plus a call log."""
+
+    def __init__(self):
+        self.document = {
+            'title': 'Upstream Song',
+            'artist': 'Upstream Artist',
+            'album': 'Upstream Album',
+            'date': '2025'
+        }
+        self.status_code = 200
+        self.calls = []
+
+    def get(self, url, timeout=None):
+        self.calls.append(url)
+        return FakeUpstreamResponse(dict(self.document), self.status_code)
+
+
+class FakeUpstreamResponse:
+    """Minimal requests.Response replacement."""
+
+    def __init__(self, document, status_code):
+        self._document = document
+        self.status_code = status_code
+
+    def json(self):
+        return self._document
+
+
+@pytest.fixture
+def upstream_metadata(monkeypatch):
+    """Serve a fake metadatav2.json document instead of calling the CDN."""
+    import requests
+    import app as app_module
+
+    upstream = FakeUpstream()
+    monkeypatch.setattr(requests, 'get', upstream.get)
+    # Start every test from a clean now-playing state
+    monkeypatch.setattr(app_module, '_now_playing', {
+        'data': None,
+        'track': None,
+        'payload': b'null',
+        'updated_at': 0.0
+    })
+    monkeypatch.setattr(app_module, '_history_cache', {})
+    monkeypatch.setattr(app_module, '_track_timing', {
+        'key': None,
+        'started_at': None,
+        'full_track': False,
+        'average': float(app_module.DEFAULT_TRACK_SECONDS)
+    })
+    return upstream
@@ -0,0 +1,231 @@
+"""
+Tests for the album-art proxy: one upstream fetch per album, resized
+WebP/JPEG variants, long-lived caching headers and the byte-bounded LRU.
+"""
+
+import io
+import os
+import pytest
+import requests
+from PIL import Image
+
+import app as app_module
+
+
+def make_cover(color=(200, 40, 40), size=(600, 400)):
+    output = io.BytesIO()
+    Image.new('RGB', size, color).save(output, 'JPEG')
+    return output.getvalue()
+
+
+class FakeArtResponse:
+    def __init__(self, content, status_code=200, content_type='image/jpeg'):
+        self.content = content
+        self.status_code = status_code
+        self.headers = {'Content-Type': content_type}
+        self.chunks_read = 0
+        self.closed = False
+
+    def iter_content(self, chunk_size=1):
+        for start in range(0, len(self.content), chunk_size):
+            self.chunks_read += 1
+            yield self.content[start:start + chunk_size]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.closed = True
+
+
+class FakeArtSource:
+    """Stand-in for the cover CDN: serves one cover and counts fetches."""
+
+    def __init__(self):
+        self.cover = make_cover()
+        self.status_code = 200
+        self.content_type = 'image/jpeg'
+        self.calls = []
+        self.responses = []
+
+    def get(self, url, params=None, timeout=None, stream=False):
+        assert stream
+        self.calls.append(params)
+        self.responses.append(FakeArtResponse(self.cover, self.status_code, self.content_type))
+        return self.responses[-1]
+
+
+@pytest.fixture
+def art_source(monkeypatch):
+    source = FakeArtSource()
+    monkeypatch.setattr(requests, 'get', source.get)
+    monkeypatch.setattr(app_module, '_now_playing', dict(app_module._now_playing))
+    return source
+
+
+def play_album(album, artist='Artist', title='Song'):
+    app_module._now_playing['track'] = {'title': title, 'artist': artist, 'album': album}
+
+
+class TestAlbumArt:
+    """Tests for /api/art."""
+
+    def test_fetches_source_once_per_album(self, client, art_source):
+        """All sizes and formats of an album come from a single upstream fetch."""
+        play_album('Album A')
+        for size in (120, 240):
+            for file_format in ('webp', 'jpeg'):
+                response = client.get(f'/api/art?artist=Artist&album=Album A&size={size}&format={file_format}')
+                assert response.status_code == 200
+        client.get('/api/art?artist=Artist&album=Album A&size=120&format=webp')
+
+        assert art_source.calls == [{'v': app_module.art_key((app_module.DEFAULT_STATION, 'Artist', 'Album A'))}]
+
+    def test_resizes_to_requested_size(self, client, art_source):
+        """Variants are square and match the requested size."""
+        play_album('Album A')
+        for size in (120, 240):
+            response = client.get(f'/api/art?artist=Artist&album=Album A&size={size}&format=jpeg')
+            with Image.open(io.BytesIO(response.data)) as image:
+                assert image.size == (size, size)
+                assert image.format == 'JPEG'
+
+    def test_negotiates_webp_from_accept(self, client, art_source):
+        """Without ?format= the Accept header picks WebP or JPEG, and responses vary on it."""
+        play_album('Album A')
+        webp = client.get('/api/art?artist=Artist&album=Album A', headers={'Accept': 'image/avif,image/webp,*/*'})
+        jpeg = client.get('/api/art?artist=Artist&album=Album A', headers={'Accept': 'image/png,*/*'})
+
+        assert webp.mimetype == 'image/webp'
+        assert jpeg.mimetype == 'image/jpeg'
+        assert 'Accept' in webp.headers['Vary']
+
+        explicit = client.get('/api/art?artist=Artist&album=Album A&format=webp')
+        assert 'Vary' not in explicit.headers
+
+    def test_immutable_caching_and_etag(self, client, art_source):
+        """Album URLs are immutable and revalidate with a strong ETag."""
+        play_album('Album A')
+        response = client.get('/api/art?artist=Artist&album=Album A&format=webp')
+        etag = response.headers['ETag']
+
+        assert 'immutable' in response.headers['Cache-Control']
+        assert not etag.startswith('W/')
+
+        revalidated = client.get('/api/art?artist=Artist&album=Album A&format=webp', headers={'If-None-Match': etag})
+        assert revalidated.status_code == 304
+        assert revalidated.data == b''
+
+    def test_current_album_url_is_not_immutable(self, client, art_source):
+        """Without ?album= the response follows the current track, so it must not be cached long."""
+        play_album('Album A')
+        response = client.get('/api/art?format=jpeg')
+
+        assert response.status_code == 200
+        assert response.headers['Cache-Control'] == 'no-cache'
+
+    def test_album_not_on_air_is_404(self, client, art_source):
+        """An uncached album can't be fetched once something else is playing."""
+        play_album('Album B')
+        response = client.get('/api/art?artist=Artist&album=Album A')
+
+        assert response.status_code == 404
+        assert art_source.calls == []
+
+    def test_cached_album_served_after_it_leaves_air(self, client, art_source):
+        """Once fetched, a cover outlives its time on air."""
+        play_album('Album A')
+        client.get('/api/art?artist=Artist&album=Album A&size=120&format=jpeg')
+        play_album('Album B')
+
+        response = client.get('/api/art?artist=Artist&album=Album A&size=240&format=webp')
+        assert response.status_code == 200
+        assert len(art_source.calls) == 1
+
+    def test_same_album_name_by_other_artist(self, client, art_source):
+        """Albums are told apart by artist, so one artist's cover is never served for another's."""
+        play_album('Greatest Hits', artist='Artist One')
+        first = client.get('/api/art?artist=Artist One&album=Greatest Hits&format=jpeg')
+        art_source.cover = make_cover(color=(40, 40, 200))
+        play_album('Greatest Hits', artist='Artist Two')
+        second = client.get('/api/art?artist=Artist Two&album=Greatest Hits&format=jpeg')
+
+        assert first.status_code == second.status_code == 200
+        assert first.data != second.data
+        assert len(art_source.calls) == 2
+        assert client.get('/api/art?artist=Artist One&album=Greatest Hits&format=jpeg').data == first.data
+
+    def test_track_without_album(self, client, art_source):
+        """A track with no album has its cover keyed on its title, and an empty album means the current cover."""
+        play_album('', title='Jingle')
+        by_title = client.get('/api/art?artist=Artist&title=Jingle&format=jpeg')
+        empty_album = client.get('/api/art?artist=Artist&album=&format=jpeg')
+
+        assert by_title.status_code == 200
+        assert 'immutable' in by_title.headers['Cache-Control']
+        assert empty_album.status_code == 200
+        assert empty_album.headers['Cache-Control'] == 'no-cache'
+        assert len(art_source.calls) == 1
+
+        play_album('', title='Station ID')
+        assert client.get('/api/art?artist=Artist&title=Station ID&format=jpeg').status_code == 200
+        assert len(art_source.calls) == 2
+
+    def test_rejects_non_image_source(self, client, art_source):
+        """An error page from upstream is not cached as a cover."""
+        art_source.content_type = 'text/html'
+        play_album('Album A')
+
+        assert client.get('/api/art?artist=Artist&album=Album A').status_code == 404
+        assert not os.path.exists(app_module.art_cache_path((app_module.DEFAULT_STATION, 'Artist', 'Album A'), 'src'))
+
+    def test_stops_reading_oversized_source(self, client, art_source, monkeypatch):
+        """A source over the size limit is abandoned mid-stream, not buffered whole."""
+        monkeypatch.setattr(app_module, 'ART_MAX_SOURCE_BYTES', 100000)
+        art_source.cover = os.urandom(1024 * 1024)
+        play_album('Album A')
+
+        assert client.get('/api/art?artist=Artist&album=Album A').status_code == 404
+        response = art_source.responses[0]
+        assert response.chunks_read == 2  # 128 KiB of the 1 MiB body
+        assert response.closed
+        assert not os.path.exists(app_module.art_cache_path((app_module.DEFAULT_STATION, 'Artist', 'Album A'), 'src'))
+
+    def test_rejects_declared_oversized_source(self, client, art_source, monkeypatch):
+        """A Content-Length over the limit is refused before reading the body."""
+        monkeypatch.setattr(app_module, 'ART_MAX_SOURCE_BYTES', 100)
+        original_get = art_source.get
+
+        def get(url, **kwargs):
+            response = original_get(url, **kwargs)
+            response.headers['Content-Length'] = str(len(response.content))
+            return response
+        monkeypatch.setattr(requests, 'get', get)
+        play_album('Album A')
+
+        assert client.get('/api/art?artist=Artist&album=Album A').status_code == 404
+        assert art_source.responses[0].chunks_read == 0
+
+    def test_invalid_size_and_format(self, client, art_source):
+        """Only the display sizes and known formats are generated."""
+        play_album('Album A')
+        assert client.get('/api/art?artist=Artist&album=Album A&size=5000').status_code == 400
+        assert client.get('/api/art?artist=Artist&album=Album A&format=gif').status_code == 400
+        assert art_source.calls == []
+
+    def test_evicts_least_recently_used(self, client, art_source, monkeypatch):
+        """The cache stays under its byte limit, dropping the least recently used files first."""
+        play_album('Album A')
+        client.get('/api/art?artist=Artist&album=Album A&size=120&format=jpeg')
+        a_files = {entry.name for entry in os.scandir(app_module.ART_CACHE_DIR)}
+        for entry in os.scandir(app_module.ART_CACHE_DIR):
+            os.utime(entry.path, (1, 1))  # long unused
+
+        monkeypatch.setattr(app_module, 'ART_CACHE_MAX_BYTES', len(art_source.cover) * 2)
+        play_album('Album B')
+        client.get('/api/art?artist=Artist&album=Album B&size=120&format=jpeg')
+
+        remaining = {entry.name for entry in os.scandir(app_module.ART_CACHE_DIR)}
+        total = sum(entry.stat().st_size for entry in os.scandir(app_module.ART_CACHE_DIR))
+        assert not remaining & a_files
+        assert total <= app_module.ART_CACHE_MAX_BYTES
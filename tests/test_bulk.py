@@ -0,0 +1,141 @@
+"""
+Tests for the export-data / import-data CLI commands.
+"""
+
+import pytest
+import app as app_module
+from app import get_db_connection, export_table, import_table, bulk_format
+
+
+@pytest.fixture
+def seeded(test_app):
+    conn = get_db_connection()
+    conn.executemany(
+        "INSERT INTO songs (title, artist, album, year) VALUES (?, ?, ?, ?)",
+        [(f'Bulk Song {i}', 'Bulk Artist', 'Album, "Quoted"', '2025') for i in range(30)]
+    )
+    conn.executemany(
+        "INSERT INTO ratings (song_id, user_id, rating, created_at) VALUES (?, ?, ?, ?)",
+        [(i % 30 + 1, f'user{i}', 1 if i % 3 else -1, '2025-01-02 03:04:05') for i in range(120)]
+    )
+    conn.commit()
+    conn.close()
+
+
+def snapshot(table):
+    conn = get_db_connection()
+    rows = [tuple(row) for row in conn.execute(f"SELECT * FROM {table} ORDER BY id").fetchall()]
+    conn.close()
+    return rows
+
+
+def empty_tables():
+    conn = get_db_connection()
+    conn.execute("DELETE FROM ratings")
+    conn.execute("DELETE FROM songs")
+    conn.commit()
+    conn.close()
+
+
+class TestBulkRoundTrip:
+    """Tests that exports load back unchanged."""
+
+    @pytest.mark.parametrize('extension', ['csv', 'ndjson', 'parquet'])
+    def test_round_trip(self, seeded, tmp_path, monkeypatch, extension):
+        """Test songs and ratings survive an export/import cycle, ids included."""
+        if extension == 'parquet':
+            pytest.importorskip('pyarrow')
+        monkeypatch.setattr(app_module, 'BULK_BATCH_SIZE', 7)
+        songs, ratings = snapshot('songs'), snapshot('ratings')
+
+        for table in ('songs', 'ratings'):
+            conn = get_db_connection()
+            path = str(tmp_path / f'{table}.{extension}')
+            assert export_table(conn, table, path, bulk_format(path)) == len(snapshot(table))
+            conn.close()
+
+        empty_tables()
+        for table in ('songs', 'ratings'):
+            conn = get_db_connection()
+            path = str(tmp_path / f'{table}.{extension}')
+            import_table(conn, table, path, bulk_format(path))
+            conn.close()
+
+        assert snapshot('songs') == songs
+        assert snapshot('ratings') == ratings
+
+    def test_cli_commands(self, seeded, runner, tmp_path):
+        """Test the flask CLI wiring and the derived-table hint."""
+        path = str(tmp_path / 'ratings.jsonl')
+        result = runner.invoke(args=['export-data', 'ratings', path])
+        assert result.exit_code == 0, result.output
+
+        conn = get_db_connection()
+        conn.execute("DELETE FROM ratings")
+        conn.commit()
+        conn.close()
+
+        result = runner.invoke(args=['import-data', 'ratings', path])
+        assert result.exit_code == 0, result.output
+        assert 'rebuild-charts' in result.output
+        assert len(snapshot('ratings')) == 120
+
+
+class TestBulkImport:
+    """Tests for import safeguards."""
+
+    def test_refuses_non_empty_table(self, seeded, runner, tmp_path):
+        """Test that import never merges into existing rows."""
+        path = str(tmp_path / 'songs.csv')
+        runner.invoke(args=['export-data', 'songs', path])
+
+        result = runner.invoke(args=['import-data', 'songs', path])
+
+        assert result.exit_code != 0
+        assert 'empty table' in result.output
+
+    def test_failed_import_leaves_table_empty(self, seeded, runner, tmp_path, monkeypatch):
+        """Test that batches committed before a bad row are removed, so a rerun works."""
+        monkeypatch.setattr(app_module, 'BULK_BATCH_SIZE', 7)
+        path = tmp_path / 'ratings.csv'
+        runner.invoke(args=['export-data', 'ratings', str(path)])
+        lines = path.read_text().splitlines(keepends=True)
+        good = ''.join(lines)
+        lines[50] = 'not-an-id' + lines[50][lines[50].index(','):]
+        path.write_text(''.join(lines))
+        conn = get_db_connection()
+        conn.execute("DELETE FROM ratings")
+        conn.commit()
+
+        with pytest.raises(ValueError):
+            import_table(conn, 'ratings', str(path), 'csv')
+        assert snapshot('ratings') == []
+
+        path.write_text(good)
+        import_table(conn, 'ratings', str(path), 'csv')
+        conn.close()
+        assert len(snapshot('ratings')) == 120
+
+    def test_secondary_indexes_restored(self, seeded, tmp_path):
+        """Test that indexes dropped for the load are rebuilt afterwards."""
+        conn = get_db_connection()
+        conn.execute("CREATE INDEX idx_songs_album ON songs(album)")
+        conn.commit()
+        path = str(tmp_path / 'songs.csv')
+        export_table(conn, 'songs', path, 'csv')
+        conn.execute("DELETE FROM ratings")
+        conn.execute("DELETE FROM songs")
+        conn.commit()
+        import_table(conn, 'songs', path, 'csv')
+        names = {row['name'] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'songs'")}
+        conn.close()
+
+        assert 'idx_songs_album' in names
+
+    def test_unknown_extension(self):
+        """Test that an unrecognized extension asks for --format."""
+        import click
+        with pytest.raises(click.UsageError):
+            bulk_format('dump.bin')
+        assert bulk_format('dump.bin', 'csv') == 'csv'
@@ -0,0 +1,142 @@
+"""
+Tests for precomputed top-rated charts.
+"""
+
+import pytest
+import json
+from datetime import datetime
+import app as app_module
+from app import get_db_connection, rebuild_charts, wilson_lower_bound, chart_periods
+
+
+def vote(client, title, rating, user_agent):
+    """Cast a vote as a distinct listener (identity comes from the User-Agent)."""
+    response = client.post('/api/songs/rating',
+                           json={'title': title, 'artist': 'Chart Artist', 'rating': rating},
+                           headers={'User-Agent': user_agent})
+    assert response.status_code == 200
+
+
+class TestWilsonScore:
+    """Tests for the ranking function."""
+
+    def test_no_votes(self):
+        """Test that an unrated song scores zero."""
+        assert wilson_lower_bound(0, 0) == 0.0
+
+    def test_more_evidence_ranks_higher(self):
+        """Test that 50/50 positive beats a single positive vote."""
+        assert wilson_lower_bound(50, 0) > wilson_lower_bound(1, 0)
+        assert wilson_lower_bound(90, 10) > wilson_lower_bound(9, 1)
+
+    def test_known_value(self):
+        """Test against a reference value."""
+        assert wilson_lower_bound(8, 2) == pytest.approx(0.4902, abs=1e-4)
+
+
+class TestChartPeriods:
+    """Tests for chart period keys."""
+
+    def test_iso_week_and_day(self):
+        """Test that weeks follow ISO numbering across a year boundary."""
+        periods = chart_periods(datetime(2027, 1, 1, 12, 0))
+        assert periods == {'all': 'all', 'week': 'week:2026-W53', 'day': 'day:2027-01-01'}
+
+
+class TestChartsAPI:
+    """Tests for the /api/charts endpoint."""
+
+    def test_empty_charts(self, client):
+        """Test charts before any votes."""
+        response = client.get('/api/charts')
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert data['window'] == 'week'
+        assert data['songs'] == []
+
+    def test_invalid_window(self, client):
+        """Test that unknown windows are rejected."""
+        response = client.get('/api/charts?window=year')
+        assert response.status_code == 400
+
+    def test_ranked_by_wilson_score(self, client):
+        """Test that charts order songs by Wilson lower bound."""
+        for i in range(5):
+            vote(client, 'Crowd Favourite', 1, f'listener-{i}')
+        vote(client, 'One Hit', 1, 'listener-0')
+        vote(client, 'Divisive', 1, 'listener-0')
+        vote(client, 'Divisive', -1, 'listener-1')
+
+        for window in ('all', 'week', 'day'):
+            data = json.loads(client.get(f'/api/charts?window={window}').data)
+            assert [song['title'] for song in data['songs']] == ['Crowd Favourite', 'One Hit', 'Divisive']
+            assert data['songs'][0]['thumbs_up'] == 5
+
+    def test_changed_vote_moves_counts(self, client):
+        """Test that switching a vote updates counts instead of adding one."""
+        vote(client, 'Flip Song', 1, 'flipper')
+        vote(client, 'Flip Song', -1, 'flipper')
+        vote(client, 'Flip Song', -1, 'flipper')
+
+        data = json.loads(client.get('/api/charts?window=all').data)
+        assert data['songs'][0]['thumbs_up'] == 0
+        assert data['songs'][0]['thumbs_down'] == 1
+
+    def test_vote_invalidates_cached_chart(self, client):
+        """Test that a vote in this worker is visible on the next request."""
+        vote(client, 'First Song', 1, 'listener-a')
+        assert len(json.loads(client.get('/api/charts').data)['songs']) == 1
+
+        vote(client, 'Second Song', 1, 'listener-a')
+        assert len(json.loads(client.get('/api/charts').data)['songs']) == 2
+
+    def test_chart_read_during_vote_not_cached(self, client, monkeypatch):
+        """Test that a chart served while a vote is uncommitted is not kept after it commits."""
+        real_apply = app_module.apply_chart_delta
+
+        def apply_then_read(*args):
+            real_apply(*args)
+            # Another request reads (and caches) the chart before the vote commits
+            assert client.get('/api/charts').get_json()['songs'] == []
+
+        monkeypatch.setattr(app_module, 'apply_chart_delta', apply_then_read)
+        vote(client, 'First Song', 1, 'listener-a')
+
+        assert len(client.get('/api/charts').get_json()['songs']) == 1
+
+    def test_limit(self, client):
+        """Test that limit caps the number of songs."""
+        for i in range(3):
+            vote(client, f'Song {i}', 1, 'listener-a')
+        data = json.loads(client.get('/api/charts?limit=2').data)
+        assert len(data['songs']) == 2
+
+
+class TestRebuildCharts:
+    """Tests for recomputing charts from the ratings table."""
+
+    def test_rebuild_matches_incremental(self, client):
+        """Test that a rebuild reproduces the incrementally maintained scores."""
+        vote(client, 'Song A', 1, 'u1')
+        vote(client, 'Song A', -1, 'u2')
+        vote(client, 'Song B', 1, 'u1')
+        vote(client, 'Song B', -1, 'u1')
+
+        conn = get_db_connection()
+        before = [tuple(row) for row in conn.execute(
+            "SELECT period, song_id, thumbs_up, thumbs_down, score FROM chart_scores ORDER BY period, song_id"
+        ).fetchall()]
+        rebuild_charts(conn)
+        after = [tuple(row) for row in conn.execute(
+            "SELECT period, song_id, thumbs_up, thumbs_down, score FROM chart_scores ORDER BY period, song_id"
+        ).fetchall()]
+        conn.close()
+
+        assert after == before
+
+    def test_rebuild_command(self, client, runner):
+        """Test the rebuild-charts CLI command."""
+        vote(client, 'CLI Song', 1, 'u1')
+        result = runner.invoke(args=['rebuild-charts'])
+        assert result.exit_code == 0
+        assert 'Rebuilt 3 chart entries' in result.output
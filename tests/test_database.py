@@ -50,6 +50,16 @@ class TestDatabaseSchema:
         expected_columns = {'id', 'song_id', 'user_id', 'rating', 'created_at'}
         assert expected_columns.issubset(columns)
 
+    def test_plays_table_schema(self, test_app):
+        """Test that the plays table and its started_at index exist."""
+        conn = get_db_connection()
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(plays)").fetchall()}
+        indexes = {row[1] for row in conn.execute("PRAGMA index_list(plays)").fetchall()}
+        conn.close()
+
+        assert {'id', 'song_id', 'started_at'}.issubset(columns)
+        assert 'idx_plays_started_at' in indexes
+
 
 class TestDatabaseConstraints:
     """Tests for database constraints and data integrity."""
@@ -0,0 +1,153 @@
+"""
+Tests for server-side play history.
+"""
+
+import pytest
+import json
+import threading
+import time
+from app import get_db_connection
+
+
+def insert_plays(count):
+    """Insert count plays of distinct songs, oldest first, one minute apart."""
+    conn = get_db_connection()
+    for i in range(count):
+        conn.execute(
+            "INSERT INTO songs (title, artist, album, year) VALUES (?, ?, ?, ?)",
+            (f'Song {i}', 'History Artist', 'Album', '2025')
+        )
+        song_id = conn.execute("SELECT id FROM songs WHERE title = ?", (f'Song {i}',)).fetchone()[0]
+        conn.execute(
+            "INSERT INTO plays (song_id, started_at) VALUES (?, datetime('2025-01-01 00:00:00', ?))",
+            (song_id, f'+{i} minutes')
+        )
+    conn.commit()
+    conn.close()
+
+
+class TestPlayRecording:
+    """Tests for recording track changes from the metadata poller."""
+
+    def test_track_change_records_play(self, client, upstream_metadata):
+        """Test that a new track creates a song and a play row."""
+        client.get('/api/metadata')
+
+        conn = get_db_connection()
+        plays = conn.execute(
+            "SELECT songs.title FROM plays JOIN songs ON songs.id = plays.song_id"
+        ).fetchall()
+        conn.close()
+        assert [row['title'] for row in plays] == ['Upstream Song']
+
+    def test_same_track_recorded_once(self, client, upstream_metadata):
+        """Test that repeated polls of one track add a single play."""
+        client.get('/api/metadata')
+        upstream_metadata.document['bit_depth'] = 24  # document changes, track does not
+        client.get('/api/metadata')
+
+        conn = get_db_connection()
+        count = conn.execute("SELECT COUNT(*) FROM plays").fetchone()[0]
+        conn.close()
+        assert count == 1
+
+    def test_other_worker_already_recorded(self, client, upstream_metadata):
+        """Test that a play already recorded by another worker is not duplicated."""
+        client.get('/api/metadata')
+
+        # A fresh worker sees the same track as "new"
+        import app as app_module
+        app_module._now_playing.update({'data': None, 'track': None})
+        client.get('/api/metadata')
+
+        conn = get_db_connection()
+        count = conn.execute("SELECT COUNT(*) FROM plays").fetchone()[0]
+        conn.close()
+        assert count == 1
+
+    def test_concurrent_workers_record_once(self, test_app):
+        """Test that a worker racing another's uncommitted insert waits and skips."""
+        import app as app_module
+        track = {'title': 'Race Song', 'artist': 'Race Artist', 'album': '', 'year': ''}
+        other = get_db_connection()
+        song_id = app_module.get_or_create_song_id(other, track['title'], track['artist'])
+        # The other worker has inserted its play but not committed yet
+        other.execute('BEGIN IMMEDIATE')
+        other.execute('INSERT INTO plays (song_id) VALUES (?)', (song_id,))
+
+        worker = threading.Thread(target=app_module.record_play, args=(track,))
+        worker.start()
+        time.sleep(0.2)
+        other.commit()
+        other.close()
+        worker.join()
+
+        conn = get_db_connection()
+        count = conn.execute("SELECT COUNT(*) FROM plays").fetchone()[0]
+        conn.close()
+        assert count == 1
+
+    def test_each_change_recorded(self, client, upstream_metadata):
+        """Test that alternating tracks each get a play row."""
+        client.get('/api/metadata')
+        upstream_metadata.document['title'] = 'Second Song'
+        client.get('/api/metadata')
+
+        data = json.loads(client.get('/api/history').data)
+        assert [play['title'] for play in data['plays']] == ['Second Song', 'Upstream Song']
+
+
+class TestHistoryAPI:
+    """Tests for the /api/history endpoint."""
+
+    def test_empty_history(self, client, upstream_metadata):
+        """Test history before anything has played."""
+        response = client.get('/api/history')
+        assert response.status_code == 200
+        assert json.loads(response.data) == {'plays': [], 'next_before': None}
+
+    def test_history_newest_first(self, client, upstream_metadata):
+        """Test ordering and fields of history entries."""
+        insert_plays(3)
+        data = json.loads(client.get('/api/history').data)
+
+        assert [play['title'] for play in data['plays']] == ['Song 2', 'Song 1', 'Song 0']
+        assert data['plays'][0]['started_at'] == '2025-01-01T00:02:00Z'
+        assert data['next_before'] is None
+
+    def test_keyset_pagination(self, client, upstream_metadata):
+        """Test walking the full history page by page."""
+        insert_plays(7)
+
+        titles = []
+        before = None
+        while True:
+            url = '/api/history?limit=3' + (f'&before={before}' if before else '')
+            data = json.loads(client.get(url).data)
+            titles.extend(play['title'] for play in data['plays'])
+            before = data['next_before']
+            if before is None:
+                break
+
+        assert titles == [f'Song {i}' for i in range(6, -1, -1)]
+
+    def test_limit_is_clamped(self, client, upstream_metadata):
+        """Test that page size is bounded."""
+        insert_plays(2)
+        data = json.loads(client.get('/api/history?limit=0').data)
+        assert len(data['plays']) == 1
+
+    def test_first_page_cached_until_new_play(self, client, upstream_metadata):
+        """Test that the first page is cached and invalidated by a new play."""
+        insert_plays(1)
+        first = json.loads(client.get('/api/history').data)
+
+        conn = get_db_connection()
+        conn.execute("DELETE FROM plays")
+        conn.commit()
+        conn.close()
+        assert json.loads(client.get('/api/history').data) == first
+
+        client.get('/api/metadata')
+        data = json.loads(client.get('/api/history').data)
+        assert [play['title'] for play in data['plays']] == ['Upstream Song']
@@ -0,0 +1,188 @@
+"""
+Tests for the HLS relay against a local fake origin: one upstream fetch
+per segment and playlist refresh however many listeners, playlist URI
+rewriting, caching headers and origin failures.
+"""
+
+import collections
+import http.server
+import threading
+
+import pytest
+
+import app as app_module
+
+
+class FakeHLSOrigin(http.server.ThreadingHTTPServer):
+    """A live stream on localhost: one media playlist and its segments, with per-path request counts."""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), FakeHLSHandler)
+        self.base = f'http://127.0.0.1:{self.server_address[1]}/hls/'
+        self.segments = {f'seg{n}.ts': bytes([n]) * 4096 for n in range(100, 103)}
+        self.segments['audio/seg103.aac'] = b'\xff\xf1' * 1024
+        self.playlist_status = 200
+        self.delay = threading.Event()  # set() to hold requests until released
+        self.release = threading.Event()
+        self.counts = collections.Counter()
+        self.lock = threading.Lock()
+
+    def playlist(self):
+        return ('#EXTM3U\n#EXT-X-VERSION:3\n#EXT-X-TARGETDURATION:6\n#EXT-X-MEDIA-SEQUENCE:100\n'
+                '#EXTINF:6.0,\nseg100.ts\n#EXTINF:6.0,\nseg101.ts\n#EXTINF:6.0,\nseg102.ts\n'
+                f'#EXTINF:6.0,\n{self.base}audio/seg103.aac\n').encode()
+
+
+class FakeHLSHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        origin = self.server
+        path = self.path[len('/hls/'):]
+        with origin.lock:
+            origin.counts[path] += 1
+        if origin.delay.is_set():
+            origin.release.wait(5)
+        if path == 'live.m3u8' and origin.playlist_status == 200:
+            self.reply(200, origin.playlist(), 'application/vnd.apple.mpegurl')
+        elif path == 'live.m3u8':
+            self.reply(origin.playlist_status, b'error', 'text/plain')
+        elif path in origin.segments:
+            self.reply(200, origin.segments[path], 'video/MP2T')
+        else:
+            self.reply(404, b'not found', 'text/plain')
+
+    def reply(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def hls_origin(test_app, monkeypatch):
+    origin = FakeHLSOrigin()
+    thread = threading.Thread(target=origin.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    monkeypatch.setattr(app_module, 'HLS_RELAY', True)
+    monkeypatch.setattr(app_module, 'HLS_PLAYLIST_TTL', 5)
+    monkeypatch.setattr(app_module, 'STATIONS', {'main': {
+        'id': 'main', 'name': 'NeoRadio', 'stream_url': origin.base + 'live.m3u8',
+        'metadata_url': 'http://127.0.0.1:9/metadatav2.json', 'art_url': None}})
+    monkeypatch.setattr(app_module, 'DEFAULT_STATION', 'main')
+    monkeypatch.setattr(app_module, '_hls_playlists', {})
+    monkeypatch.setattr(app_module, '_hls_segments', collections.OrderedDict())
+    monkeypatch.setattr(app_module, '_hls', {'lock': threading.Lock(), 'in_flight': {}, 'segment_bytes': 0})
+    yield origin
+    origin.release.set()
+    origin.shutdown()
+    origin.server_close()
+
+
+def listen(test_app, results):
+    """One listener: load the playlist, then every segment it lists"""
+    client = test_app.test_client()
+    playlist = client.get('/hls/main/live.m3u8')
+    results.append((playlist.status_code, playlist.data))
+    for line in playlist.data.decode().splitlines():
+        if line and not line.startswith('#'):
+            segment = client.get(line if line.startswith('/') else f'/hls/main/{line}')
+            results.append((segment.status_code, segment.data))
+
+
+class TestHLSRelay:
+    """Tests for /hls/<station>/<path>."""
+
+    @pytest.mark.parametrize('listeners', [1, 10, 50])
+    def test_one_upstream_fetch_per_segment(self, test_app, hls_origin, listeners):
+        """However many listeners arrive together, the origin serves each file once."""
+        hls_origin.delay.set()  # hold the first fetches so the listeners pile up on them
+        results = []
+        threads = [threading.Thread(target=listen, args=(test_app, results)) for _ in range(listeners)]
+        for thread in threads:
+            thread.start()
+        threading.Timer(0.2, hls_origin.release.set).start()
+        for thread in threads:
+            thread.join(10)
+
+        assert len(results) == listeners * 5
+        assert all(status == 200 for status, _ in results)
+        assert dict(hls_origin.counts) == {'live.m3u8': 1, 'seg100.ts': 1, 'seg101.ts': 1, 'seg102.ts': 1,
+                                           'audio/seg103.aac': 1}
+        segment_bodies = {body for _, body in results if not body.startswith(b'#EXTM3U')}
+        assert segment_bodies == set(hls_origin.segments.values())
+
+    def test_playlist_refreshed_after_ttl(self, client, hls_origin):
+        """The playlist is fetched again once HLS_PLAYLIST_TTL has passed."""
+        client.get('/hls/main/live.m3u8')
+        client.get('/hls/main/live.m3u8')
+        assert hls_origin.counts['live.m3u8'] == 1
+
+        app_module._hls_playlists[('main', 'live.m3u8')]['fetched_at'] -= 5
+        client.get('/hls/main/live.m3u8')
+        assert hls_origin.counts['live.m3u8'] == 2
+
+    def test_absolute_uris_rewritten_to_relay(self, client, hls_origin):
+        """Segment URIs on the origin host are pointed back at the relay."""
+        body = client.get('/hls/main/live.m3u8').data.decode()
+
+        assert hls_origin.base not in body
+        assert '/hls/main/audio/seg103.aac' in body
+        assert '\nseg100.ts\n' in body
+
+    def test_caching_headers(self, client, hls_origin):
+        """Playlists are cacheable for the TTL, segments for a day and immutable."""
+        playlist = client.get('/hls/main/live.m3u8')
+        segment = client.get('/hls/main/seg100.ts')
+
+        assert playlist.headers['Cache-Control'] == 'public, max-age=5'
+        assert playlist.mimetype == 'application/vnd.apple.mpegurl'
+        assert segment.headers['Cache-Control'] == 'public, max-age=86400, immutable'
+        assert segment.mimetype.lower() == 'video/mp2t'
+
+    def test_stale_playlist_while_origin_fails(self, client, hls_origin):
+        """A failing origin gets the last good playlist served, and a 502 with none cached."""
+        good = client.get('/hls/main/live.m3u8').data
+        app_module._hls_playlists[('main', 'live.m3u8')]['fetched_at'] -= 5
+        hls_origin.playlist_status = 503
+
+        assert client.get('/hls/main/live.m3u8').data == good
+
+        app_module._hls_playlists.clear()
+        assert client.get('/hls/main/live.m3u8').status_code == 502
+
+    def test_missing_segment_not_cached(self, client, hls_origin):
+        """A 404 from the origin is passed on and asked again next time."""
+        assert client.get('/hls/main/seg999.ts').status_code == 404
+        assert client.get('/hls/main/seg999.ts').status_code == 404
+        assert hls_origin.counts['seg999.ts'] == 2
+
+    def test_segment_cache_is_bounded(self, client, hls_origin, monkeypatch):
+        """Least recently used segments are dropped past HLS_SEGMENT_CACHE_BYTES."""
+        monkeypatch.setattr(app_module, 'HLS_SEGMENT_CACHE_BYTES', 4096 * 2)
+        for name in ('seg100.ts', 'seg101.ts', 'seg100.ts', 'seg102.ts'):
+            client.get(f'/hls/main/{name}')
+
+        assert [path for _, path in app_module._hls_segments] == ['seg100.ts', 'seg102.ts']
+        assert app_module._hls['segment_bytes'] == 4096 * 2
+
+    @pytest.mark.parametrize('path', ['../secrets.ts', 'live.m3u8/../x.ts', '.hidden.ts', 'live.html'])
+    def test_rejects_other_paths(self, client, hls_origin, path):
+        """Only HLS file types under the station's stream directory are relayed."""
+        assert client.get(f'/hls/main/{path}').status_code == 404
+        assert not hls_origin.counts
+
+    def test_disabled_by_default(self, client, hls_origin, monkeypatch):
+        """Without HLS_RELAY the route does not proxy and the page uses the origin URL."""
+        monkeypatch.setattr(app_module, 'HLS_RELAY', False)
+
+        assert client.get('/hls/main/live.m3u8').status_code == 404
+        assert f'data-stream-url="{hls_origin.base}live.m3u8"' in client.get('/').get_data(as_text=True)
+
+    def test_page_streams_through_relay(self, client, hls_origin):
+        """With the relay on, the player is pointed at /hls/."""
+        assert 'data-stream-url="/hls/main/live.m3u8"' in client.get('/').get_data(as_text=True)
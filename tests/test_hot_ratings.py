@@ -0,0 +1,155 @@
+"""
+Tests for the now-playing rating cache warmed at track changes.
+"""
+
+import threading
+import time
+
+import pytest
+import app as app_module
+from app import get_db_connection, init_db
+
+
+@pytest.fixture
+def query_log(monkeypatch):
+    """Record every execute_query() call."""
+    calls = []
+    real_execute_query = app_module.execute_query
+
+    def recording_execute_query(conn, query, *args, **kwargs):
+        calls.append(query)
+        return real_execute_query(conn, query, *args, **kwargs)
+
+    monkeypatch.setattr(app_module, 'execute_query', recording_execute_query)
+    return calls
+
+
+def add_votes(title, artist, ratings):
+    conn = get_db_connection()
+    song_id = app_module.get_or_create_song_id(conn, title, artist)
+    conn.executemany(
+        "INSERT INTO ratings (song_id, user_id, rating) VALUES (?, ?, ?)",
+        [(song_id, f'voter{i}', rating) for i, rating in enumerate(ratings)]
+    )
+    conn.commit()
+    conn.close()
+
+
+class TestHotRatings:
+    """Tests for warming and serving the hot cache."""
+
+    def test_track_change_warms_cache(self, client, upstream_metadata):
+        """Test that the metadata poll loads the new track's votes."""
+        add_votes('Upstream Song', 'Upstream Artist', [1, 1, -1])
+
+        client.get('/api/metadata')
+
+        assert app_module._hot_ratings['key'] == ('Upstream Song', 'Upstream Artist')
+        assert app_module._hot_ratings['thumbs_up'] == 2
+        assert app_module._hot_ratings['thumbs_down'] == 1
+
+    def test_reads_served_from_memory(self, client, upstream_metadata, query_log):
+        """Test that rating reads for the current track make no queries."""
+        add_votes('Upstream Song', 'Upstream Artist', [1, -1])
+        client.get('/api/metadata')
+        query_log.clear()
+
+        for _ in range(20):
+            data = client.get('/api/songs/rating/Upstream%20Song/Upstream%20Artist').get_json()
+
+        assert query_log == []
+        assert data == {'thumbs_up': 1, 'thumbs_down': 1, 'user_rating': None}
+
+    def test_vote_updates_cache_in_place(self, client, upstream_metadata, query_log):
+        """Test that a vote adjusts the cached totals and the voter's own rating."""
+        add_votes('Upstream Song', 'Upstream Artist', [1])
+        client.get('/api/metadata')
+        vote = {'title': 'Upstream Song', 'artist': 'Upstream Artist', 'rating': -1}
+
+        assert client.post('/api/songs/rating', json=vote).get_json()['thumbs_down'] == 1
+        vote['rating'] = 1
+        assert client.post('/api/songs/rating', json=vote).get_json()['thumbs_up'] == 2
+        query_log.clear()
+
+        data = client.get('/api/songs/rating/Upstream%20Song/Upstream%20Artist').get_json()
+
+        assert data == {'thumbs_up': 2, 'thumbs_down': 0, 'user_rating': 1}
+        assert query_log == []
+
+    def test_reload_picks_up_other_workers(self, client, upstream_metadata, monkeypatch):
+        """Test that the cache reloads after its TTL to include votes made elsewhere."""
+        client.get('/api/metadata')
+        add_votes('Upstream Song', 'Upstream Artist', [1, 1])
+        url = '/api/songs/rating/Upstream%20Song/Upstream%20Artist'
+        assert client.get(url).get_json()['thumbs_up'] == 0
+
+        now = app_module.time.time()
+        monkeypatch.setattr(app_module.time, 'time', lambda: now + app_module.HOT_RATINGS_TTL)
+
+        assert client.get(url).get_json()['thumbs_up'] == 2
+
+    def test_reload_ignores_lagging_replica(self, client, upstream_metadata, monkeypatch, tmp_path):
+        """Test that reloads read the primary, so a replica behind it cannot drop committed votes."""
+        replica = str(tmp_path / 'replica.db')
+        primary, app_module.DATABASE = app_module.DATABASE, replica
+        init_db()  # a replica that has not replayed any votes yet
+        app_module.DATABASE = primary
+        monkeypatch.setattr(app_module, 'DATABASE_REPLICA_URLS', [replica])
+        monkeypatch.setattr(app_module, '_replica_rotation', [0])
+        add_votes('Upstream Song', 'Upstream Artist', [])
+        client.get('/api/metadata')
+        client.post('/api/songs/rating', json={'title': 'Upstream Song', 'artist': 'Upstream Artist', 'rating': 1})
+
+        now = time.time()
+        monkeypatch.setattr(app_module.time, 'time', lambda: now + app_module.HOT_RATINGS_TTL)
+        listener = app_module.app.test_client()  # no read-your-writes cookie
+
+        data = listener.get('/api/songs/rating/Upstream%20Song/Upstream%20Artist').get_json()
+        assert data['thumbs_up'] == 1
+        with app_module.live_ratings_locked() as table:
+            assert app_module._LIVE_RECORD.unpack_from(table, 0)[1:3] == (1, 0)
+
+    def test_expired_cache_reloaded_once(self, client, upstream_metadata, query_log, monkeypatch):
+        """Test that concurrent readers finding the TTL expired trigger a single reload."""
+        add_votes('Upstream Song', 'Upstream Artist', [1, -1])
+        client.get('/api/metadata')
+        app_module._hot_ratings['loaded_at'] -= app_module.HOT_RATINGS_TTL
+        query_log.clear()
+        real_load = app_module._load_hot_ratings
+
+        def slow_load(*args, **kwargs):
+            time.sleep(0.1)
+            return real_load(*args, **kwargs)
+
+        monkeypatch.setattr(app_module, '_load_hot_ratings', slow_load)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(
+            app_module.hot_rating('Upstream Song', 'Upstream Artist', 'reader'))) for _ in range(32)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len([query for query in query_log if 'SELECT user_id, rating' in query]) == 1
+        assert all(result['thumbs_up'] == 1 and result['thumbs_down'] == 1 for result in results)
+
+    def test_other_songs_use_database(self, client, upstream_metadata):
+        """Test that songs other than the current one are read from the database."""
+        client.get('/api/metadata')
+        add_votes('Older Song', 'Older Artist', [-1])
+
+        data = client.get('/api/songs/rating/Older%20Song/Older%20Artist').get_json()
+
+        assert data['thumbs_down'] == 1
+
+    def test_bootstrap_uses_cache(self, client, upstream_metadata, query_log):
+        """Test that the page render reads the current track's rating from memory."""
+        add_votes('Upstream Song', 'Upstream Artist', [1, 1, 1])
+        client.get('/api/metadata')
+        query_log.clear()
+
+        with app_module.app.test_request_context('/radio'):
+            state = app_module.get_bootstrap_state()
+
+        assert state['rating']['thumbs_up'] == 3
+        assert query_log == []
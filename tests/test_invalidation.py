@@ -0,0 +1,141 @@
+"""
+Tests for the cross-worker cache invalidation bus (SQLite shared-memory
+transport): votes from another worker reach this worker's caches, its own
+messages are skipped, and missed messages cause a full flush.
+"""
+
+import os
+import time
+
+import pytest
+
+import app as app_module
+from app import get_db_connection, get_or_create_song_id
+
+
+def from_other_worker(fn, *args):
+    """Run fn in a forked child, which has its own bus origin like another gunicorn worker"""
+    pid = os.fork()
+    if pid == 0:
+        try:
+            fn(*args)
+        finally:
+            os._exit(0)
+    os.waitpid(pid, 0)
+
+
+def publish(song_id, user_id, rating):
+    app_module.publish_invalidation(None, song_id, user_id, rating)
+
+
+@pytest.fixture
+def hot_song(test_app):
+    """A song with one vote, loaded as the hot song; the bus is caught up"""
+    conn = get_db_connection()
+    song_id = get_or_create_song_id(conn, 'Hot Song', 'Hot Artist')
+    conn.execute('INSERT INTO ratings (song_id, user_id, rating) VALUES (?, ?, 1)', (song_id, 'a' * 32))
+    conn.commit()
+    conn.close()
+    app_module.load_hot_ratings('Hot Song', 'Hot Artist')
+    app_module.apply_invalidations()
+    app_module._invalidation_bus['flushes'] = 0
+    return song_id
+
+
+class TestInvalidationBus:
+    """Tests for applying other workers' votes."""
+
+    def test_other_workers_vote_updates_hot_cache(self, hot_song):
+        """A vote from another worker lands in the hot totals without a reload."""
+        loaded_at = app_module._hot_ratings['loaded_at']
+        from_other_worker(publish, hot_song, 'b' * 32, -1)
+
+        assert app_module.apply_invalidations() == 1
+        assert (app_module._hot_ratings['thumbs_up'], app_module._hot_ratings['thumbs_down']) == (1, 1)
+        assert app_module._hot_ratings['votes']['b' * 32] == -1
+        assert app_module._hot_ratings['loaded_at'] == loaded_at
+
+    def test_changed_vote_is_not_double_counted(self, hot_song):
+        """Applying a listener's later vote replaces their earlier one."""
+        from_other_worker(publish, hot_song, 'b' * 32, 1)
+        from_other_worker(publish, hot_song, 'b' * 32, -1)
+        app_module.apply_invalidations()
+
+        assert (app_module._hot_ratings['thumbs_up'], app_module._hot_ratings['thumbs_down']) == (1, 1)
+
+    def test_drops_listeners_cached_pages(self, client, hot_song):
+        """Another worker's vote drops that listener's cached /api/me/ratings pages."""
+        user_id = 'c' * 32
+        app_module._my_ratings_cache[user_id] = {20: {'body': '{}', 'created_at': time.time()}}
+        app_module._my_ratings_cache['d' * 32] = {20: {'body': '{}', 'created_at': time.time()}}
+        from_other_worker(publish, hot_song, user_id, 1)
+
+        app_module.apply_invalidations()
+        assert list(app_module._my_ratings_cache) == ['d' * 32]
+
+    def test_own_messages_skipped(self, client, hot_song):
+        """A worker's own votes are already in its caches and are not applied twice."""
+        response = client.post('/api/songs/rating', json={'title': 'Hot Song', 'artist': 'Hot Artist', 'rating': 1})
+        assert response.get_json()['thumbs_up'] == 2
+
+        assert app_module.apply_invalidations() == 1
+        assert app_module._invalidation_bus['applied'] == 0
+        assert app_module._hot_ratings['thumbs_up'] == 2
+
+    def test_rate_song_publishes(self, client, hot_song):
+        """Every committed vote is published with its song, listener and rating."""
+        client.post('/api/songs/rating', json={'title': 'Other Song', 'artist': 'Artist', 'rating': -1})
+
+        table = app_module.invalidation_table()
+        generation, = app_module._INVALIDATION_HEADER.unpack_from(table, 0)
+        offset = app_module._INVALIDATION_HEADER.size + (generation % app_module.INVALIDATION_SLOTS) \
+            * app_module._INVALIDATION_SLOT.size
+        _, _, origin, song_id, user_id, rating = app_module._INVALIDATION_SLOT.unpack_from(table, offset)
+
+        assert origin == app_module.invalidation_origin()
+        assert song_id != hot_song
+        assert len(user_id.decode()) == 32
+        assert rating == -1
+
+    def test_overrun_flushes(self, hot_song, monkeypatch):
+        """Falling more than the ring behind flushes instead of applying a partial history."""
+        monkeypatch.setattr(app_module, 'INVALIDATION_SLOTS', 4)
+        app_module.apply_invalidations()
+        app_module._invalidation_bus['flushes'] = 0
+        app_module._my_ratings_cache['c' * 32] = {20: {'body': '{}', 'created_at': time.time()}}
+
+        def burst():
+            for i in range(10):
+                publish(hot_song, f'{i:032x}', 1)
+        from_other_worker(burst)
+
+        assert app_module.apply_invalidations() == 0
+        assert app_module._invalidation_bus['flushes'] == 1
+        assert app_module._hot_ratings['loaded_at'] == 0.0
+        assert not app_module._my_ratings_cache
+
+        # The next read reloads the hot song from the database
+        assert app_module.hot_rating('Hot Song', 'Hot Artist', 'x')['thumbs_up'] == 1
+
+    def test_new_worker_flushes_on_first_check(self, hot_song):
+        """Votes published before this worker started listening are covered by a flush."""
+        app_module._invalidation_bus['pid'] = None  # as after fork
+        app_module.apply_invalidations()
+
+        assert app_module._invalidation_bus['flushes'] == 1
+
+    def test_listener_thread_applies_within_milliseconds(self, client, hot_song):
+        """The bus thread applies another worker's vote quickly and reports the lag."""
+        app_module.ensure_invalidation_listener()
+        from_other_worker(publish, hot_song, 'b' * 32, -1)
+
+        deadline = time.time() + 2
+        while time.time() < deadline and app_module._invalidation_bus['applied'] < 1:
+            time.sleep(0.001)
+
+        stats = client.get('/api/cache/invalidations').get_json()
+        assert stats['transport'] == 'shared-memory'
+        assert stats['listening'] is True
+        assert stats['applied'] == 1
+        assert stats['lag_ms']['max'] < 100
+        assert app_module._hot_ratings['thumbs_down'] == 1
@@ -0,0 +1,126 @@
+"""
+Tests for heartbeats and the HyperLogLog listener estimate.
+"""
+
+import hashlib
+import pytest
+import app as app_module
+from app import record_heartbeat, listener_counts, hll_estimate, hll_position
+
+NOW = 1_700_000_000.0
+
+
+def identity(i):
+    return hashlib.sha256(f'listener-{i}'.encode()).hexdigest()[:32]
+
+
+class TestSketch:
+    """Tests for the sketch primitives."""
+
+    def test_position_in_range(self):
+        """Test that register indexes and ranks fit the sketch."""
+        for i in range(1000):
+            index, rank = hll_position(identity(i))
+            assert 0 <= index < app_module.HLL_REGISTERS
+            assert 1 <= rank <= 64 - app_module.HLL_PRECISION + 1
+
+    def test_empty_sketch(self):
+        """Test that an empty sketch estimates zero."""
+        assert hll_estimate(bytes(app_module.HLL_REGISTERS)) == 0
+
+    @pytest.mark.parametrize('listeners', [1, 100, 5000, 50000])
+    def test_estimate_within_error_bound(self, test_app, listeners):
+        """Test that estimates land within 4 standard errors."""
+        for i in range(listeners):
+            record_heartbeat(identity(i), NOW)
+
+        counts = listener_counts(NOW)
+
+        tolerance = max(1, 4 * app_module.HLL_STANDARD_ERROR * listeners)
+        assert abs(counts['concurrent'] - listeners) <= tolerance
+        assert abs(counts['daily_unique'] - listeners) <= tolerance
+
+    def test_repeat_heartbeats_count_once(self, test_app):
+        """Test that a listener heartbeating every minute is one listener."""
+        for minute in range(10):
+            record_heartbeat(identity(1), NOW + minute * 60)
+
+        assert listener_counts(NOW + 9 * 60)['concurrent'] == 1
+        assert listener_counts(NOW + 9 * 60)['daily_unique'] == 1
+
+
+class TestWindows:
+    """Tests for the concurrent and daily windows."""
+
+    def test_inactive_listeners_age_out(self, test_app):
+        """Test that listeners drop out of 'concurrent' after the active window but stay in daily."""
+        start = NOW - NOW % 86400  # start of a UTC day
+        for i in range(50):
+            record_heartbeat(identity(i), start)
+        record_heartbeat(identity(999), start + 600)
+
+        counts = listener_counts(start + 600)
+
+        assert counts['concurrent'] == 1
+        assert counts['daily_unique'] == 51
+
+    def test_active_window_spans_minutes(self, test_app):
+        """Test that heartbeats from the previous minutes still count as listening now."""
+        start = NOW - NOW % 60
+        record_heartbeat(identity(1), start)
+        record_heartbeat(identity(2), start + 60)
+        record_heartbeat(identity(3), start + 120)
+
+        assert listener_counts(start + 150)['concurrent'] == 3
+
+    def test_recycled_slots_start_empty(self, test_app):
+        """Test that a minute slot reused later does not carry old registers."""
+        start = NOW - NOW % 60
+        for i in range(100):
+            record_heartbeat(identity(i), start)
+        later = start + app_module.LISTENER_MINUTE_SLOTS * 60
+        record_heartbeat(identity(1000), later)
+
+        assert listener_counts(later)['concurrent'] == 1
+
+    def test_new_day_resets_daily(self, test_app):
+        """Test that daily uniques are per UTC day."""
+        start = NOW - NOW % 86400
+        for i in range(10):
+            record_heartbeat(identity(i), start + 86400 - 30)
+        record_heartbeat(identity(1), start + 86400 + 30)
+
+        assert listener_counts(start + 86400 + 30)['daily_unique'] == 1
+
+
+class TestListenerRoutes:
+    """Tests for /api/heartbeat and /api/listeners."""
+
+    def test_heartbeat_counts_identity(self, client):
+        """Test that heartbeats are keyed on the listener identity."""
+        assert client.post('/api/heartbeat').status_code == 204
+        client.post('/api/heartbeat')
+        client.post('/api/heartbeat', headers={'User-Agent': 'Second Browser'})
+
+        data = client.get('/api/listeners').get_json()
+
+        assert data['concurrent'] == 2
+        assert data['daily_unique'] == 2
+        assert data['standard_error'] == pytest.approx(1.04 / 64, abs=1e-4)
+
+    def test_listeners_cached(self, client):
+        """Test that the estimate is served from cache between recomputations."""
+        client.get('/api/listeners')
+        client.post('/api/heartbeat')
+
+        response = client.get('/api/listeners')
+
+        assert response.get_json()['concurrent'] == 0
+        assert response.headers['Cache-Control'] == f'public, max-age={app_module.LISTENERS_CACHE_SECONDS}'
+
+    def test_sketches_shared_between_mappings(self, client):
+        """Test that another worker's mapping of the file sees the same listeners."""
+        client.post('/api/heartbeat')
+        app_module._listener_table['mmap'] = None
+
+        assert listener_counts()['concurrent'] == 1
@@ -0,0 +1,126 @@
+"""
+Tests for the coalesced live rating push channel.
+"""
+
+import json
+import pytest
+import app as app_module
+from app import publish_live_totals, publish_live_delta, check_live_ratings, live_rating_events
+
+
+@pytest.fixture
+def live(test_app, monkeypatch):
+    """Fresh broadcaster state; tests drive check_live_ratings() themselves."""
+    monkeypatch.setattr(app_module, '_live', {
+        'lock': app_module.threading.Lock(),
+        'current': (0, None),
+        'signal': app_module.threading.Event(),
+        'sequence': None,
+        'keys': {},
+        'subscribers': 0,
+        'broadcaster': None
+    })
+    monkeypatch.setattr(app_module, 'ensure_live_broadcaster', lambda: None)
+    conn = app_module.get_db_connection()
+    song_id = app_module.get_or_create_song_id(conn, 'Live Song', 'Live Artist')
+    conn.close()
+    return song_id
+
+
+def event_data(chunk):
+    assert chunk.startswith(b'event: rating\n')
+    return json.loads(chunk.split(b'data: ', 1)[1])
+
+
+class TestLiveRecord:
+    """Tests for the shared totals record and coalescing."""
+
+    def test_votes_coalesce_into_one_event(self, live):
+        """Test that many deltas between checks produce a single event with the final totals."""
+        publish_live_totals(live, 10, 2)
+        for _ in range(100):
+            publish_live_delta(live, 1, 0)
+        publish_live_delta(live, -1, 1)
+
+        assert check_live_ratings() is True
+        assert check_live_ratings() is False
+        version, event = app_module._live['current']
+        assert version == 1
+        assert event_data(event) == {
+            'title': 'Live Song', 'artist': 'Live Artist', 'thumbs_up': 109, 'thumbs_down': 3
+        }
+
+    def test_deltas_for_other_songs_ignored(self, live):
+        """Test that votes on songs other than the live one do not change the record."""
+        publish_live_totals(live, 1, 1)
+        check_live_ratings()
+
+        publish_live_delta(live + 1, 1, 0)
+
+        assert check_live_ratings() is False
+
+    def test_record_shared_between_mappings(self, live):
+        """Test that a delta from another worker's mapping reaches this worker's check."""
+        publish_live_totals(live, 0, 0)
+        app_module._live_table.update(mmap=None, lock_fd=None)
+
+        publish_live_delta(live, 0, 1)
+
+        assert check_live_ratings() is True
+        assert event_data(app_module._live['current'][1])['thumbs_down'] == 1
+
+
+class TestLiveRoutes:
+    """Tests for /api/ratings/live and its feeds."""
+
+    def test_vote_on_live_song_is_pushed(self, client, upstream_metadata, live):
+        """Test that a vote on the now-playing song reaches subscribers."""
+        upstream_metadata.document.update(title='Live Song', artist='Live Artist')
+        client.get('/api/metadata')
+        events = live_rating_events(keepalive=0.01)
+        assert next(events) == b'retry: 5000\n\n'
+
+        client.post('/api/songs/rating', json={'title': 'Live Song', 'artist': 'Live Artist', 'rating': 1})
+        check_live_ratings()
+
+        assert event_data(next(events))['thumbs_up'] == 1
+
+    def test_keepalive_when_idle(self, live):
+        """Test that an idle stream sends comments so proxies keep it open."""
+        events = live_rating_events(keepalive=0.01)
+        next(events)
+        next(events)  # first wait returns immediately: nothing published yet
+
+        assert next(events) == b': keepalive\n\n'
+
+    def test_all_subscribers_share_one_event(self, live):
+        """Test fan-out from a single serialized event."""
+        publish_live_totals(live, 5, 0)
+        streams = [live_rating_events(keepalive=0.01) for _ in range(3)]
+        for stream in streams:
+            next(stream)
+        check_live_ratings()
+
+        chunks = [next(stream) for stream in streams]
+
+        assert chunks[0] is chunks[1] is chunks[2]
+
+    def test_stream_response(self, client, live):
+        """Test the SSE response headers and subscriber accounting."""
+        response = client.get('/api/ratings/live', buffered=False)
+
+        assert response.mimetype == 'text/event-stream'
+        assert response.headers['X-Accel-Buffering'] == 'no'
+        assert app_module._live['subscribers'] == 1
+        response.close()
+        assert app_module._live['subscribers'] == 0
+
+    def test_subscriber_cap(self, client, live, monkeypatch):
+        """Test that a full worker refuses new subscribers with 503."""
+        monkeypatch.setattr(app_module, 'LIVE_MAX_SUBSCRIBERS', 1)
+        first = client.get('/api/ratings/live', buffered=False)
+
+        response = client.get('/api/ratings/live')
+
+        assert response.status_code == 503
+        first.close()
@@ -0,0 +1,113 @@
+"""
+Tests for /api/me/ratings: the caller's own votes, newest first.
+"""
+
+import app as app_module
+from app import get_db_connection, execute_query
+
+
+def vote(client, title, rating=1, user_agent='Listener/1.0'):
+    return client.post('/api/songs/rating', json={'title': title, 'artist': 'Artist', 'rating': rating},
+                       headers={'User-Agent': user_agent})
+
+
+def my_ratings(client, user_agent='Listener/1.0', **params):
+    return client.get('/api/me/ratings', query_string=params, headers={'User-Agent': user_agent})
+
+
+class TestMyRatings:
+    """Tests for the per-listener rating history."""
+
+    def test_lists_own_votes_newest_first(self, client):
+        """Only the caller's votes are returned, with song details."""
+        vote(client, 'First')
+        vote(client, 'Second', -1)
+        vote(client, 'Other', user_agent='Someone Else/1.0')
+
+        ratings = my_ratings(client).get_json()['ratings']
+        assert [(r['title'], r['artist'], r['rating']) for r in ratings] == [('Second', 'Artist', -1),
+                                                                            ('First', 'Artist', 1)]
+        assert ratings[0]['created_at'].endswith('Z')
+        assert my_ratings(client).get_json()['next_before'] is None
+
+    def test_orders_by_created_at_then_id(self, client):
+        """Older votes sort after newer ones even when ids say otherwise."""
+        vote(client, 'Voted Later')
+        vote(client, 'Voted Earlier')
+        conn = get_db_connection()
+        execute_query(conn, "UPDATE ratings SET created_at = '2020-01-01 00:00:00' WHERE id = 2")
+        conn.commit()
+        conn.close()
+        app_module._my_ratings_cache.clear()
+
+        titles = [r['title'] for r in my_ratings(client).get_json()['ratings']]
+        assert titles == ['Voted Later', 'Voted Earlier']
+
+    def test_keyset_pagination(self, client):
+        """Pages follow next_before without gaps or repeats, even within one second."""
+        for i in range(7):
+            vote(client, f'Song {i}')
+
+        seen, before = [], None
+        while True:
+            params = {'limit': 3}
+            if before:
+                params['before'] = before
+            page = my_ratings(client, **params).get_json()
+            seen.extend(r['title'] for r in page['ratings'])
+            before = page['next_before']
+            if before is None:
+                break
+
+        assert seen == [f'Song {i}' for i in reversed(range(7))]
+
+    def test_cannot_page_from_another_listeners_vote(self, client):
+        """A before id belonging to someone else yields nothing."""
+        vote(client, 'Mine')
+        vote(client, 'Theirs', user_agent='Someone Else/1.0')
+        theirs = my_ratings(client, user_agent='Someone Else/1.0').get_json()['ratings'][0]['id']
+
+        assert my_ratings(client, before=theirs).get_json()['ratings'] == []
+
+    def test_first_page_cached_until_vote(self, client, monkeypatch):
+        """The first page is served from cache and refreshed when the listener votes."""
+        vote(client, 'First')
+        assert len(my_ratings(client).get_json()['ratings']) == 1
+
+        queries = []
+        real_execute_query = app_module.execute_query
+        monkeypatch.setattr(app_module, 'execute_query',
+                            lambda conn, query, *args, **kwargs: (queries.append(query),
+                                                                  real_execute_query(conn, query, *args, **kwargs))[1])
+        assert len(my_ratings(client).get_json()['ratings']) == 1
+        assert queries == []
+
+        vote(client, 'Second')
+        assert [r['title'] for r in my_ratings(client).get_json()['ratings']] == ['Second', 'First']
+
+    def test_changed_vote_shows_new_rating(self, client):
+        """Changing a vote updates the listed rating."""
+        vote(client, 'Song', 1)
+        my_ratings(client)
+        vote(client, 'Song', -1)
+
+        ratings = my_ratings(client).get_json()['ratings']
+        assert [(r['title'], r['rating']) for r in ratings] == [('Song', -1)]
+
+    def test_uses_covering_index(self, test_app):
+        """On SQLite the ratings side is read from idx_ratings_user_recent alone."""
+        conn = get_db_connection()
+        plan = execute_query(conn, '''
+            EXPLAIN QUERY PLAN
+            SELECT ratings.id, ratings.rating, ratings.created_at,
+                songs.id AS song_id, songs.title, songs.artist, songs.album, songs.year
+            FROM ratings JOIN songs ON songs.id = ratings.song_id
+            WHERE ratings.user_id = ?
+            ORDER BY ratings.created_at DESC, ratings.id DESC
+            LIMIT ?
+        ''', ('someone', 20), fetch_all=True)
+        conn.close()
+
+        details = ' '.join(row['detail'] for row in plan)
+        assert 'COVERING INDEX idx_ratings_user_recent' in details
+        assert 'TEMP B-TREE' not in details
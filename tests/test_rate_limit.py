@@ -0,0 +1,129 @@
+"""
+Tests for per-listener token buckets and the concurrency limiter.
+"""
+
+import os
+import subprocess
+
+import pytest
+import app as app_module
+from app import take_token
+
+USER = 'a' * 32
+OTHER = 'b' * 32
+
+
+@pytest.fixture
+def limits(test_app, monkeypatch):
+    monkeypatch.setitem(app_module.RATE_LIMITS, 'vote', (1.0, 3))
+    monkeypatch.setitem(app_module.RATE_LIMITS, 'read', (2.0, 5))
+
+
+class TestTokenBucket:
+    """Tests for take_token()."""
+
+    def test_burst_then_reject(self, limits):
+        """Test that a full bucket admits the burst and then reports the wait."""
+        results = [take_token(USER, 'vote', now=100.0) for _ in range(4)]
+
+        assert results[:3] == [0, 0, 0]
+        assert results[3] == pytest.approx(1.0)
+
+    def test_refill(self, limits):
+        """Test that tokens accrue at the configured rate."""
+        for _ in range(3):
+            take_token(USER, 'vote', now=100.0)
+
+        assert take_token(USER, 'vote', now=100.5) == pytest.approx(0.5)
+        assert take_token(USER, 'vote', now=101.0) == 0
+
+    def test_buckets_are_per_user_and_kind(self, limits):
+        """Test that one listener's votes do not spend another's or their reads."""
+        for _ in range(3):
+            take_token(USER, 'vote', now=100.0)
+
+        assert take_token(OTHER, 'vote', now=100.0) == 0
+        assert take_token(USER, 'read', now=100.0) == 0
+
+    def test_table_is_shared_between_mappings(self, limits, monkeypatch):
+        """Test that buckets persist in the file, as seen by another worker's mapping."""
+        for _ in range(3):
+            take_token(USER, 'vote', now=100.0)
+
+        # A fresh mapping of the same file, like a second gunicorn worker
+        monkeypatch.setitem(app_module._rate_table, 'mmap', None)
+
+        assert take_token(USER, 'vote', now=100.0) > 0
+
+
+class TestAdmissionControl:
+    """Tests for 429/503 responses on the rating routes."""
+
+    def test_vote_rate_limited(self, client, limits):
+        """Test that excess votes get 429 with Retry-After."""
+        vote = {'title': 'Song', 'artist': 'Artist', 'rating': 1}
+        statuses = [client.post('/api/songs/rating', json=vote).status_code for _ in range(4)]
+
+        assert statuses == [200, 200, 200, 429]
+        response = client.post('/api/songs/rating', json=vote)
+        assert int(response.headers['Retry-After']) >= 1
+
+    def test_read_rate_limited(self, client, limits):
+        """Test that rating reads have their own bucket."""
+        statuses = [client.get('/api/songs/rating/Song/Artist').status_code for _ in range(6)]
+
+        assert statuses[-1] == 429
+        assert client.post('/api/songs/rating', json={'title': 'Song', 'artist': 'Artist', 'rating': 1}).status_code == 200
+
+    def test_limits_follow_identity(self, client, limits):
+        """Test that buckets are keyed on the IP + User-Agent identity."""
+        for _ in range(5):
+            client.get('/api/songs/rating/Song/Artist')
+
+        response = client.get('/api/songs/rating/Song/Artist', headers={'User-Agent': 'Another Browser'})
+
+        assert response.status_code == 200
+
+    def test_saturated_host_sheds_load(self, client, limits, monkeypatch):
+        """Test that requests in flight in other workers count towards the limit."""
+        monkeypatch.setattr(app_module, 'MAX_CONCURRENT_REQUESTS', 2)
+        assert client.get('/api/songs/rating/Song/Artist').status_code == 200
+        set_worker_slot(1, os.getppid(), 2)
+
+        response = client.get('/api/songs/rating/Song/Artist')
+
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '1'
+
+    def test_slot_released_after_request(self, client, limits, monkeypatch):
+        """Test that the concurrency slot is returned, even when the view errors."""
+        monkeypatch.setattr(app_module, 'MAX_CONCURRENT_REQUESTS', 1)
+
+        client.get('/api/songs/rating/Song/Artist')
+        client.post('/api/songs/rating', data='not json', content_type='application/json')
+
+        assert app_module._in_flight['count'] == 0
+        assert in_flight_on_host() == 0
+
+    def test_dead_worker_slot_cleared(self, client, limits, monkeypatch):
+        """Test that a worker that died mid-request stops counting once a worker starts."""
+        monkeypatch.setattr(app_module, 'MAX_CONCURRENT_REQUESTS', 1)
+        finished = subprocess.Popen(['true'])
+        finished.wait()
+        set_worker_slot(5, finished.pid, 1)
+
+        # A new worker (here: this one after a fork) claims a slot
+        monkeypatch.setitem(app_module._in_flight, 'pid', None)
+
+        assert client.get('/api/songs/rating/Song/Artist').status_code == 200
+        assert in_flight_on_host() == 0
+
+
+def set_worker_slot(slot, pid, count):
+    table = app_module.admission_table()
+    app_module._ADMISSION_COUNT.pack_into(table, slot * 8, pid)
+    app_module._ADMISSION_COUNT.pack_into(table, app_module._ADMISSION_COUNTS.size + slot * 8, count)
+
+
+def in_flight_on_host():
+    return sum(app_module._ADMISSION_COUNTS.unpack_from(app_module.admission_table(), app_module._ADMISSION_COUNTS.size))
@@ -0,0 +1,158 @@
+"""
+Tests for read-replica routing, using SQLite files as stand-in replicas.
+"""
+
+import pytest
+import sqlite3
+import app as app_module
+from app import get_db_connection, init_db
+
+
+@pytest.fixture
+def replica(test_app, tmp_path, monkeypatch):
+    """A second database with the same schema, registered as the only replica."""
+    path = str(tmp_path / 'replica.db')
+    monkeypatch.setattr(app_module, 'DATABASE', path)
+    init_db()
+    monkeypatch.undo()
+
+    monkeypatch.setattr(app_module, 'DATABASE_REPLICA_URLS', [path])
+    monkeypatch.setattr(app_module, '_replica_rotation', [0])
+    return path
+
+
+def seed(path, thumbs_up):
+    conn = sqlite3.connect(path)
+    conn.execute("INSERT INTO songs (title, artist) VALUES ('Song', 'Artist')")
+    conn.executemany(
+        "INSERT INTO ratings (song_id, user_id, rating) VALUES (1, ?, 1)",
+        [(f'user{i}',) for i in range(thumbs_up)]
+    )
+    conn.commit()
+    conn.close()
+
+
+class TestReplicaRouting:
+    """Tests for get_db_connection(readonly=True)."""
+
+    def test_reads_go_to_replica(self, client, replica):
+        """Test that the rating read route is served by the replica."""
+        seed(app_module.DATABASE, 1)
+        seed(replica, 3)
+
+        response = client.get('/api/songs/rating/Song/Artist')
+
+        assert response.get_json()['thumbs_up'] == 3
+
+    def test_writes_go_to_primary(self, test_app, replica):
+        """Test that plain connections are never routed to a replica."""
+        conn = get_db_connection()
+        conn.execute("INSERT INTO songs (title, artist) VALUES ('Primary', 'Only')")
+        conn.commit()
+        conn.close()
+
+        replica_conn = sqlite3.connect(replica)
+        assert replica_conn.execute("SELECT COUNT(*) FROM songs").fetchone()[0] == 0
+        replica_conn.close()
+
+    def test_replica_connections_are_read_only(self, test_app, replica):
+        """Test that a stand-in replica is opened read-only."""
+        conn = get_db_connection(readonly=True)
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("INSERT INTO songs (title, artist) VALUES ('x', 'y')")
+        conn.close()
+
+    def test_round_robin(self, test_app, replica, tmp_path, monkeypatch):
+        """Test that reads rotate across replicas."""
+        second = str(tmp_path / 'second.db')
+        primary = app_module.DATABASE
+        monkeypatch.setattr(app_module, 'DATABASE', second)
+        init_db()
+        monkeypatch.setattr(app_module, 'DATABASE', primary)
+        monkeypatch.setattr(app_module, 'DATABASE_REPLICA_URLS', [replica, second])
+
+        files = []
+        for _ in range(4):
+            conn = get_db_connection(readonly=True)
+            files.append(conn.execute("PRAGMA database_list").fetchone()[2])
+            conn.close()
+
+        assert files == [replica, second, replica, second]
+
+
+class TestPrimaryStickiness:
+    """Tests for read-your-writes after a vote."""
+
+    def test_voter_reads_from_primary(self, client, replica):
+        """Test that a caller who just voted sees their vote despite replica lag."""
+        response = client.post('/api/songs/rating', json={'title': 'Song', 'artist': 'Artist', 'rating': 1})
+        assert app_module.PRIMARY_STICKY_COOKIE in response.headers['Set-Cookie']
+
+        # The replica has not caught up: it knows nothing about the vote
+        data = client.get('/api/songs/rating/Song/Artist').get_json()
+
+        assert data['thumbs_up'] == 1
+        assert data['user_rating'] == 1
+
+    def test_other_callers_use_replica(self, test_app, replica):
+        """Test that stickiness is per caller, not global."""
+        test_app.test_client().post('/api/songs/rating', json={'title': 'Song', 'artist': 'Artist', 'rating': 1})
+
+        data = test_app.test_client().get('/api/songs/rating/Song/Artist').get_json()
+
+        assert data['thumbs_up'] == 0
+
+    def test_stickiness_expires(self, client, replica, monkeypatch):
+        """Test that pinned reads return to the replica after the window."""
+        client.post('/api/songs/rating', json={'title': 'Song', 'artist': 'Artist', 'rating': 1})
+        now = app_module.time.time()
+        monkeypatch.setattr(app_module.time, 'time', lambda: now + app_module.REPLICA_STICKY_SECONDS + 1)
+
+        assert not client.get('/api/songs/rating/Song/Artist').get_json()['thumbs_up']
+
+    def test_no_cookie_without_replicas(self, client):
+        """Test that single-database deployments are unchanged."""
+        response = client.post('/api/songs/rating', json={'title': 'Song', 'artist': 'Artist', 'rating': 1})
+
+        assert 'Set-Cookie' not in response.headers
+
+
+class TestReplicaHealth:
+    """Tests for ejecting unhealthy replicas."""
+
+    def test_missing_replica_falls_back_to_primary(self, client, tmp_path, monkeypatch):
+        """Test that an unreachable replica is ejected and the primary serves the read."""
+        missing = str(tmp_path / 'missing.db')
+        monkeypatch.setattr(app_module, 'DATABASE_REPLICA_URLS', [missing])
+        seed(app_module.DATABASE, 2)
+
+        data = client.get('/api/songs/rating/Song/Artist').get_json()
+
+        assert data['thumbs_up'] == 2
+        assert app_module._replica_state[missing]['ejected_until'] > app_module.time.time()
+
+    def test_replica_without_schema_is_ejected(self, test_app, tmp_path, monkeypatch):
+        """Test that a replica failing the health query is skipped for the ejection window."""
+        empty = str(tmp_path / 'empty.db')
+        sqlite3.connect(empty).close()
+        monkeypatch.setattr(app_module, 'DATABASE_REPLICA_URLS', [empty])
+
+        conn = get_db_connection(readonly=True)
+        assert conn.execute("PRAGMA database_list").fetchone()[2] == app_module.DATABASE
+        conn.close()
+
+        # Still ejected: no reconnect attempt until the window passes
+        connects = []
+        real_connect = sqlite3.connect
+        monkeypatch.setattr(app_module.sqlite3, 'connect',
+                            lambda *args, **kwargs: connects.append(args) or real_connect(*args, **kwargs))
+        get_db_connection(readonly=True).close()
+        assert all('mode=ro' not in str(args[0]) for args in connects)
+
+    def test_ejected_replica_is_retried(self, test_app, replica, monkeypatch):
+        """Test that a replica comes back after the ejection window if healthy again."""
+        app_module._replica_state[replica] = {'checked_at': 0, 'ejected_until': app_module.time.time() - 1}
+
+        conn = get_db_connection(readonly=True)
+        assert conn.execute("PRAGMA database_list").fetchone()[2] == replica
+        conn.close()
@@ -0,0 +1,175 @@
+"""
+Tests for time-bucketed rating rollups.
+"""
+
+import pytest
+import json
+from datetime import datetime, timedelta
+from app import get_db_connection, rollup_ratings, rollup_ratings_batch
+
+NOW = datetime(2025, 6, 1, 12, 0, 0)
+
+
+def add_song(conn, title='Rollup Song'):
+    conn.execute(
+        "INSERT INTO songs (title, artist, album, year) VALUES (?, ?, ?, ?)",
+        (title, 'Rollup Artist', 'Album', '2025')
+    )
+    return conn.execute("SELECT id FROM songs WHERE title = ?", (title,)).fetchone()[0]
+
+
+def add_ratings(conn, song_id, votes):
+    """Insert (user_id, rating, created_at) tuples."""
+    conn.executemany(
+        "INSERT INTO ratings (song_id, user_id, rating, created_at) VALUES (?, ?, ?, ?)",
+        [(song_id, user_id, rating, created_at) for user_id, rating, created_at in votes]
+    )
+    conn.commit()
+
+
+def rollup_rows(conn, bucket_size):
+    return [tuple(row) for row in conn.execute(
+        "SELECT song_id, bucket_start, thumbs_up, thumbs_down FROM rating_rollups "
+        "WHERE bucket_size = ? ORDER BY song_id, bucket_start", (bucket_size,)
+    ).fetchall()]
+
+
+@pytest.fixture
+def rated_song(test_app):
+    conn = get_db_connection()
+    song_id = add_song(conn)
+    add_ratings(conn, song_id, [
+        ('u1', 1, '2025-06-01 09:05:00'),
+        ('u2', 1, '2025-06-01 09:55:00'),
+        ('u3', -1, '2025-06-01 10:15:00'),
+        ('u4', 1, '2025-05-31 23:59:59'),
+    ])
+    conn.close()
+    return song_id
+
+
+class TestRollupPipeline:
+    """Tests for incremental, idempotent rollups."""
+
+    def test_hourly_and_daily_buckets(self, rated_song):
+        """Test that votes land in the right hour and day buckets."""
+        conn = get_db_connection()
+        assert rollup_ratings(conn, now=NOW) == 4
+
+        assert rollup_rows(conn, 'hour') == [
+            (rated_song, '2025-05-31 23:00:00', 1, 0),
+            (rated_song, '2025-06-01 09:00:00', 2, 0),
+            (rated_song, '2025-06-01 10:00:00', 0, 1),
+        ]
+        assert rollup_rows(conn, 'day') == [
+            (rated_song, '2025-05-31 00:00:00', 1, 0),
+            (rated_song, '2025-06-01 00:00:00', 2, 1),
+        ]
+        conn.close()
+
+    def test_rerun_is_idempotent(self, rated_song):
+        """Test that running again without new ratings changes nothing."""
+        conn = get_db_connection()
+        rollup_ratings(conn, now=NOW)
+        before = rollup_rows(conn, 'hour')
+        assert rollup_ratings(conn, now=NOW) == 0
+        assert rollup_rows(conn, 'hour') == before
+        conn.close()
+
+    def test_incremental_from_watermark(self, rated_song):
+        """Test that only ratings past the watermark are added."""
+        conn = get_db_connection()
+        rollup_ratings(conn, now=NOW)
+        add_ratings(conn, rated_song, [('u5', -1, '2025-06-01 09:30:00')])
+        assert rollup_ratings(conn, now=NOW) == 1
+
+        assert (rated_song, '2025-06-01 09:00:00', 2, 1) in rollup_rows(conn, 'hour')
+        conn.close()
+
+    def test_resumes_batch_by_batch(self, rated_song):
+        """Test that batches commit progress so an interrupted run resumes."""
+        conn = get_db_connection()
+        assert rollup_ratings_batch(conn, batch_size=3, now=NOW) == 3
+        watermark = conn.execute("SELECT watermark FROM rollup_state WHERE name = 'ratings'").fetchone()[0]
+        assert watermark == 3
+
+        assert rollup_ratings_batch(conn, batch_size=3, now=NOW) == 1
+        assert rollup_rows(conn, 'day')[-1] == (rated_song, '2025-06-01 00:00:00', 2, 1)
+        conn.close()
+
+    def test_recent_ratings_wait_for_lag(self, rated_song):
+        """Test that ratings inside the lag window are left for the next run."""
+        conn = get_db_connection()
+        add_ratings(conn, rated_song, [('u5', 1, '2025-06-01 11:59:30')])
+        assert rollup_ratings(conn, now=NOW) == 4
+        assert rollup_ratings(conn, now=datetime(2025, 6, 1, 12, 5)) == 1
+        conn.close()
+
+    def test_rollup_command(self, rated_song, runner):
+        """Test the rollup-ratings CLI command."""
+        result = runner.invoke(args=['rollup-ratings'])
+        assert result.exit_code == 0
+        assert 'Rolled up 4 ratings' in result.output
+
+
+class TestSongStatsAPI:
+    """Tests for the /api/songs/<id>/stats endpoint."""
+
+    def test_hourly_series(self, client, rated_song):
+        """Test reading an hourly series for a time range."""
+        conn = get_db_connection()
+        rollup_ratings(conn, now=NOW)
+        conn.close()
+
+        response = client.get(f'/api/songs/{rated_song}/stats?bucket=hour'
+                              '&since=2025-06-01T00:00:00Z&until=2025-06-01T12:00:00Z')
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert data['bucket'] == 'hour'
+        assert data['series'] == [
+            {'bucket_start': '2025-06-01T09:00:00Z', 'thumbs_up': 2, 'thumbs_down': 0},
+            {'bucket_start': '2025-06-01T10:00:00Z', 'thumbs_up': 0, 'thumbs_down': 1},
+        ]
+
+    def test_reads_rollups_not_ratings(self, client, rated_song):
+        """Test that the endpoint only sees rolled-up data."""
+        response = client.get(f'/api/songs/{rated_song}/stats?bucket=day'
+                              '&since=2025-05-01&until=2025-06-02')
+        assert json.loads(response.data)['series'] == []
+
+    def test_changed_vote_after_rollup(self, client, test_app):
+        """Test that a vote changed after it was rolled up moves between the counts."""
+        vote = {'title': 'Changed Song', 'artist': 'Rollup Artist'}
+        client.post('/api/songs/rating', json={**vote, 'rating': 1})
+        conn = get_db_connection()
+        song_id, created_at = conn.execute(
+            "SELECT song_id, created_at FROM ratings").fetchone()
+        rolled_at = datetime.strptime(created_at, '%Y-%m-%d %H:%M:%S') + timedelta(minutes=5)
+        assert rollup_ratings(conn, now=rolled_at) == 1
+
+        client.post('/api/songs/rating', json={**vote, 'rating': -1})
+        assert rollup_ratings(conn, now=rolled_at) == 0
+        assert [row[2:] for row in rollup_rows(conn, 'hour')] == [(0, 1)]
+        assert [row[2:] for row in rollup_rows(conn, 'day')] == [(0, 1)]
+        conn.close()
+
+        day = created_at[:10]
+        series = client.get(f'/api/songs/{song_id}/stats?bucket=day&since={day}&until={day}T23:59:59Z').get_json()['series']
+        assert [(point['thumbs_up'], point['thumbs_down']) for point in series] == [(0, 1)]
+
+    def test_changed_vote_before_rollup(self, client, test_app):
+        """Test that a vote changed before its first rollup is counted once, at its new value."""
+        vote = {'title': 'Changed Song', 'artist': 'Rollup Artist'}
+        client.post('/api/songs/rating', json={**vote, 'rating': 1})
+        client.post('/api/songs/rating', json={**vote, 'rating': -1})
+
+        conn = get_db_connection()
+        created_at = conn.execute("SELECT created_at FROM ratings").fetchone()[0]
+        rollup_ratings(conn, now=datetime.strptime(created_at, '%Y-%m-%d %H:%M:%S') + timedelta(minutes=5))
+        assert [row[2:] for row in rollup_rows(conn, 'hour')] == [(0, 1)]
+        conn.close()
+
+    def test_invalid_parameters(self, client, rated_song):
+        """Test validation of bucket and timestamps."""
+        assert client.get(f'/api/songs/{rated_song}/stats?bucket=week').status_code == 400
+        assert client.get(f'/api/songs/{rated_song}/stats?since=yesterday').status_code == 400
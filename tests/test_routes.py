@@ -23,6 +23,15 @@ class TestRadioRoute:
         assert b'id="stopBtn"' in response.data
         assert b'id="visualizer"' in response.data
 
+    def test_visualizer_canvas_and_worker(self, client):
+        """Test that the visualizer is a canvas whose worker script is served."""
+        response = client.get('/radio')
+        assert b'<canvas class="visualizer" id="visualizer"' in response.data
+
+        worker = client.get('/static/js/visualizer-worker.js')
+        assert worker.status_code == 200
+        worker.close()
+
     def test_radio_page_has_rating_buttons(self, client):
         """Test that the radio page contains rating functionality."""
         response = client.get('/radio')
@@ -31,6 +40,104 @@ class TestRadioRoute:
         assert b'thumbsUpCount' in response.data
         assert b'thumbsDownCount' in response.data
 
+    def test_radio_page_supports_etag(self, client):
+        """Test that an unchanged page is revalidated with a 304."""
+        response1 = client.get('/radio')
+        etag = response1.headers.get('ETag')
+        assert etag
+
+        response2 = client.get('/radio', headers={'If-None-Match': etag})
+        assert response2.status_code == 304
+        assert response2.data == b''
+
+    def test_radio_page_without_cached_track(self, client, monkeypatch):
+        """Test that the page renders an empty bootstrap before any metadata is cached."""
+        import app as app_module
+        monkeypatch.setitem(app_module._now_playing, 'track', None)
+
+        response = client.get('/radio')
+        assert b'id="bootstrap"' in response.data
+        assert b'Waiting for track info...' in response.data
+        start = response.data.index(b'<script id="bootstrap" type="application/json">')
+        end = response.data.index(b'</script>', start)
+        bootstrap = json.loads(response.data[start:end].split(b'>', 1)[1])
+        assert bootstrap['track'] is None
+
+    def test_radio_page_embeds_cached_track(self, client, monkeypatch):
+        """Test that the cached now-playing snapshot and its ratings are rendered inline."""
+        import app as app_module
+        monkeypatch.setitem(app_module._now_playing, 'track', {
+            'title': 'Bootstrap Song',
+            'artist': 'Bootstrap Artist',
+            'album': 'Bootstrap Album',
+            'year': '2025'
+        })
+        client.post('/api/songs/rating',
+                    json={
+                        'title': 'Bootstrap Song',
+                        'artist': 'Bootstrap Artist',
+                        'rating': 1
+                    })
+
+        response = client.get('/radio')
+        assert response.status_code == 200
+        assert b'<div class="track-title" id="trackTitle">Bootstrap Song</div>' in response.data
+
+        start = response.data.index(b'<script id="bootstrap" type="application/json">')
+        end = response.data.index(b'</script>', start)
+        payload = response.data[start:end].split(b'>', 1)[1]
+        bootstrap = json.loads(payload)
+        assert bootstrap['track']['title'] == 'Bootstrap Song'
+        assert bootstrap['rating'] == {'thumbs_up': 1, 'thumbs_down': 0, 'user_rating': 1}
+
+
+class TestServiceWorker:
+    """Tests for the app shell service worker and asset fingerprints."""
+
+    def test_service_worker_served_from_root(self, client):
+        """Test that the worker is served as uncached JavaScript."""
+        response = client.get('/sw.js')
+        assert response.status_code == 200
+        assert response.mimetype == 'application/javascript'
+        assert response.headers['Cache-Control'] == 'no-cache'
+
+    def test_service_worker_precaches_fingerprinted_shell(self, client):
+        """Test that the precache list matches the URLs the page references."""
+        from app import static_url
+        page = client.get('/radio').data.decode()
+        worker = client.get('/sw.js').data.decode()
+
+        with client.application.test_request_context():
+            css_url = static_url('css/radio.css')
+            js_url = static_url('js/radio.js')
+        assert '?v=' in css_url
+        for url in (css_url, js_url, 'hls.min.js'):
+            assert url in page
+            assert url in worker
+
+    def test_service_worker_skips_live_and_api(self, client):
+        """Test that HLS and API paths are excluded from caching."""
+        worker = client.get('/sw.js').data.decode()
+        assert "startsWith('/api/')" in worker
+        assert 'm3u8' in worker
+
+    def test_cache_version_follows_asset_fingerprints(self, test_app, monkeypatch):
+        """Test that changing any shell asset produces a new cache version."""
+        import app as app_module
+        with test_app.test_request_context():
+            before = app_module.app_shell_version()
+            monkeypatch.setitem(app_module._asset_fingerprints, 'js/radio.js', 'changed')
+            after = app_module.app_shell_version()
+        assert before != after
+
+    def test_bootstrap_has_stable_refresh_time(self, client, upstream_metadata):
+        """Test that the page ETag survives polls within the same track."""
+        client.get('/api/metadata')
+        etag = client.get('/radio').headers['ETag']
+        client.get('/api/metadata')
+        response = client.get('/radio', headers={'If-None-Match': etag})
+        assert response.status_code == 304
+
 
 class TestMetadataAPI:
     """Tests for the metadata API endpoint."""
@@ -46,6 +153,137 @@ class TestMetadataAPI:
         response = client.get('/api/metadata')
         assert response.content_type == 'application/json'
 
+    def test_metadata_returns_poll_schedule(self, client, upstream_metadata):
+        """Test that the response tells clients when to poll next."""
+        response = client.get('/api/metadata')
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert data['track']['title'] == 'Upstream Song'
+
+        next_poll_after = data['next_poll_after']
+        assert 5 <= next_poll_after <= 90
+        assert response.headers['Cache-Control'] == f'private, max-age={next_poll_after}'
+
+    def test_metadata_uses_upstream_duration(self, client, upstream_metadata):
+        """Test that upstream start time and duration drive the schedule."""
+        import time
+        upstream_metadata.document['started_at'] = time.time() - 30
+        upstream_metadata.document['duration'] = 70
+
+        data = json.loads(client.get('/api/metadata').data)
+        # 40s left plus the grace period, allowing for a slow test run
+        assert 40 <= data['next_poll_after'] <= 42
+
+    def test_metadata_polls_fast_when_change_overdue(self, client, upstream_metadata):
+        """Test that an overdue track change falls back to the minimum interval."""
+        import time
+        upstream_metadata.document['started_at'] = time.time() - 600
+        upstream_metadata.document['duration'] = 200
+
+        data = json.loads(client.get('/api/metadata').data)
+        assert data['next_poll_after'] == 5
+
+    def test_metadata_upstream_error(self, client, upstream_metadata):
+        """Test that upstream errors are passed through without caching headers."""
+        upstream_metadata.status_code = 503
+        response = client.get('/api/metadata')
+        assert response.status_code == 503
+        assert 'max-age' not in response.headers.get('Cache-Control', '')
+
+    def test_metadata_returns_normalized_track(self, client, upstream_metadata):
+        """Test that only the canonical track fields are sent to clients."""
+        upstream_metadata.document.update({
+            'bit_depth': 16,
+            'sample_rate': 44100,
+            'prev_title_1': 'Earlier Song',
+            'prev_artist_1': 'Earlier Artist',
+            'prev_album_1': 'Earlier Album'
+        })
+        data = json.loads(client.get('/api/metadata').data)
+        assert set(data) == {'track', 'next_poll_after'}
+        assert data['track'] == {
+            'title': 'Upstream Song',
+            'artist': 'Upstream Artist',
+            'album': 'Upstream Album',
+            'year': '2025',
+            'previous': [{'title': 'Earlier Song', 'artist': 'Earlier Artist'}]
+        }
+
+    def test_metadata_serializes_once_per_change(self, client, upstream_metadata, monkeypatch):
+        """Test that repeated polls of an unchanged track reuse the cached bytes."""
+        import app as app_module
+
+        client.get('/api/metadata')
+        payload = app_module._now_playing['payload']
+
+        def fail_normalize(data):
+            raise AssertionError('track re-normalized without a change')
+
+        monkeypatch.setattr(app_module, 'normalize_metadata', fail_normalize)
+        response = client.get('/api/metadata')
+        assert response.status_code == 200
+        assert app_module._now_playing['payload'] is payload
+
+
+class TestJSONProvider:
+    """Tests for the orjson-backed Flask JSON provider."""
+
+    def test_orjson_provider_installed(self, test_app):
+        """Test that the app uses orjson when it is available."""
+        pytest.importorskip('orjson')
+        from app import OrjsonProvider
+        assert isinstance(test_app.json, OrjsonProvider)
+
+    def test_provider_matches_stdlib_output(self, test_app):
+        """Test that encoded JSON round-trips like the stdlib encoder."""
+        obj = {'b': 1, 'a': [None, True, 'ü'], 3: 'int key'}
+        assert json.loads(test_app.json.dumps(obj)) == {'b': 1, 'a': [None, True, 'ü'], '3': 'int key'}
+        assert test_app.json.dumps({'b': 1, 'a': 2}, sort_keys=True).replace(' ', '') == '{"a":2,"b":1}'
+        assert test_app.json.loads('{"a": [1, 2]}') == {'a': [1, 2]}
+
+
+class TestTrackTiming:
+    """Tests for learned track-length poll scheduling."""
+
+    def test_learns_average_from_observed_tracks(self, upstream_metadata):
+        """Test that only fully observed tracks update the average length."""
+        import app as app_module
+
+        app_module.record_track_timing({'title': 'A', 'artist': 'X'}, 1000.0)
+        # Joined mid-track: the first boundary does not teach us a length
+        app_module.record_track_timing({'title': 'B', 'artist': 'X'}, 1050.0)
+        assert app_module._track_timing['average'] == 180.0
+
+        app_module.record_track_timing({'title': 'C', 'artist': 'X'}, 1290.0)
+        assert app_module._track_timing['average'] == pytest.approx(0.8 * 180 + 0.2 * 240)
+
+    def test_same_track_keeps_start_time(self, upstream_metadata):
+        """Test that repeated polls of one track do not move its start time."""
+        import app as app_module
+
+        app_module.record_track_timing({'title': 'A', 'artist': 'X'}, 1000.0)
+        app_module.record_track_timing({'title': 'A', 'artist': 'X'}, 1100.0)
+        assert app_module._track_timing['started_at'] == 1000.0
+
+    def test_schedule_from_learned_average(self, upstream_metadata):
+        """Test next poll time without upstream timing fields."""
+        import app as app_module
+
+        app_module.record_track_timing({'title': 'A', 'artist': 'X'}, 1000.0)
+        assert app_module.seconds_until_next_poll({'title': 'A'}, 1100.0) == 82
+        assert app_module.seconds_until_next_poll({'title': 'A'}, 1000.0) == 90
+
+    def test_millisecond_timing_fields(self):
+        """Test that millisecond timestamps and durations are normalised."""
+        import app as app_module
+
+        started_at, duration = app_module.upstream_track_timing({
+            'start_time': 1700000000000,
+            'duration': 215000
+        })
+        assert started_at == 1700000000.0
+        assert duration == 215.0
+
 
 class TestRatingsAPI:
     """Tests for the song ratings API."""
@@ -70,6 +308,17 @@ class TestRatingsAPI:
                                 })
         assert response.status_code == 400
 
+    def test_rejected_vote_opens_no_connection(self, client, monkeypatch):
+        """Test that invalid votes are refused before a database connection is opened."""
+        import app as app_module
+        opened = []
+        real_connect = app_module.get_db_connection
+        monkeypatch.setattr(app_module, 'get_db_connection', lambda *a, **k: opened.append(1) or real_connect(*a, **k))
+
+        for payload in ({}, {'title': 'T', 'artist': 'A', 'rating': 5}, {'title': 'T', 'artist': 'A', 'rating': 1, 'station': 'nope'}):
+            assert client.post('/api/songs/rating', json=payload).status_code == 400
+        assert opened == []
+
     def test_rate_song_thumbs_up(self, client):
         """Test successful thumbs up rating."""
         response = client.post('/api/songs/rating',
@@ -154,3 +403,75 @@ class TestRatingsAPI:
         assert data['thumbs_up'] == 1
         assert data['thumbs_down'] == 0
         assert data['user_rating'] == 1
+
+
+class TestWarmStart:
+    """Tests for worker prewarming and readiness."""
+
+    @pytest.fixture
+    def cold(self, upstream_metadata, monkeypatch):
+        import app as app_module
+        monkeypatch.setattr(app_module, '_warm_state', {'app': False, 'worker_pid': None, 'worker_seconds': None})
+        return upstream_metadata
+
+    def test_not_ready_before_prewarm(self, client, cold):
+        """Test that readiness fails until the worker has been prewarmed."""
+        response = client.get('/api/ready')
+
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '1'
+
+    def test_ready_after_prewarm(self, client, cold):
+        """Test that prewarm_worker() flips readiness for this process."""
+        import app as app_module
+        app_module.prewarm_worker()
+
+        response = client.get('/api/ready')
+
+        assert response.status_code == 200
+        assert response.get_json()['ready'] is True
+
+    def test_inherited_readiness_is_not_trusted(self, client, cold):
+        """Test that a forked worker is not ready just because its parent was."""
+        import app as app_module
+        app_module.prewarm_worker()
+        app_module._warm_state['worker_pid'] = -1  # prewarmed in another process
+
+        assert client.get('/api/ready').status_code == 503
+
+    def test_prewarm_loads_now_playing_and_song_id(self, test_app, cold):
+        """Test that the snapshot and the current song id are cached before any request."""
+        import app as app_module
+        conn = app_module.get_db_connection()
+        song_id = app_module.get_or_create_song_id(conn, 'Upstream Song', 'Upstream Artist')
+        conn.close()
+        app_module._song_ids.clear()
+
+        app_module.prewarm_app()
+
+        assert app_module._now_playing['track']['title'] == 'Upstream Song'
+        assert app_module._song_ids[('main', 'Upstream Song', 'Upstream Artist')] == song_id
+        assert app_module._warm_state['app'] is True
+
+    def test_prewarm_survives_upstream_failure(self, test_app, cold):
+        """Test that a dead upstream does not block the worker from becoming ready."""
+        import app as app_module
+        cold.status_code = 502
+
+        app_module.prewarm_worker()
+
+        assert app_module._now_playing['track'] is None
+        assert app_module._warm_state['worker_pid'] is not None
+
+    def test_song_id_cache_skips_insert(self, test_app):
+        """Test that a cached song id avoids the INSERT OR IGNORE round trip."""
+        import app as app_module
+        conn = app_module.get_db_connection()
+        song_id = app_module.get_or_create_song_id(conn, 'Cached', 'Artist')
+        conn.close()
+
+        class NoQueries:
+            def cursor(self, *args, **kwargs):
+                raise AssertionError('cached lookup touched the database')
+
+        assert app_module.get_or_create_song_id(NoQueries(), 'Cached', 'Artist') == song_id
@@ -0,0 +1,169 @@
+"""
+Tests for /api/songs/search: prefix matching, ranking, keyset pagination
+and the result cache.
+"""
+
+import app as app_module
+from app import get_db_connection, get_or_create_song_id, execute_query
+
+
+def add_songs(*songs):
+    conn = get_db_connection()
+    ids = [get_or_create_song_id(conn, title, artist) for title, artist in songs]
+    conn.commit()
+    conn.close()
+    return ids
+
+
+def search(client, q, **params):
+    return client.get('/api/songs/search', query_string={'q': q, **params})
+
+
+class TestSongSearch:
+    """Tests for the song search endpoint."""
+
+    def test_prefix_matches_title_and_artist(self, client):
+        """The last word is a prefix and matches titles or artists."""
+        add_songs(('Beat It', 'Michael Jackson'), ('Michelle', 'The Beatles'), ('Yellow', 'Coldplay'))
+
+        titles = {song['title'] for song in search(client, 'mich').get_json()['songs']}
+        assert titles == {'Beat It', 'Michelle'}
+
+    def test_earlier_words_match_whole_words(self, client):
+        """Only the word being typed is a prefix; the others must match exactly."""
+        add_songs(('Beat It', 'Michael Jackson'), ('Beautiful Day', 'U2'))
+
+        assert [s['title'] for s in search(client, 'beat it').get_json()['songs']] == ['Beat It']
+        assert search(client, 'bea it').get_json()['songs'] == []
+
+    def test_trailing_letter_ignored_after_words(self, client):
+        """A one-letter prefix after complete words is dropped rather than matched."""
+        add_songs(('Beat It', 'Michael Jackson'), ('Beat Street', 'Grandmaster Flash'))
+
+        assert len(search(client, 'beat x').get_json()['songs']) == 2
+
+    def test_case_and_diacritics_insensitive(self, client):
+        """Searching ignores case and accents."""
+        add_songs(('Café del Mar', 'Energy 52'))
+
+        songs = search(client, 'CAFE').get_json()['songs']
+        assert [s['title'] for s in songs] == ['Café del Mar']
+
+    def test_title_matches_rank_first(self, client):
+        """A word in the title outranks the same word in the artist."""
+        add_songs(('Song For Prince', 'Somebody'), ('Purple Rain', 'Prince'))
+
+        songs = search(client, 'prince').get_json()['songs']
+        assert songs[0]['title'] == 'Song For Prince'
+
+    def test_keyset_pagination(self, client):
+        """Pages follow next_cursor without gaps or repeats."""
+        ids = add_songs(*[(f'Love Song {i}', f'Artist {i}') for i in range(7)])
+
+        seen, cursor = [], None
+        while True:
+            params = {'limit': 3}
+            if cursor:
+                params['cursor'] = cursor
+            page = search(client, 'love', **params).get_json()
+            seen.extend(song['id'] for song in page['songs'])
+            cursor = page['next_cursor']
+            if cursor is None:
+                break
+
+        assert sorted(seen) == sorted(ids)
+        assert len(seen) == len(set(seen))
+
+    def test_shorter_titles_rank_first(self, client):
+        """Within a tier, titles the query covers more of come first, wherever they were added."""
+        add_songs(('Love Will Tear Us Apart', 'Joy Division'), ('Love', 'Artist'), ('Love Me Do', 'The Beatles'))
+
+        songs = search(client, 'lov').get_json()['songs']
+        assert [s['title'] for s in songs] == ['Love', 'Love Me Do', 'Love Will Tear Us Apart']
+
+    def test_ranking_covers_every_match(self, client):
+        """The best match is found however many newer songs share the prefix."""
+        best, = add_songs(('Lo', 'Old Band'))
+        add_songs(*[(f'Love Song {i}', f'Artist {i}') for i in range(30)])
+
+        first = search(client, 'lo', limit=5).get_json()
+        assert first['songs'][0]['id'] == best
+
+        # Artist-only matches follow every title match, across pages
+        add_songs(('Untitled', 'Lonely Hearts'))
+        app_module._search_cache.clear()
+        found, cursor = [], None
+        while True:
+            params = {'limit': 7, **({'cursor': cursor} if cursor else {})}
+            page = search(client, 'lo', **params).get_json()
+            found += [song['title'] for song in page['songs']]
+            cursor = page['next_cursor']
+            if cursor is None:
+                break
+        assert len(found) == 32 and found[-1] == 'Untitled'
+
+    def test_new_songs_are_indexed(self, client):
+        """Triggers keep the index in sync with inserts, updates and deletes."""
+        song_id, = add_songs(('Old Title', 'Band'))
+        conn = get_db_connection()
+        execute_query(conn, 'UPDATE songs SET title = ? WHERE id = ?', ('New Title', song_id))
+        conn.commit()
+        conn.close()
+
+        assert search(client, 'old').get_json()['songs'] == []
+        assert [s['id'] for s in search(client, 'new').get_json()['songs']] == [song_id]
+
+        conn = get_db_connection()
+        execute_query(conn, 'DELETE FROM songs WHERE id = ?', (song_id,))
+        conn.commit()
+        conn.close()
+        app_module._search_cache.clear()
+        assert search(client, 'new').get_json()['songs'] == []
+
+    def test_existing_songs_indexed_on_upgrade(self, client):
+        """Songs stored before the search index existed are found after init_db."""
+        add_songs(('Ancient Track', 'Old Band'))
+        conn = get_db_connection()
+        for trigger in ('songs_search_insert', 'songs_search_delete', 'songs_search_update'):
+            execute_query(conn, f'DROP TRIGGER {trigger}')
+        execute_query(conn, 'DROP TABLE songs_search')
+        # The index from before rank-ordered search, keyed on song id
+        execute_query(conn, "CREATE VIRTUAL TABLE songs_fts USING fts5(title, artist, content='songs', content_rowid='id')")
+        conn.commit()
+        conn.close()
+
+        app_module.init_db()
+
+        assert [s['title'] for s in search(client, 'anc').get_json()['songs']] == ['Ancient Track']
+        conn = get_db_connection()
+        assert execute_query(conn, "SELECT 1 FROM sqlite_master WHERE name = 'songs_fts'", fetch_one=True) is None
+        conn.close()
+
+    def test_results_are_cached(self, client, monkeypatch):
+        """Repeated queries are answered from the LRU without touching the database."""
+        add_songs(('Yellow', 'Coldplay'))
+        search(client, 'yel')
+
+        calls = []
+        real_search_songs = app_module.search_songs
+        monkeypatch.setattr(app_module, 'search_songs', lambda *args: calls.append(args) or real_search_songs(*args))
+        assert search(client, 'Yel').get_json()['songs'][0]['title'] == 'Yellow'
+        assert calls == []
+
+    def test_cache_is_bounded(self, client, monkeypatch):
+        """The least recently used results are dropped past SEARCH_CACHE_MAX."""
+        monkeypatch.setattr(app_module, 'SEARCH_CACHE_MAX', 2)
+        add_songs(('Yellow', 'Coldplay'))
+        for q in ('ye', 'yel', 'ye', 'yell'):
+            search(client, q)
+
+        assert [key[1] for key in app_module._search_cache] == [('ye',), ('yell',)]
+
+    def test_short_and_missing_queries(self, client):
+        """A lone letter returns nothing; a missing query or bad cursor is an error."""
+        add_songs(('Yellow', 'Coldplay'))
+
+        assert search(client, 'y').get_json() == {'songs': [], 'next_cursor': None}
+        assert client.get('/api/songs/search').status_code == 400
+        assert search(client, 'yel', cursor='nonsense').status_code == 400
+        assert search(client, 'yel', cursor='-1:5').status_code == 400
@@ -0,0 +1,441 @@
+"""
+Tests for multi-station support: the registry, station-scoped songs,
+ratings and history, the /<station> page and concurrent metadata polling.
+"""
+
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+import requests
+
+import app as app_module
+from app import get_db_connection, execute_query
+
+
+class FakeStationResponse:
+    def __init__(self, document, status_code=200):
+        self._document = document
+        self.status_code = status_code
+
+    def json(self):
+        return self._document
+
+
+class FakeStationUpstreams:
+    """Metadata documents by URL, with an optional per-request delay."""
+
+    def __init__(self):
+        self.documents = {}
+        self.delay = 0
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def get(self, url, timeout=None, params=None):
+        with self.lock:
+            self.calls.append(url)
+        time.sleep(self.delay)
+        if url not in self.documents:
+            return FakeStationResponse(None, 404)
+        return FakeStationResponse(dict(self.documents[url]))
+
+
+def station_config(station_id, name):
+    return {
+        'id': station_id,
+        'name': name,
+        'stream_url': f'https://cdn.example/{station_id}/live.m3u8',
+        'metadata_url': f'https://cdn.example/{station_id}/metadatav2.json',
+        'art_url': None
+    }
+
+
+@pytest.fixture
+def stations(test_app, monkeypatch):
+    """Two stations, main (default) and jazz, with fake upstreams."""
+    upstreams = FakeStationUpstreams()
+    registry = {'main': station_config('main', 'NeoRadio'), 'jazz': station_config('jazz', 'Neo Jazz')}
+    for station_id, document in (('main', ('Main Song', 'Main Artist')), ('jazz', ('Jazz Song', 'Jazz Artist'))):
+        upstreams.documents[registry[station_id]['metadata_url']] = {
+            'title': document[0], 'artist': document[1], 'album': 'Album', 'date': '2025'}
+
+    monkeypatch.setattr(requests, 'get', upstreams.get)
+    monkeypatch.setattr(app_module, 'STATIONS', registry)
+    monkeypatch.setattr(app_module, 'DEFAULT_STATION', 'main')
+    monkeypatch.setattr(app_module, '_now_playing', {'data': None, 'track': None, 'payload': b'null', 'updated_at': 0.0})
+    monkeypatch.setattr(app_module, '_track_timing', {'key': None, 'started_at': None, 'full_track': False,
+                                                      'average': float(app_module.DEFAULT_TRACK_SECONDS)})
+    monkeypatch.setattr(app_module, '_station_state', {})
+    monkeypatch.setattr(app_module, '_station_poller', {'lock': threading.Lock(), 'pid': None,
+                                                        'next_poll_at': {}, 'in_flight': set(),
+                                                        'leader_fd': None, 'versions': {}})
+    return upstreams
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline and not condition():
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def other_leader():
+    """Another process holding the poller leader lock, as a second worker on the host would."""
+    holder = subprocess.Popen(
+        [sys.executable, '-c', 'import fcntl, os, sys; '
+         'fd = os.open(sys.argv[1], os.O_RDWR | os.O_CREAT, 0o600); '
+         'fcntl.lockf(fd, fcntl.LOCK_EX); print("locked", flush=True); sys.stdin.read()',
+         app_module.NOW_PLAYING_PATH + '.leader'],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    assert holder.stdout.readline().strip() == 'locked'
+    yield holder
+    holder.stdin.close()
+    holder.wait(5)
+
+
+class TestStationRegistry:
+    """Tests for loading the station registry."""
+
+    def test_default_single_station(self, tmp_path):
+        """Without a stations file the existing settings form the main station."""
+        stations = app_module.load_stations(str(tmp_path / 'missing.json'))
+
+        assert list(stations) == ['main']
+        assert stations['main']['metadata_url'] == app_module.METADATA_URL
+        assert stations['main']['stream_url'] == app_module.STREAM_URL
+
+    def test_loads_file_in_order(self, tmp_path):
+        """Stations keep file order and default their name to the id."""
+        path = tmp_path / 'stations.json'
+        entries = [station_config('main', 'NeoRadio'), station_config('jazz', None)]
+        path.write_text(json.dumps(entries))
+
+        stations = app_module.load_stations(str(path))
+        assert list(stations) == ['main', 'jazz']
+        assert stations['jazz']['name'] == 'jazz'
+
+    @pytest.mark.parametrize('station_id', ['api', 'Jazz', 'has space', ''])
+    def test_rejects_bad_ids(self, tmp_path, station_id):
+        """Ids must be URL-safe and must not shadow other routes."""
+        path = tmp_path / 'stations.json'
+        path.write_text(json.dumps([station_config(station_id, 'Bad')]))
+
+        with pytest.raises(ValueError):
+            app_module.load_stations(str(path))
+
+    def test_rejects_duplicates(self, tmp_path):
+        """Each id may appear once."""
+        path = tmp_path / 'stations.json'
+        path.write_text(json.dumps([station_config('jazz', 'A'), station_config('jazz', 'B')]))
+
+        with pytest.raises(ValueError):
+            app_module.load_stations(str(path))
+
+
+class TestStationScoping:
+    """Tests for songs, ratings and history per station."""
+
+    def test_same_song_is_separate_per_station(self, client, stations):
+        """A title/artist pair on two stations is two songs with separate ratings."""
+        client.post('/api/songs/rating', json={'title': 'Song', 'artist': 'Artist', 'rating': 1})
+        client.post('/api/songs/rating', json={'title': 'Song', 'artist': 'Artist', 'rating': -1, 'station': 'jazz'})
+
+        main = client.get('/api/songs/rating/Song/Artist').get_json()
+        jazz = client.get('/api/songs/rating/Song/Artist?station=jazz').get_json()
+        assert (main['thumbs_up'], main['thumbs_down']) == (1, 0)
+        assert (jazz['thumbs_up'], jazz['thumbs_down']) == (0, 1)
+
+        conn = get_db_connection()
+        rows = execute_query(conn, 'SELECT station FROM songs ORDER BY station', fetch_all=True)
+        conn.close()
+        assert [row['station'] for row in rows] == ['jazz', 'main']
+
+    def test_unknown_station_rejected(self, client, stations):
+        """Votes and reads for a station not in the registry are refused."""
+        vote = client.post('/api/songs/rating', json={'title': 'Song', 'artist': 'Artist', 'rating': 1, 'station': 'nope'})
+        assert vote.status_code == 400
+        assert client.get('/api/metadata?station=nope').status_code == 404
+        assert client.get('/api/history?station=nope').status_code == 404
+        assert client.get('/nope').status_code == 404
+
+    def test_history_per_station(self, client, stations):
+        """Each station's history lists only its own plays."""
+        client.get('/api/metadata')
+        client.get('/api/metadata?station=jazz')
+
+        main = client.get('/api/history').get_json()['plays']
+        jazz = client.get('/api/history?station=jazz').get_json()['plays']
+        assert [play['title'] for play in main] == ['Main Song']
+        assert [play['title'] for play in jazz] == ['Jazz Song']
+
+    def test_play_deduplicated_per_station(self, client, stations):
+        """A play on another station in between does not cause a duplicate play."""
+        client.get('/api/metadata')
+        client.get('/api/metadata?station=jazz')
+        client.get('/api/metadata')
+
+        assert len(client.get('/api/history').get_json()['plays']) == 1
+
+    def test_hot_cache_only_for_default_station(self, client, stations):
+        """A jazz song with the same title/artist as the hot main song is read from the database."""
+        stations.documents['https://cdn.example/jazz/metadatav2.json'].update(title='Main Song', artist='Main Artist')
+        client.get('/api/metadata')
+        client.post('/api/songs/rating', json={'title': 'Main Song', 'artist': 'Main Artist', 'rating': -1,
+                                               'station': 'jazz'})
+
+        main = client.get('/api/songs/rating/Main Song/Main Artist').get_json()
+        jazz = client.get('/api/songs/rating/Main Song/Main Artist?station=jazz').get_json()
+        assert main['thumbs_down'] == 0
+        assert jazz['thumbs_down'] == 1
+
+
+class TestStationListings:
+    """Tests for search, charts and export per station."""
+
+    @pytest.fixture
+    def voted(self, client, stations):
+        """The same song voted up on main and down twice on jazz"""
+        client.post('/api/songs/rating', json={'title': 'Shared Song', 'artist': 'Artist', 'rating': 1})
+        for agent in ('one', 'two'):
+            client.post('/api/songs/rating', json={'title': 'Shared Song', 'artist': 'Artist', 'rating': -1,
+                                                   'station': 'jazz'}, headers={'User-Agent': agent})
+
+    def test_search_per_station(self, client, voted):
+        """Search finds only the station's songs and says which station each is on."""
+        main = client.get('/api/songs/search?q=shared').get_json()['songs']
+        jazz = client.get('/api/songs/search?q=shared&station=jazz').get_json()['songs']
+
+        assert [song['station'] for song in main] == ['main']
+        assert [song['station'] for song in jazz] == ['jazz']
+        assert main[0]['id'] != jazz[0]['id']
+        assert client.get('/api/songs/search?q=shared&station=nope').status_code == 404
+
+    def test_charts_per_station(self, client, voted):
+        """Each station's chart counts only the votes cast on it."""
+        main = client.get('/api/charts?window=all').get_json()
+        jazz = client.get('/api/charts?window=all&station=jazz').get_json()
+
+        assert [(song['station'], song['thumbs_up'], song['thumbs_down']) for song in main['songs']] == [('main', 1, 0)]
+        assert [(song['station'], song['thumbs_up'], song['thumbs_down']) for song in jazz['songs']] == [('jazz', 0, 2)]
+        assert client.get('/api/charts?station=nope').status_code == 404
+
+    def test_rebuilt_charts_per_station(self, client, voted):
+        """rebuild_charts() keeps each song on its station's charts."""
+        conn = get_db_connection()
+        app_module.rebuild_charts(conn)
+        conn.close()
+
+        jazz = client.get('/api/charts?window=all&station=jazz').get_json()['songs']
+        assert [(song['station'], song['thumbs_down']) for song in jazz] == [('jazz', 2)]
+
+    def test_export_per_station(self, client, voted):
+        """The export lists the station's songs with a station column."""
+        main = [json.loads(line) for line in client.get('/api/songs/export').get_data(as_text=True).splitlines()]
+        jazz = client.get('/api/songs/export?station=jazz&format=csv').get_data(as_text=True).splitlines()
+
+        assert [(row['station'], row['thumbs_up']) for row in main] == [('main', 1)]
+        assert jazz[0].split(',') == ['id', 'title', 'artist', 'album', 'year', 'station', 'thumbs_up', 'thumbs_down']
+        assert jazz[1].split(',')[5:] == ['jazz', '0', '2']
+
+
+class TestStationPages:
+    """Tests for the per-station player page."""
+
+    def test_station_page(self, client, stations):
+        """/<station> renders that station's name, stream and now-playing snapshot."""
+        client.get('/api/metadata?station=jazz')
+        html = client.get('/jazz').get_data(as_text=True)
+
+        assert '<h1>Neo Jazz</h1>' in html
+        assert 'data-station="jazz"' in html
+        assert 'data-stream-url="https://cdn.example/jazz/live.m3u8"' in html
+        assert 'Jazz Song' in html
+
+    def test_default_station_page(self, client, stations):
+        """/ is the default station and its API calls need no station parameter."""
+        html = client.get('/').get_data(as_text=True)
+
+        assert '<h1>NeoRadio</h1>' in html
+        assert 'data-station=""' in html
+
+
+class TestMetadataPolling:
+    """Tests for polling all stations."""
+
+    def test_stations_polled_concurrently(self, test_app, stations, monkeypatch):
+        """A round over many slow upstreams costs about one upstream delay."""
+        registry = {f'station-{i}': station_config(f'station-{i}', f'Station {i}') for i in range(12)}
+        for config in registry.values():
+            stations.documents[config['metadata_url']] = {'title': config['id'], 'artist': 'Artist'}
+        monkeypatch.setattr(app_module, 'STATIONS', registry)
+        monkeypatch.setattr(app_module, 'DEFAULT_STATION', 'station-0')
+        monkeypatch.setattr(app_module, 'METADATA_POLL_THREADS', 12)
+        stations.delay = 0.2
+
+        started = time.perf_counter()
+        results = app_module.poll_stations()
+        elapsed = time.perf_counter() - started
+
+        assert {station: status for station, (status, _) in results.items()} == {station: 200 for station in registry}
+        assert elapsed < 1.0  # 12 sequential polls would take 2.4 s
+        assert app_module.station_state('station-7')[0]['track']['title'] == 'station-7'
+
+    def test_failed_station_does_not_stop_others(self, test_app, stations):
+        """An upstream error on one station leaves the others polled."""
+        del stations.documents['https://cdn.example/jazz/metadatav2.json']
+
+        results = app_module.poll_stations()
+        assert results['main'][0] == 200
+        assert results['jazz'][0] == 404
+
+    def test_metadata_served_from_poller_cache(self, client, stations, monkeypatch):
+        """With the poller running, /api/metadata answers from the station cache."""
+        app_module.poll_stations()
+        monkeypatch.setitem(app_module._station_poller, 'pid', os.getpid())
+        app_module._station_poller['next_poll_at']['jazz'] = time.time() + 30
+        stations.calls.clear()
+
+        response = client.get('/api/metadata?station=jazz')
+        data = response.get_json()
+
+        assert stations.calls == []
+        assert data['track']['title'] == 'Jazz Song'
+        assert 30 <= data['next_poll_after'] <= 31
+
+    def test_background_poller(self, test_app, stations, monkeypatch):
+        """The poller thread fills every station's cache on its own."""
+        monkeypatch.setattr(app_module, 'METADATA_POLL_TICK', 0.01)
+        app_module.ensure_station_poller()
+        try:
+            deadline = time.time() + 5
+            while time.time() < deadline and not all(app_module.station_state(station)[0]['track']
+                                                     for station in app_module.STATIONS):
+                time.sleep(0.01)
+        finally:
+            app_module._station_poller['pid'] = None  # stops the thread
+
+        assert app_module.station_state('main')[0]['track']['title'] == 'Main Song'
+        assert app_module.station_state('jazz')[0]['track']['title'] == 'Jazz Song'
+        assert set(app_module._station_poller['next_poll_at']) == {'main', 'jazz'}
+
+    def test_leader_shares_snapshot(self, test_app, stations, monkeypatch):
+        """The leading poller publishes each station's document to the shared table."""
+        monkeypatch.setattr(app_module, 'METADATA_POLL_TICK', 0.01)
+        app_module.ensure_station_poller()
+        try:
+            wait_for(lambda: len(app_module._station_poller['next_poll_at']) == 2)
+        finally:
+            app_module._station_poller['pid'] = None
+
+        table = app_module.now_playing_table()
+        for index, title in enumerate(['Main Song', 'Jazz Song']):
+            offset = index * app_module._NOW_PLAYING_SLOT
+            version, _, due_at, length = app_module._NOW_PLAYING_HEADER.unpack_from(table, offset)
+            start = offset + app_module._NOW_PLAYING_HEADER.size
+            assert version >= 1
+            assert due_at > time.time()
+            assert json.loads(table[start:start + length])['title'] == title
+
+    def test_follower_reads_shared_snapshot(self, test_app, stations, other_leader, monkeypatch):
+        """A worker that is not the leader never calls upstream; it applies the leader's snapshot."""
+        app_module.poll_stations()
+        for station in app_module.STATIONS:
+            app_module.publish_now_playing(station, time.time() + 30)
+        # This worker starts with nothing of its own
+        app_module._now_playing.update(data=None, track=None, payload=b'null')
+        app_module._station_state.clear()
+        stations.calls.clear()
+
+        monkeypatch.setattr(app_module, 'METADATA_POLL_TICK', 0.01)
+        app_module.ensure_station_poller()
+        try:
+            # The first read happens before ensure_station_poller returns
+            assert app_module.station_state('jazz')[0]['track']['title'] == 'Jazz Song'
+            stations.documents['https://cdn.example/main/metadatav2.json']['title'] = 'Next Song'
+            app_module.poll_upstream_metadata(station='main')
+            app_module.publish_now_playing('main', time.time() + 40)
+            app_module._now_playing.update(data=None, track=None, payload=b'null')
+            calls = len(stations.calls)
+            wait_for(lambda: app_module.station_state('main')[0]['track'] is not None)
+            time.sleep(0.05)  # several ticks
+        finally:
+            app_module._station_poller['pid'] = None
+
+        assert len(stations.calls) == calls
+        assert app_module.station_state('main')[0]['track']['title'] == 'Next Song'
+        assert app_module._hot_ratings['key'] == ('Next Song', 'Main Artist')
+        assert 39 <= app_module._station_poller['next_poll_at']['main'] - time.time() <= 40
+        assert app_module._station_poller['leader_fd'] is None
+
+
+class TestSongsMigration:
+    """Tests for upgrading a database from before stations."""
+
+    def test_existing_songs_move_to_main(self, test_app):
+        """init_db rebuilds the old songs table, keeping ids, ratings and search."""
+        conn = sqlite3.connect(app_module.DATABASE)
+        conn.executescript('''
+            DROP TABLE songs;
+            CREATE TABLE songs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                title TEXT NOT NULL,
+                artist TEXT NOT NULL,
+                album TEXT,
+                year TEXT,
+                UNIQUE(title, artist)
+            );
+            INSERT INTO songs (id, title, artist, album, year) VALUES (7, 'Old Song', 'Old Artist', '', '');
+            INSERT INTO ratings (song_id, user_id, rating) VALUES (7, 'listener', 1);
+        ''')
+        conn.commit()
+        conn.close()
+
+        app_module.init_db()
+
+        conn = get_db_connection()
+        song = execute_query(conn, 'SELECT id, station FROM songs', fetch_one=True)
+        assert (song['id'], song['station']) == (7, 'main')
+        # The same song can now exist on another station
+        assert app_module.get_or_create_song_id(conn, 'Old Song', 'Old Artist', station='jazz') > 7
+        conn.close()
+
+        client = test_app.test_client()
+        assert client.get('/api/songs/rating/Old Song/Old Artist').get_json()['thumbs_up'] == 1
+        found = client.get('/api/songs/search?q=old').get_json()['songs']
+        assert [(song['id'], song['station']) for song in found] == [(7, 'main')]
+
+    def test_existing_charts_take_song_station(self, test_app):
+        """init_db adds the station to chart rows from before per-station charts."""
+        conn = get_db_connection()
+        main_id = app_module.get_or_create_song_id(conn, 'Main Song', 'Artist')
+        jazz_id = app_module.get_or_create_song_id(conn, 'Jazz Song', 'Artist', station='jazz')
+        conn.executescript(f'''
+            DROP TABLE chart_scores;
+            CREATE TABLE chart_scores (
+                period TEXT NOT NULL,
+                song_id INTEGER NOT NULL,
+                thumbs_up INTEGER NOT NULL DEFAULT 0,
+                thumbs_down INTEGER NOT NULL DEFAULT 0,
+                score REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (period, song_id)
+            );
+            CREATE INDEX idx_chart_scores_rank ON chart_scores(period, score DESC);
+            INSERT INTO chart_scores VALUES ('all', {main_id}, 1, 0, 0.2), ('all', {jazz_id}, 3, 0, 0.4);
+        ''')
+        conn.commit()
+        conn.close()
+
+        app_module.init_db()
+
+        conn = get_db_connection()
+        rows = execute_query(conn, 'SELECT song_id, station FROM chart_scores ORDER BY song_id', fetch_all=True)
+        indexes = [row['name'] for row in execute_query(
+            conn, "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'chart_scores'", fetch_all=True)]
+        conn.close()
+        assert [(row['song_id'], row['station']) for row in rows] == [(main_id, 'main'), (jazz_id, 'jazz')]
+        assert 'idx_chart_scores_rank' not in indexes
@@ -0,0 +1,119 @@
+"""
+Tests for the streaming query API and streamed exports.
+"""
+
+import pytest
+import csv
+import io
+import json
+from app import get_db_connection, iter_query
+
+
+@pytest.fixture
+def many_songs(test_app):
+    conn = get_db_connection()
+    conn.executemany(
+        "INSERT INTO songs (title, artist, album, year) VALUES (?, ?, ?, ?)",
+        [(f'Stream Song {i}', 'Stream Artist', 'Album', '2025') for i in range(25)]
+    )
+    conn.commit()
+    conn.close()
+
+
+class TestIterQuery:
+    """Tests for iter_query()."""
+
+    def test_yields_dicts(self, many_songs):
+        """Test that rows stream as dicts by default."""
+        conn = get_db_connection()
+        rows = list(iter_query(conn, "SELECT id, title FROM songs ORDER BY id", chunk_size=4))
+        conn.close()
+
+        assert len(rows) == 25
+        assert rows[0] == {'id': 1, 'title': 'Stream Song 0'}
+
+    def test_yields_tuples(self, many_songs):
+        """Test tuple mode."""
+        conn = get_db_connection()
+        rows = list(iter_query(conn, "SELECT id, title FROM songs WHERE id <= ? ORDER BY id",
+                               (2,), as_tuples=True))
+        conn.close()
+
+        assert rows == [(1, 'Stream Song 0'), (2, 'Stream Song 1')]
+
+    def test_fetches_in_chunks(self, many_songs):
+        """Test that rows are pulled with fetchmany, never fetchall."""
+        conn = get_db_connection()
+        calls = []
+
+        class RecordingCursor:
+            def __init__(self, cursor):
+                self._cursor = cursor
+
+            def fetchmany(self, size):
+                rows = self._cursor.fetchmany(size)
+                calls.append(len(rows))
+                return rows
+
+            def fetchall(self):
+                raise AssertionError('fetchall() materializes the whole result')
+
+            def __getattr__(self, name):
+                return getattr(self._cursor, name)
+
+        class RecordingConnection:
+            def cursor(self):
+                return RecordingCursor(conn.cursor())
+
+        rows = list(iter_query(RecordingConnection(), "SELECT id FROM songs", chunk_size=10))
+        conn.close()
+
+        assert len(rows) == 25
+        assert calls == [10, 10, 5, 0]
+
+    def test_early_stop_closes_cursor(self, many_songs):
+        """Test that abandoning the generator releases the cursor."""
+        conn = get_db_connection()
+        rows = iter_query(conn, "SELECT id FROM songs", chunk_size=5)
+        next(rows)
+        rows.close()
+        # The connection is immediately usable for writes again
+        conn.execute("INSERT INTO songs (title, artist) VALUES ('After', 'Stop')")
+        conn.commit()
+        conn.close()
+
+
+class TestSongExport:
+    """Tests for the streamed /api/songs/export endpoint."""
+
+    def test_ndjson_export(self, client, many_songs):
+        """Test one JSON document per line with vote totals."""
+        client.post('/api/songs/rating', json={
+            'title': 'Stream Song 3', 'artist': 'Stream Artist', 'rating': 1
+        })
+        response = client.get('/api/songs/export')
+        assert response.status_code == 200
+        assert response.mimetype == 'application/x-ndjson'
+        assert response.is_streamed
+
+        lines = response.data.decode().splitlines()
+        assert len(lines) == 25
+        song = json.loads(lines[3])
+        assert song['title'] == 'Stream Song 3'
+        assert song['thumbs_up'] == 1
+        assert json.loads(lines[0])['thumbs_up'] == 0
+
+    def test_csv_export(self, client, many_songs):
+        """Test CSV header and rows."""
+        response = client.get('/api/songs/export?format=csv')
+        assert response.mimetype == 'text/csv'
+        assert 'songs.csv' in response.headers['Content-Disposition']
+
+        rows = list(csv.reader(io.StringIO(response.data.decode())))
+        assert rows[0] == ['id', 'title', 'artist', 'album', 'year', 'station', 'thumbs_up', 'thumbs_down']
+        assert rows[1] == ['1', 'Stream Song 0', 'Stream Artist', 'Album', '2025', 'main', '0', '0']
+        assert len(rows) == 26
+
+    def test_invalid_format(self, client):
+        """Test that unknown formats are rejected."""
+        assert client.get('/api/songs/export?format=xml').status_code == 400